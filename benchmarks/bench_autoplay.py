@@ -0,0 +1,86 @@
+"""Autoplayer throughput benchmark for Food Tetris.
+
+Plays headless games with the autoplayer, starting a new game whenever one
+ends, and reports how many pieces it places per second. Placing a piece
+includes searching every placement, scoring the boards and playing the
+moves through GameState. With --depth above 1 it uses LookaheadPlayer and
+also reports how long each choice takes, which has to fit in a frame for
+attract mode.
+
+Run from the repository root:
+
+    python benchmarks/bench_autoplay.py --pieces 5000 --json autoplay.json
+    python benchmarks/bench_autoplay.py --depth 3 --pieces 1000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from food_ai import Autoplayer, LookaheadPlayer
+from food_engine import GameState
+
+def percentile(values, fraction):
+    """Return the value `fraction` of the way through the sorted values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def play(pieces, seed, randomizer, depth=1, beam=4):
+    """Place `pieces` pieces and return the results"""
+    autoplayer = LookaheadPlayer(depth=depth, beam=beam) if depth > 1 else Autoplayer()
+    choices = []
+    game = GameState(seed=seed, randomizer=randomizer)
+    games = 1
+    lines = 0
+    start = time.perf_counter()
+    for _ in range(pieces):
+        if game.game_over:
+            lines += game.lines_cleared
+            game.reset()
+            games += 1
+        choice_start = time.perf_counter()
+        placement = autoplayer.choose(game)
+        choices.append(time.perf_counter() - choice_start)
+        for action in placement.actions:
+            game.step(action)
+    elapsed = time.perf_counter() - start
+    lines += game.lines_cleared
+    return {
+        'depth': depth,
+        'beam': beam,
+        'pieces': pieces,
+        'seconds': elapsed,
+        'pieces_per_second': pieces / elapsed,
+        'games': games,
+        'lines_per_game': lines / games,
+        'choice_ms_median': percentile(choices, 0.5) * 1000,
+        'choice_ms_p95': percentile(choices, 0.95) * 1000,
+        'choice_ms_max': max(choices) * 1000
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure how many pieces per second the autoplayer places')
+    parser.add_argument('--pieces', type=int, default=5000, help='number of pieces to place')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the first game')
+    parser.add_argument('--randomizer', default='uniform', help='piece randomizer to play with')
+    parser.add_argument('--depth', type=int, default=1, help='pieces to plan ahead, 1 for no lookahead')
+    parser.add_argument('--beam', type=int, default=4, help='placements searched further per piece')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = play(args.pieces, args.seed, args.randomizer, args.depth, args.beam)
+    print(f"{results['pieces_per_second']:.0f} pieces/s  ({results['pieces']} pieces in "
+          f"{results['seconds']:.2f}s, {results['games']} games, "
+          f"{results['lines_per_game']:.1f} lines per game)")
+    print(f"choice: median {results['choice_ms_median']:.2f}ms, p95 {results['choice_ms_p95']:.2f}ms, "
+          f"max {results['choice_ms_max']:.2f}ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main()
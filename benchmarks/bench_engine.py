@@ -0,0 +1,374 @@
+"""Engine micro-benchmarks for Food Tetris.
+
+Times the hot GameState operations on a few fixed boards:
+
+* valid_move: collision checks at positions all over the board
+* try_wall_kick: rotations against the walls and the stack
+* merge_piece: locking a piece into the board
+* clear_lines_1 .. clear_lines_4: clearing that many full rows at once
+* ghost_drop: where the ghost piece lands (landing_y), in a new column each time
+* new_piece: taking the next piece and dealing a new one
+
+Boards (empty, half_full, jagged, near_topout) are built from fixed seeds,
+so every run times the same work. Each operation reports nanoseconds per
+call in its fastest of several rounds (like timeit, since slower rounds
+measure interference from the rest of the machine), the most bytes a call has
+allocated at once (tracemalloc) and the memory blocks still allocated after
+it, which should stay near zero. Allocations are measured one call at a time, less
+what the harness itself allocates.
+
+Run from the repository root:
+
+    python benchmarks/bench_engine.py --json engine.json
+    python benchmarks/bench_engine.py --baseline benchmarks/engine_baseline.json
+
+With --baseline the run fails (exit status 1) if any operation got slower
+than the baseline by more than --threshold, or allocates more than
+--alloc-threshold extra bytes per call. The fastest round of one run still
+moves by 20-30% on a busy machine, so operations that look slower are timed
+--repeats more times and judged on the median of those runs. The cases
+timed around an operation affect its timing, so record the baseline with
+a full run. Refresh the baseline after an
+intended change with --json benchmarks/engine_baseline.json.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from food_engine import (
+    FOODS,
+    GRID_HEIGHT,
+    GRID_WIDTH,
+    GameState,
+    empty_grid,
+    spawn_piece,
+    try_wall_kick
+)
+
+FOOD_NAMES = sorted(FOODS)
+
+def fill_columns(heights, seed, holes=0.0):
+    """Return a grid with each column filled to the given height
+
+    `holes` is the chance of leaving a cell below the top empty. A row is
+    never left full, so the board has nothing to clear.
+    """
+    rng = random.Random(seed)
+    grid = empty_grid()
+    for x, height in enumerate(heights):
+        for y in range(GRID_HEIGHT - height, GRID_HEIGHT):
+            if y == GRID_HEIGHT - height or rng.random() >= holes:
+                grid[y][x] = rng.choice(FOOD_NAMES)
+    for row in grid:
+        if all(row):
+            row[rng.randrange(GRID_WIDTH)] = None
+    return grid
+
+# Fixture name -> function building its grid
+FIXTURES = {
+    'empty': empty_grid,
+    'half_full': lambda: fill_columns([GRID_HEIGHT // 2] * GRID_WIDTH, 1, holes=0.15),
+    'jagged': lambda: fill_columns([(3, 11, 6, 1, 9, 4, 12, 2, 7, 5)[x % 10] for x in range(GRID_WIDTH)], 2),
+    'near_topout': lambda: fill_columns([GRID_HEIGHT - 4 + x % 2 for x in range(GRID_WIDTH)], 3, holes=0.1)
+}
+
+def fixture_game(grid):
+    """Return a seeded game playing on a copy of the grid"""
+    game = GameState(seed=1)
+    game.load_grid(grid)
+    return game
+
+def probes(game, count, seed):
+    """Return fixed random (piece, x, y, rotation) positions, valid or not"""
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        piece = spawn_piece(rng.choice(FOOD_NAMES))
+        result.append((piece, rng.randrange(-2, GRID_WIDTH), rng.randrange(-1, GRID_HEIGHT), rng.randrange(4)))
+    return result
+
+def resting_pieces(game, count, seed):
+    """Return pieces in spots they can sit in on the game's board, at their landing row"""
+    rng = random.Random(seed)
+    result = []
+    while len(result) < count:
+        piece = spawn_piece(rng.choice(FOOD_NAMES))
+        piece['x'] = rng.randrange(-2, GRID_WIDTH)
+        piece['rotation'] = rng.randrange(4)
+        piece['y'] = 0
+        if game.valid_move(piece, piece['x'], 0, piece['rotation']):
+            piece['y'] = game.landing_y(piece)
+            result.append(piece)
+    return result
+
+# Each benchmark takes the fixture grid and a batch size and returns
+# (prepare, run): prepare() sets up one batch outside the timer and returns
+# its state, run(state) does `batch` operations on it.
+
+def bench_valid_move(grid, batch):
+    game = fixture_game(grid)
+    positions = probes(game, batch, 10)
+    valid_move = game.valid_move
+
+    def run(_):
+        for piece, x, y, rotation in positions:
+            valid_move(piece, x, y, rotation)
+    return lambda: None, run
+
+def bench_try_wall_kick(grid, batch):
+    game = fixture_game(grid)
+    board = game.board
+    # Rotations near the walls, on the stack's surface and in the stack
+    kicks = [(piece, (piece['rotation'] + 1) % 4) for piece in resting_pieces(game, batch // 2, 11)]
+    for piece, x, y, rotation in probes(game, batch - len(kicks), 12):
+        piece.update(x=x, y=y, rotation=rotation)
+        kicks.append((piece, (rotation + 1) % 4))
+    saved = [(piece['x'], piece['y'], piece['rotation']) for piece, _ in kicks]
+
+    def prepare():
+        for (piece, _), (x, y, rotation) in zip(kicks, saved):
+            piece['x'], piece['y'], piece['rotation'] = x, y, rotation
+
+    def run(_):
+        for piece, rotation in kicks:
+            try_wall_kick(piece, rotation, board)
+    return prepare, run
+
+def bench_merge_piece(grid, batch):
+    base = fixture_game(grid)
+    pieces = resting_pieces(base, batch, 13)
+
+    def prepare():
+        return [fixture_game(grid) for _ in range(batch)]
+
+    def run(games):
+        for game, piece in zip(games, pieces):
+            game.merge_piece(piece)
+    return prepare, run
+
+def bench_clear_lines(lines):
+    def bench(grid, batch):
+        full = [list(row) for row in grid]
+        # Fill the bottom rows, the ones a piece completing lines would touch
+        rows = range(GRID_HEIGHT - lines, GRID_HEIGHT)
+        for y in rows:
+            full[y] = [cell or FOOD_NAMES[x % len(FOOD_NAMES)] for x, cell in enumerate(full[y])]
+
+        def prepare():
+            games = []
+            for _ in range(batch):
+                game = fixture_game(full)
+                game.touched_rows = set(rows)
+                games.append(game)
+            return games
+
+        def run(games):
+            for game in games:
+                game.clear_lines()
+        return prepare, run
+    return bench
+
+def bench_ghost_drop(grid, batch):
+    game = fixture_game(grid)
+    pieces = resting_pieces(game, batch, 14)
+    for piece in pieces:
+        piece['y'] = 0
+    landing_y = game.landing_y
+
+    def run(_):
+        for piece in pieces:
+            landing_y(piece)
+    return lambda: None, run
+
+def bench_new_piece(grid, batch):
+    game = fixture_game(grid)
+
+    def run(_):
+        for _ in range(batch):
+            game.new_piece()
+    return lambda: None, run
+
+BENCHMARKS = {
+    'valid_move': bench_valid_move,
+    'try_wall_kick': bench_try_wall_kick,
+    'merge_piece': bench_merge_piece,
+    'clear_lines_1': bench_clear_lines(1),
+    'clear_lines_2': bench_clear_lines(2),
+    'clear_lines_3': bench_clear_lines(3),
+    'clear_lines_4': bench_clear_lines(4),
+    'ghost_drop': bench_ghost_drop,
+    'new_piece': bench_new_piece
+}
+
+# Calls measured one at a time under tracemalloc
+ALLOC_SAMPLES = 100
+
+def bench_nothing(grid, batch):
+    """Calibration: the harness with no operation, to subtract from allocation counts"""
+    def run(_):
+        for _ in range(batch):
+            pass
+    return lambda: None, run
+
+def measure_allocations(bench, grid):
+    """Return the median peak bytes and the blocks left allocated by single calls"""
+    prepare, run = bench(grid, 1)
+    peaks = []
+    retained = 0
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOC_SAMPLES):
+            state = prepare()
+            blocks = sys.getallocatedblocks()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            run(state)
+            _, peak = tracemalloc.get_traced_memory()
+            retained += sys.getallocatedblocks() - blocks
+            peaks.append(peak - current)
+            del state
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks), retained / ALLOC_SAMPLES
+
+def time_batch(prepare, run, batch):
+    """Return the ns per op of one batch"""
+    state = prepare()
+    start = time.perf_counter_ns()
+    run(state)
+    elapsed = time.perf_counter_ns() - start
+    del state
+    gc.collect()
+    return elapsed / batch
+
+def build_cases(batch, only=None):
+    """Return {'fixture/op': (bench, grid, (prepare, run))} for the selected benchmarks"""
+    cases = {}
+    for fixture, build in FIXTURES.items():
+        grid = build()
+        for name, bench in BENCHMARKS.items():
+            key = f'{fixture}/{name}'
+            if not only or any(pattern in key for pattern in only):
+                cases[key] = (bench, grid, bench(grid, batch))
+    return cases
+
+def time_cases(cases, batch, rounds):
+    """Return {'fixture/op': ns per op of its fastest round}"""
+    # Round-robin over the cases, so a machine that speeds up or slows down
+    # during the run skews every case alike rather than the last few
+    timings = {key: [] for key in cases}
+    # Like timeit, keep the collector from firing inside a timed batch
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            for key, (_, _, (prepare, run)) in cases.items():
+                timings[key].append(time_batch(prepare, run, batch))
+    finally:
+        gc.enable()
+    return {key: round(min(times), 1) for key, times in timings.items()}
+
+def run_all(batch, rounds, only=None):
+    """Run every benchmark on every fixture and return {'fixture/op': measurements}"""
+    cases = build_cases(batch, only)
+    timings = time_cases(cases, batch, rounds)
+    base_peak, base_retained = measure_allocations(bench_nothing, None)
+    results = {}
+    for key, (bench, grid, _) in cases.items():
+        peak, retained = measure_allocations(bench, grid)
+        results[key] = {
+            'ns_per_op': timings[key],
+            'alloc_bytes_per_op': max(0, peak - base_peak),
+            'blocks_per_op': round(retained - base_retained, 3)
+        }
+    return results
+
+def slower(results, baseline, threshold):
+    """Return the keys of the operations slower than the baseline by more than threshold"""
+    return [key for key, result in results.items()
+            if key in baseline and result['ns_per_op'] > baseline[key]['ns_per_op'] * (1 + threshold)]
+
+def retime(results, keys, batch, rounds, repeats, only=None):
+    """Run the same benchmarks `repeats` more times, keeping the median of all runs for `keys`
+
+    The whole selection is run again, not just `keys`, since the cases timed
+    around an operation affect its timing too.
+    """
+    cases = build_cases(batch, only)
+    runs = [time_cases(cases, batch, rounds) for _ in range(repeats)]
+    for key in keys:
+        results[key]['ns_per_op'] = statistics.median([results[key]['ns_per_op']] + [run[key] for run in runs])
+
+def compare(results, baseline, threshold, alloc_threshold):
+    """Return the lines describing regressions against a baseline's results"""
+    failures = []
+    slow = slower(results, baseline, threshold)
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if key in slow:
+            failures.append(f"{key}: {result['ns_per_op']:.0f}ns/op vs {base['ns_per_op']:.0f}ns/op "
+                            f"({result['ns_per_op'] / base['ns_per_op'] - 1:+.0%})")
+        if result['alloc_bytes_per_op'] > base['alloc_bytes_per_op'] + alloc_threshold:
+            failures.append(f"{key}: {result['alloc_bytes_per_op']:.0f} bytes/op vs "
+                            f"{base['alloc_bytes_per_op']:.0f} bytes/op")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the engine\'s collision, merge, clear and spawn operations')
+    parser.add_argument('--batch', type=int, default=200, help='operations timed together')
+    parser.add_argument('--rounds', type=int, default=30, help='timed batches per operation, the fastest is kept')
+    parser.add_argument('--only', nargs='*', help='only run benchmarks whose fixture/op name contains one of these')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare against results saved with --json')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fail if an operation is this fraction slower than the baseline')
+    parser.add_argument('--repeats', type=int, default=4,
+                        help='extra runs timing operations that look slower, judged on their median')
+    parser.add_argument('--alloc-threshold', type=float, default=64,
+                        help='fail if an operation allocates this many more bytes than the baseline')
+    args = parser.parse_args(argv)
+
+    results = run_all(args.batch, args.rounds, args.only)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        retimed = slower(results, baseline, args.threshold)
+        if retimed and args.repeats:
+            retime(results, retimed, args.batch, args.rounds, args.repeats, args.only)
+    print(f"{'benchmark':<28} {'ns/op':>9} {'bytes/op':>9} {'blocks/op':>9} {'vs base':>8}")
+    for key, result in results.items():
+        change = ''
+        if key in baseline:
+            change = f"{result['ns_per_op'] / baseline[key]['ns_per_op'] - 1:+.0%}"
+        print(f"{key:<28} {result['ns_per_op']:>9.0f} {result['alloc_bytes_per_op']:>9.0f} "
+              f"{result['blocks_per_op']:>9.2f} {change:>8}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'batch': args.batch,
+                'rounds': args.rounds,
+                'results': results
+            }, f, indent=2)
+    if args.baseline:
+        failures = compare(results, baseline, args.threshold, args.alloc_threshold)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Render benchmark for Food Tetris.
+
+Draws frames with the game's own draw functions on SDL's dummy video
+driver, so no window opens and only the drawing is timed. Every scripted
+state (a fresh game, mid-game with the character eating, a nearly topped
+out stack, the explosion, the game over and victory screens and the pause
+menu) is drawn at 720p, 1080p, 1440p and 4K.
+
+For each resolution it reports p50/p95/p99 milliseconds of:
+
+* every draw function on its own: draw_character, draw_grid,
+  draw_ghost_piece, draw_piece, draw_sidebar, draw_pause_button,
+  draw_pause and draw_game_over, over all the states
+* the full frame (draw_frame) for each state
+
+Run from the repository root:
+
+    python benchmarks/bench_render.py --frames 200 --json render.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+import food_tetris
+from food_engine import GRID_HEIGHT, GRID_WIDTH, GameState, Session, empty_grid
+
+RESOLUTIONS = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '1440p': (2560, 1440),
+    '4k': (3840, 2160)
+}
+
+FOOD_NAMES = sorted(food_tetris.FOODS)
+
+def stacked_grid(height, seed):
+    """Return a grid filled `height` rows up, with a gap in every row"""
+    rng = random.Random(seed)
+    grid = empty_grid()
+    for y in range(GRID_HEIGHT - height, GRID_HEIGHT):
+        grid[y] = [rng.choice(FOOD_NAMES) for _ in range(GRID_WIDTH)]
+        grid[y][rng.randrange(GRID_WIDTH)] = None
+    return grid
+
+def opening():
+    """A new game with an empty board"""
+    return Session(GameState(seed=1)), False
+
+def midgame():
+    """A half-full board with the character half full and eating"""
+    session = Session(GameState(seed=2))
+    session.game.load_grid(stacked_grid(GRID_HEIGHT // 2, 2))
+    session.game.character_fullness = food_tetris.character_max_fullness // 2
+    session.eat(2)
+    return session, False
+
+def near_topout():
+    """A stack five rows from the top and a character about to burst"""
+    session = Session(GameState(seed=3))
+    session.game.load_grid(stacked_grid(GRID_HEIGHT - 5, 3))
+    # Past 90% full the shirt starts ripping
+    session.game.character_fullness = food_tetris.character_max_fullness - 10
+    return session, False
+
+def exploding():
+    """The character exploding"""
+    session, _ = midgame()
+    session.start_explosion()
+    return session, False
+
+def game_over():
+    """The game over screen over a topped-out stack"""
+    session, _ = near_topout()
+    session.game.game_over = True
+    return session, False
+
+def victory():
+    """The victory screen"""
+    session, _ = midgame()
+    session.game.character_exploded = True
+    session.game.game_over = True
+    return session, False
+
+def paused():
+    """The pause menu over a game in progress"""
+    session, _ = midgame()
+    return session, True
+
+# State name -> function returning (session, paused)
+STATES = {
+    'opening': opening,
+    'midgame': midgame,
+    'near_topout': near_topout,
+    'exploding': exploding,
+    'game_over': game_over,
+    'victory': victory,
+    'paused': paused
+}
+
+FUNCTIONS = {
+    'draw_character': lambda: food_tetris.draw_character(),
+    'draw_grid': lambda: food_tetris.draw_grid(),
+    'draw_ghost_piece': lambda: food_tetris.draw_ghost_piece(food_tetris.game.current_piece),
+    'draw_piece': lambda: food_tetris.draw_piece(food_tetris.game.current_piece),
+    'draw_sidebar': lambda: food_tetris.draw_sidebar(),
+    'draw_pause_button': lambda: food_tetris.draw_pause_button(),
+    'draw_pause': lambda: food_tetris.draw_pause(),
+    'draw_game_over': lambda: food_tetris.draw_game_over(food_tetris.VICTORY_MESSAGES[0])
+}
+
+def set_resolution(size):
+    """Point the game at a new dummy display of the given size"""
+    food_tetris.SCREEN_WIDTH, food_tetris.SCREEN_HEIGHT = size
+    food_tetris.screen = pygame.display.set_mode(size)
+
+def set_state(name):
+    """Make a scripted state the game being drawn, returning whether it shows the explosion"""
+    session, is_paused = STATES[name]()
+    food_tetris.session = session
+    food_tetris.game = session.game
+    food_tetris.paused = is_paused
+    return session.showing_explosion
+
+def timed(draw):
+    """Return how long a draw call takes, in milliseconds"""
+    start = time.perf_counter()
+    draw()
+    return (time.perf_counter() - start) * 1000
+
+def percentiles(samples):
+    """Return p50/p95/p99 of the samples"""
+    ordered = sorted(samples)
+    return {f'p{p}': ordered[min(len(ordered) - 1, len(ordered) * p // 100)] for p in (50, 95, 99)}
+
+def bench_resolution(size, frames, warmup):
+    """Time every function and full frame in every state at one resolution"""
+    set_resolution(size)
+    function_times = {name: [] for name in FUNCTIONS}
+    frame_times = {}
+    for state in STATES:
+        showing_explosion = set_state(state)
+        # Fixed explosion and shirt-rip scatter for every run
+        random.seed(0)
+        message = food_tetris.VICTORY_MESSAGES[0]
+        # The first frames build fonts, text and the grid background
+        for _ in range(warmup):
+            food_tetris.draw_frame(message, showing_explosion)
+        frame_times[state] = [timed(lambda: food_tetris.draw_frame(message, showing_explosion))
+                              for _ in range(frames)]
+        for name, draw in FUNCTIONS.items():
+            draw()
+            function_times[name].extend(timed(draw) for _ in range(frames))
+    return {
+        'functions': {name: percentiles(times) for name, times in function_times.items()},
+        'frame': {state: percentiles(times) for state, times in frame_times.items()}
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the draw functions at several screen sizes')
+    parser.add_argument('--frames', type=int, default=100, help='timed frames per state')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed frames before each state')
+    parser.add_argument('--resolutions', nargs='*', choices=sorted(RESOLUTIONS), default=list(RESOLUTIONS),
+                        help='screen sizes to draw at')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    set_resolution(RESOLUTIONS[args.resolutions[0]])
+    food_tetris.food_images = food_tetris.load_food_images()
+    food_tetris.preload_tiles()
+
+    results = {}
+    for name in args.resolutions:
+        results[name] = bench_resolution(RESOLUTIONS[name], args.frames, args.warmup)
+        width, height = RESOLUTIONS[name]
+        print(f"{f'{name} ({width}x{height}), ms':<22} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for label, stats in list(results[name]['functions'].items()) + [
+                (f'frame: {state}', stats) for state, stats in results[name]['frame'].items()]:
+            print(f"  {label:<20} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['p99']:>8.3f}")
+    pygame.quit()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'frames': args.frames, 'resolutions': results}, f, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Startup benchmark for Food Tetris.
+
+Measures, in a fresh interpreter for every run:
+
+* import time: how long `import food_tetris` takes
+* time to first frame: from calling main() until the first frame is presented
+
+Run from the repository root:
+
+    python benchmarks/bench_startup.py --runs 10 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter. Presenting the first frame ends the run.
+CHILD_SCRIPT = r'''
+import json
+import sys
+import time
+start = time.perf_counter()
+import food_tetris
+imported = time.perf_counter()
+import pygame
+
+def first_frame(*args, **kwargs):
+    presented = time.perf_counter()
+    with open(sys.argv[1], 'w') as f:
+        json.dump({
+            'import_ms': (imported - start) * 1000,
+            'first_frame_ms': (presented - imported) * 1000,
+            'display_before_main': display_before_main
+        }, f)
+    raise SystemExit(0)
+
+display_before_main = pygame.display.get_init()
+pygame.display.flip = first_frame
+pygame.display.update = first_frame
+food_tetris.main([])
+'''
+
+def run_once():
+    """Start one fresh interpreter and return its timings"""
+    env = dict(os.environ)
+    env.setdefault('SDL_VIDEODRIVER', 'dummy')
+    env.setdefault('SDL_AUDIODRIVER', 'dummy')
+    env['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = os.path.join(tmp, 'startup.json')
+        subprocess.run([sys.executable, '-c', CHILD_SCRIPT, result_path], cwd=REPO_ROOT, env=env,
+                       stdout=subprocess.DEVNULL, check=True)
+        with open(result_path) as f:
+            return json.load(f)
+
+def summarize(values):
+    """Median, min and max of a list of timings"""
+    return {
+        'median': statistics.median(values),
+        'min': min(values),
+        'max': max(values)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure Food Tetris import time and time to first frame')
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh interpreters to start')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    results = {
+        'runs': args.runs,
+        'import_ms': summarize([run['import_ms'] for run in runs]),
+        'first_frame_ms': summarize([run['first_frame_ms'] for run in runs]),
+        'display_opened_on_import': any(run['display_before_main'] for run in runs)
+    }
+    for name in ('import_ms', 'first_frame_ms'):
+        stats = results[name]
+        print(f"{name:>15}: median {stats['median']:.1f}  min {stats['min']:.1f}  max {stats['max']:.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main()
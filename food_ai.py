@@ -0,0 +1,378 @@
+"""Autoplayer for Food Tetris.
+
+For each piece the autoplayer finds every spot it can be moved to from
+where it spawned, scores the board each one leaves with a weighted
+heuristic and plays the best. It works on the engine's packed bitboard, so
+it's fast enough for soak tests and bulk simulation as well as attract mode.
+
+LookaheadPlayer also plans the pieces in the preview and the hold slot. It
+caches the boards it has already searched in a TranspositionTable keyed by
+the boards' Zobrist hashes.
+"""
+from collections import OrderedDict, deque, namedtuple
+
+from food_engine import (
+    FULL_ROW,
+    GRID_HEIGHT,
+    GRID_WIDTH,
+    HELD_ACTIONS,
+    PIECE_MASKS,
+    SHAPES,
+    SHIFT_TICKS,
+    SOFT_DROP_TICKS,
+    UNIQUE_ROTATIONS,
+    spawn_piece,
+    try_wall_kick,
+    zobrist_update
+)
+
+# Heuristic weights per board feature. Well-known hand-tuned values for
+# classic Tetris; clearing lines is good, everything else is a cost.
+DEFAULT_WEIGHTS = {
+    'height': -0.510066,  # Sum of the column heights
+    'lines': 0.760666,  # Lines the placement clears
+    'holes': -0.35663,  # Empty cells with something above them
+    'bumpiness': -0.184483  # Sum of height differences between neighbouring columns
+}
+
+# A reachable landing spot and the actions that get the piece there
+Placement = namedtuple('Placement', ['actions', 'x', 'y', 'rotation'])
+
+def drop_bits(bits, piece_type, x, y, rotation):
+    """Return the board bits with the piece placed, and the rows it completed"""
+    top, bottom, masks = PIECE_MASKS[piece_type][rotation]
+    bits |= masks[x] << ((y + top) * GRID_WIDTH)
+    full = [r for r in range(y + top, y + bottom + 1) if (bits >> (r * GRID_WIDTH)) & FULL_ROW == FULL_ROW]
+    # Same shifting as BitBoard.remove_rows(), going top to bottom
+    for r in full:
+        above = bits & ((1 << (r * GRID_WIDTH)) - 1)
+        below = (bits >> ((r + 1) * GRID_WIDTH)) << ((r + 1) * GRID_WIDTH)
+        bits = below | (above << GRID_WIDTH)
+    return bits, len(full)
+
+def hash_after_drop(board_hash, bits, after, piece_type, y, rotation, lines):
+    """Update a board's Zobrist hash for a drop_bits() from `bits` to `after`"""
+    top, bottom, _ = PIECE_MASKS[piece_type][rotation]
+    # A clear can move every row down to the lowest one the piece touched
+    return zobrist_update(board_hash, bits, after, range(0 if lines else y + top, y + bottom + 1))
+
+def column_heights(bits):
+    """Height of the stack in each column of a packed board"""
+    heights = [0] * GRID_WIDTH
+    if not bits:
+        return heights
+    covered = 0
+    # Start at the highest filled row; everything above it is empty
+    for r in range(((bits & -bits).bit_length() - 1) // GRID_WIDTH, GRID_HEIGHT):
+        new = (bits >> (r * GRID_WIDTH)) & FULL_ROW & ~covered
+        if new:
+            covered |= new
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = GRID_HEIGHT - r
+                new ^= low
+            if covered == FULL_ROW:
+                break
+    return heights
+
+def drops(heights, piece_type):
+    """Yield (x, y, rotation) for every straight drop of a piece from the top
+
+    The quick version of placements() used deeper in the search: no slides
+    under overhangs or wall kicks, just every rotation over every column.
+    """
+    for rotation in UNIQUE_ROTATIONS[piece_type]:
+        top, _, masks = PIECE_MASKS[piece_type][rotation]
+        bottom = SHAPES[piece_type][rotation].bottom
+        for x in masks:
+            y = min(GRID_HEIGHT - heights[x + dx] - 1 - dy for dx, dy in bottom)
+            if y + top >= 0:
+                yield x, y, rotation
+
+def board_features(bits):
+    """Return (aggregate height, holes, bumpiness) of a packed board"""
+    heights = column_heights(bits)
+    height = sum(heights)
+    # Every empty cell under the top of its column is a hole
+    holes = height - bin(bits).count('1')
+    bumpiness = sum(abs(heights[x] - heights[x + 1]) for x in range(GRID_WIDTH - 1))
+    return height, holes, bumpiness
+
+def placements(game, piece=None):
+    """Find every distinct spot a piece can be moved to and locked
+
+    Searches rotations (with wall kicks), sideways moves and soft drops from
+    where the piece is now, with the same collision rules as GameState. A
+    soft drop takes the piece all the way down, and the search carries on
+    from there, so slides under overhangs and tucks are found as well as
+    straight drops. Rotations with the same shape that land in the same
+    cells are only returned once.
+    """
+    board = game.board
+    piece = piece or game.current_piece
+    piece_type = piece['type']
+    shapes = SHAPES[piece_type]
+    start = (piece['x'], piece['y'], piece['rotation'])
+    # State -> (state it was reached from, actions taken from there)
+    parents = {start: None}
+    queue = deque([start])
+    found = {}
+    test = {'type': piece_type, 'x': 0, 'y': 0, 'rotation': 0}
+    while queue:
+        state = queue.popleft()
+        x, y, rotation = state
+        test['x'], test['y'], test['rotation'] = state
+        land_y = game.landing_y(test)
+        key = (shapes[rotation], x, land_y)
+        if key not in found:
+            found[key] = state
+
+        moves = []
+        for action, dx in (('left', -1), ('right', 1)):
+            if board.valid_move(test, x + dx, y, rotation):
+                moves.append(((x + dx, y, rotation), (action,)))
+        new_rotation = (rotation + 1) % 4
+        if board.valid_move(test, x, y, new_rotation):
+            moves.append(((x, y, new_rotation), ('rotate',)))
+        elif try_wall_kick(test, new_rotation, board):
+            moves.append(((test['x'], test['y'], test['rotation']), ('rotate',)))
+        if land_y > y:
+            moves.append(((x, land_y, rotation), ('soft_drop',) * (land_y - y)))
+        for next_state, actions in moves:
+            if next_state not in parents:
+                parents[next_state] = (state, actions)
+                queue.append(next_state)
+
+    result = []
+    for (_, x, land_y), state in found.items():
+        rotation = state[2]
+        path = ['hard_drop']
+        while parents[state] is not None:
+            state, actions = parents[state]
+            path[:0] = actions
+        result.append(Placement(path, x, land_y, rotation))
+    return result
+
+class Autoplayer:
+    """Plays the placement that leaves the best-scoring board"""
+
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+        self.target = None  # (piece, steps left) being steered by inputs()
+        self.waited = 0  # Ticks spent on the first step
+
+    def evaluate(self, bits, lines):
+        """Score a board after a placement that cleared `lines`"""
+        height, holes, bumpiness = board_features(bits)
+        weights = self.weights
+        return (weights['height'] * height + weights['lines'] * lines
+                + weights['holes'] * holes + weights['bumpiness'] * bumpiness)
+
+    def choose(self, game):
+        """Return the best Placement for the current piece"""
+        piece_type = game.current_piece['type']
+        bits = game.board.bits
+        best = None
+        best_score = None
+        for placement in placements(game):
+            after, lines = drop_bits(bits, piece_type, placement.x, placement.y, placement.rotation)
+            score = self.evaluate(after, lines)
+            if best_score is None or score > best_score:
+                best, best_score = placement, score
+        return best
+
+    def play(self, game):
+        """Place the current piece and return the number of lines cleared"""
+        lines = 0
+        for action in self.choose(game).actions:
+            lines += game.step(action)
+        return lines
+
+    def route(self, game, actions):
+        """Return (action, (x, y, rotation) after it) for each of a placement's actions"""
+        piece = dict(game.current_piece)
+        steps = deque()
+        for action in actions:
+            if action == 'left':
+                piece['x'] -= 1
+            elif action == 'right':
+                piece['x'] += 1
+            elif action == 'soft_drop':
+                piece['y'] += 1
+            elif action == 'rotate':
+                new_rotation = (piece['rotation'] + 1) % 4
+                if game.valid_move(piece, piece['x'], piece['y'], new_rotation):
+                    piece['rotation'] = new_rotation
+                else:
+                    try_wall_kick(piece, new_rotation, game.board)
+            steps.append((action, (piece['x'], piece['y'], piece['rotation'])))
+        return steps
+
+    def inputs(self, session):
+        """Return the (presses, held) that steer a Session's piece to the best spot
+
+        Call once per tick, e.g. for attract mode. The placement's actions are
+        replayed the way a player would press them, so moves follow the
+        game's timing rules. If a step stops making progress (a rotation
+        that's blocked, a move gravity took away) the piece is hard dropped
+        where it is.
+        """
+        game = session.game
+        piece = game.current_piece
+        if game.game_over or session.showing_explosion:
+            return [], []
+        if self.target is None or self.target[0] is not piece:
+            self.target = (piece, self.route(game, self.choose(game).actions))
+            self.waited = 0
+        steps = self.target[1]
+        # Skip the steps the piece has made, gravity can do a soft drop's work
+        while steps:
+            action, (x, y, rotation) = steps[0]
+            if (piece['x'], piece['rotation']) != (x, rotation) or action in ('hold', 'hard_drop'):
+                break
+            if action == 'soft_drop' and piece['y'] < y:
+                break
+            steps.popleft()
+            self.waited = 0
+        if not steps:
+            return ['hard_drop'], []
+        action = steps[0][0]
+        self.waited += 1
+        if action in HELD_ACTIONS:
+            if self.waited > (SOFT_DROP_TICKS if action == 'soft_drop' else SHIFT_TICKS):
+                return ['hard_drop'], []
+            return [], [action]
+        # A key press should take effect on the tick it's pressed
+        if self.waited > 1:
+            return ['hard_drop'], []
+        return [action], []
+
+# Search value of a board where the next piece can't be placed
+TOP_OUT = -1e9
+
+class TranspositionTable:
+    """Bounded LRU cache of search values keyed by (board hash, pieces, held piece)"""
+
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        value = self.values.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.values.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Cache a value, evicting the least recently used one if full"""
+        self.values[key] = value
+        if len(self.values) > self.max_entries:
+            self.values.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached values"""
+        self.values.clear()
+
+class LookaheadPlayer(Autoplayer):
+    """Plans `depth` pieces ahead: the current one, then the previews
+
+    Every option for the current piece, with and without using hold, is
+    followed by the best placements of the next pieces. Only the `beam` most
+    promising placements of each piece are searched further, and the value
+    of every searched board is kept in a TranspositionTable, so boards
+    reached again through another order of pieces are only searched once.
+    """
+
+    def __init__(self, weights=None, depth=3, beam=4, table=None):
+        super().__init__(weights)
+        self.depth = depth
+        self.beam = beam
+        self.table = table if table is not None else TranspositionTable()
+
+    def children(self, bits, board_hash, options):
+        """Score every drop of every (piece, rest, held) option, best first
+
+        Returns (immediate score, bits, hash, lines, option) tuples. Hashes
+        are only worked out when board_hash is given.
+        """
+        results = []
+        heights = column_heights(bits)
+        for option in options:
+            piece_type = option[0]
+            for x, y, rotation in drops(heights, piece_type):
+                after, lines = drop_bits(bits, piece_type, x, y, rotation)
+                after_hash = None
+                if board_hash is not None:
+                    after_hash = hash_after_drop(board_hash, bits, after, piece_type, y, rotation, lines)
+                results.append((self.evaluate(after, lines), after, after_hash, lines, option))
+        results.sort(key=lambda child: child[0], reverse=True)
+        return results
+
+    def value(self, score, after, after_hash, lines, rest, held):
+        """Value of a board after a placement: its score, or what the rest of the pieces can reach"""
+        if not rest:
+            return score
+        return self.weights['lines'] * lines + self.search(after, after_hash, rest, held)
+
+    def search(self, bits, board_hash, pieces, held):
+        """Best value reachable by placing `pieces` in order, optionally using hold"""
+        key = (board_hash, pieces, held)
+        value = self.table.get(key)
+        if value is not None:
+            return value
+        # Play the first piece, or hold it and play the held (or next) one instead
+        options = [(pieces[0], pieces[1:], held)]
+        if held is None and len(pieces) > 1:
+            options.append((pieces[1], pieces[2:], pieces[0]))
+        elif held is not None and held != pieces[0]:
+            options.append((held, pieces[1:], pieces[0]))
+        # Boards after the last piece are never searched, so they don't need hashes
+        last = len(pieces) == 1
+        children = self.children(bits, None if last else board_hash, options)
+        value = TOP_OUT
+        for score, after, after_hash, lines, (_, rest, next_held) in children[:self.beam]:
+            value = max(value, self.value(score, after, after_hash, lines, rest, next_held))
+        self.table.put(key, value)
+        return value
+
+    def choose(self, game):
+        """Return the best Placement for the current piece, possibly starting with 'hold'"""
+        held = game.held_piece and game.held_piece['type']
+        queue = tuple(piece['type'] for piece in game.next_pieces)
+        upcoming = queue[:self.depth - 1]
+        # (actions before placing, piece placed, pieces after it, held piece after it)
+        options = [([], game.current_piece, upcoming, held)]
+        if game.can_hold:
+            current_type = game.current_piece['type']
+            if held is None:
+                options.append((['hold'], game.next_pieces[0], queue[1:self.depth], current_type))
+            elif held != current_type:
+                options.append((['hold'], spawn_piece(held), upcoming, current_type))
+        
+        # Placements at the root are exact, with tucks, slides and wall kicks
+        bits = game.board.bits
+        scored = []
+        for prefix, piece, rest, next_held in options:
+            for placement in placements(game, dict(piece)):
+                after, lines = drop_bits(bits, piece['type'], placement.x, placement.y, placement.rotation)
+                after_hash = hash_after_drop(game.board_hash, bits, after, piece['type'],
+                                             placement.y, placement.rotation, lines)
+                scored.append((self.evaluate(after, lines), after, after_hash, lines, rest, next_held,
+                               placement._replace(actions=prefix + placement.actions)))
+        scored.sort(key=lambda option: option[0], reverse=True)
+        
+        best = None
+        best_value = None
+        for score, after, after_hash, lines, rest, next_held, placement in scored[:self.beam]:
+            value = self.value(score, after, after_hash, lines, rest, next_held)
+            if best_value is None or value > best_value:
+                best, best_value = placement, value
+        return best
@@ -0,0 +1,215 @@
+"""Vectorized Food Tetris simulator.
+
+BatchGame steps many boards in lockstep with NumPy. The rules mirror
+GameState in food_engine (collisions, wall kicks, hold, line clears, scoring
+and the character win rule), they are just applied to every board at once.
+"""
+import numpy as np
+
+from food_engine import (
+    ACTIONS,
+    CHARACTER_MAX_FULLNESS,
+    FOOD_TYPES,
+    FULLNESS_PER_LINE,
+    GRID_HEIGHT,
+    GRID_WIDTH,
+    LINE_SCORES,
+    PREVIEW_COUNT,
+    SHAPES,
+    WIN_BONUS,
+)
+
+SPAWN_X = GRID_WIDTH // 2 - 2
+
+# CELLS[type, rotation] holds the (dx, dy) offsets of the 4 cells of a shape
+CELLS = np.array([[shape.cells for shape in SHAPES[food]] for food in FOOD_TYPES], dtype=np.int16)
+
+# Wall kicks tried after a plain rotation fails, in try_wall_kick order
+ROTATION_OFFSETS = ((0, 0), (-1, 0), (1, 0), (0, -1))
+
+LINE_SCORE_TABLE = np.array(LINE_SCORES, dtype=np.int64)
+ROWS = np.arange(GRID_HEIGHT)
+
+class BatchGame:
+    """Many Food Tetris games stepped together
+
+    boards is an (N, GRID_HEIGHT, GRID_WIDTH) uint8 array where 0 is empty and
+    n + 1 is a cell of FOOD_TYPES[n]. Pieces are stored as per-board arrays of
+    type index, x, y and rotation. Actions are indexes into ACTIONS.
+    """
+
+    def __init__(self, count, seed=None):
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((count, GRID_HEIGHT, GRID_WIDTH), dtype=np.uint8)
+        self.piece_type = np.zeros(count, dtype=np.int16)
+        self.x = np.zeros(count, dtype=np.int16)
+        self.y = np.zeros(count, dtype=np.int16)
+        self.rotation = np.zeros(count, dtype=np.int16)
+        self.next_types = np.zeros((count, PREVIEW_COUNT), dtype=np.int16)
+        self.held = np.zeros(count, dtype=np.int16)
+        self.can_hold = np.zeros(count, dtype=bool)
+        self.score = np.zeros(count, dtype=np.int64)
+        self.level = np.zeros(count, dtype=np.int64)
+        self.lines_cleared = np.zeros(count, dtype=np.int64)
+        self.pieces_placed = np.zeros(count, dtype=np.int64)
+        self.character_fullness = np.zeros(count, dtype=np.int64)
+        self.character_exploded = np.zeros(count, dtype=bool)
+        self.game_over = np.zeros(count, dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        """Reset every board, or only the boards selected by mask"""
+        idx = np.arange(self.count) if mask is None else np.flatnonzero(mask)
+        self.boards[idx] = 0
+        self.next_types[idx] = self.rng.integers(len(FOOD_TYPES), size=(len(idx), PREVIEW_COUNT))
+        self.held[idx] = -1
+        self.can_hold[idx] = True
+        self.score[idx] = 0
+        self.level[idx] = 1
+        self.lines_cleared[idx] = 0
+        self.pieces_placed[idx] = 0
+        self.character_fullness[idx] = 0
+        self.character_exploded[idx] = False
+        self.game_over[idx] = False
+        self._spawn(idx)
+
+    def grid(self, i):
+        """Return board i as a list-of-lists grid of food names, like GameState.grid"""
+        return [[FOOD_TYPES[cell - 1] if cell else None for cell in row] for row in self.boards[i]]
+
+    def _spawn(self, idx):
+        """Take the first next piece as current and queue up a new one"""
+        self.piece_type[idx] = self.next_types[idx, 0]
+        self.next_types[idx, :-1] = self.next_types[idx, 1:]
+        self.next_types[idx, -1] = self.rng.integers(len(FOOD_TYPES), size=len(idx))
+        self.x[idx] = SPAWN_X
+        self.y[idx] = 0
+        self.rotation[idx] = 0
+
+    def _cells(self, idx, rotation, x, y):
+        """Absolute cell columns and rows of the pieces on boards idx"""
+        cells = CELLS[self.piece_type[idx], rotation]
+        return x[:, None] + cells[:, :, 0], y[:, None] + cells[:, :, 1]
+
+    def _fits(self, idx, rotation, x, y):
+        """Vectorized valid_move for the pieces on boards idx"""
+        cx, cy = self._cells(idx, rotation, x, y)
+        inside = (cx >= 0) & (cx < GRID_WIDTH) & (cy >= 0) & (cy < GRID_HEIGHT)
+        filled = self.boards[idx[:, None], np.clip(cy, 0, GRID_HEIGHT - 1), np.clip(cx, 0, GRID_WIDTH - 1)] != 0
+        return (inside & ~filled).all(axis=1)
+
+    def _move(self, idx, dx, dy):
+        """Move pieces where possible and return which ones moved"""
+        ok = self._fits(idx, self.rotation[idx], self.x[idx] + dx, self.y[idx] + dy)
+        moved = idx[ok]
+        self.x[moved] += dx
+        self.y[moved] += dy
+        return ok
+
+    def _rotate(self, idx):
+        """Rotate pieces, falling back to the same wall kicks as try_wall_kick"""
+        rotation = (self.rotation[idx] + 1) % 4
+        x = self.x[idx]
+        y = self.y[idx]
+        for dx, dy in ROTATION_OFFSETS:
+            ok = self._fits(idx, rotation, x + dx, y + dy)
+            done = idx[ok]
+            self.x[done] = x[ok] + dx
+            self.y[done] = y[ok] + dy
+            self.rotation[done] = rotation[ok]
+            idx, rotation, x, y = idx[~ok], rotation[~ok], x[~ok], y[~ok]
+            if not len(idx):
+                break
+
+    def _drop_distance(self, idx):
+        """How many rows each piece can fall before it lands"""
+        cx, cy = self._cells(idx, self.rotation[idx], self.x[idx], self.y[idx])
+        columns = self.boards[idx[:, None], :, cx] != 0  # (n, cells, GRID_HEIGHT)
+        below = columns & (ROWS > cy[:, :, None])
+        first = np.where(below.any(axis=2), below.argmax(axis=2), GRID_HEIGHT)
+        return (first - cy - 1).min(axis=1)
+
+    def _hold(self, idx):
+        """Hold the current pieces, or swap them with the held ones"""
+        idx = idx[self.can_hold[idx]]
+        empty = self.held[idx] < 0
+        first, swap = idx[empty], idx[~empty]
+        self.held[first] = self.piece_type[first]
+        self._spawn(first)
+        swapped = self.held[swap]
+        self.held[swap] = self.piece_type[swap]
+        self.piece_type[swap] = swapped
+        self.x[swap] = SPAWN_X
+        self.y[swap] = 0
+        self.rotation[swap] = 0
+        self.can_hold[idx] = False
+        blocked = ~self._fits(idx, self.rotation[idx], self.x[idx], self.y[idx])
+        self.game_over[idx[blocked]] = True
+
+    def _clear_lines(self, idx):
+        """Clear completed lines on boards idx, update score and return the counts"""
+        full = (self.boards[idx] != 0).all(axis=2)
+        lines = full.sum(axis=1)
+        hit = lines > 0
+        if hit.any():
+            sub, full, count = idx[hit], full[hit], lines[hit]
+            # A stable sort moves the full rows to the top, keeping the others in order
+            order = np.argsort(~full, axis=1, kind='stable')
+            boards = np.take_along_axis(self.boards[sub], order[:, :, None], axis=1)
+            boards[ROWS < count[:, None]] = 0
+            self.boards[sub] = boards
+
+            self.score[sub] += LINE_SCORE_TABLE[count] * self.level[sub]
+            self.lines_cleared[sub] += count
+            self.level[sub] = self.lines_cleared[sub] // 10 + 1
+            self.character_fullness[sub] += count * FULLNESS_PER_LINE
+            won = sub[self.character_fullness[sub] >= CHARACTER_MAX_FULLNESS]
+            self.character_exploded[won] = True
+            self.game_over[won] = True
+            self.score[won] += WIN_BONUS * self.level[won]
+        return lines
+
+    def _lock(self, idx):
+        """Lock the pieces on boards idx in place and spawn the next ones"""
+        cx, cy = self._cells(idx, self.rotation[idx], self.x[idx], self.y[idx])
+        self.boards[idx[:, None], cy, cx] = (self.piece_type[idx] + 1)[:, None]
+        lines = self._clear_lines(idx)
+        self.pieces_placed[idx] += 1
+        self._spawn(idx)
+        self.can_hold[idx] = True
+        blocked = ~self._fits(idx, self.rotation[idx], self.x[idx], self.y[idx])
+        self.game_over[idx[blocked]] = True
+        return lines
+
+    def step(self, actions):
+        """Apply one action per board and return the lines each board cleared
+
+        actions is an array of ACTIONS indexes, or a single index for all boards.
+        Boards that are already over are left alone.
+        """
+        actions = np.broadcast_to(np.asarray(actions), (self.count,))
+        lines = np.zeros(self.count, dtype=np.int64)
+        active = ~self.game_over
+        for code, action in enumerate(ACTIONS):
+            idx = np.flatnonzero(active & (actions == code))
+            if not len(idx):
+                continue
+            if action == 'left':
+                self._move(idx, -1, 0)
+            elif action == 'right':
+                self._move(idx, 1, 0)
+            elif action == 'rotate':
+                self._rotate(idx)
+            elif action == 'soft_drop':
+                self._move(idx, 0, 1)
+            elif action == 'hard_drop':
+                self.y[idx] += self._drop_distance(idx)
+                lines[idx] = self._lock(idx)
+            elif action == 'hold':
+                self._hold(idx)
+            elif action == 'gravity':
+                stuck = idx[~self._move(idx, 0, 1)]
+                if len(stuck):
+                    lines[stuck] = self._lock(stuck)
+        return lines
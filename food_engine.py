@@ -0,0 +1,977 @@
+"""Headless Food Tetris engine.
+
+All of the game rules live here so they can run without pygame or a display.
+`GameState` owns one game; create as many as you like in the same process.
+"""
+import random
+from collections import deque, namedtuple
+
+# Board size
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+
+# Points for clearing 0-4 lines at once (multiplied by the level)
+LINE_SCORES = [0, 100, 300, 500, 800]
+
+# Character fullness rules
+FULLNESS_PER_LINE = 20
+CHARACTER_MAX_FULLNESS = 10 * 20  # 10 lines cleared (20 fullness per line)
+WIN_BONUS = 1000  # Bonus points (times level) when the character explodes
+
+# Shapes are drawn in a SHAPE_SIZE x SHAPE_SIZE box
+SHAPE_SIZE = 5
+
+# Number of pieces shown in the "Next" preview
+PREVIEW_COUNT = 3
+
+# Actions understood by GameState.step()
+ACTIONS = ('left', 'right', 'rotate', 'soft_drop', 'hard_drop', 'hold', 'gravity')
+
+# Fixed simulation rate; Session counts every timer in these ticks
+TICK_RATE = 60
+
+def seconds_to_ticks(seconds):
+    """Convert a duration to a whole number of simulation ticks"""
+    return max(1, round(seconds * TICK_RATE))
+
+# Timing rules, in ticks
+GRAVITY_TICKS = seconds_to_ticks(1.0)  # Automatic fall
+SOFT_DROP_TICKS = 1  # Fall while holding down
+SHIFT_TICKS = seconds_to_ticks(0.1)  # Sideways repeat while holding left or right
+LOCK_DELAY_TICKS = seconds_to_ticks(0.5)  # Time on the ground before locking
+EAT_ANIMATION_TICKS = seconds_to_ticks(0.5)
+EXPLOSION_TICKS = seconds_to_ticks(2.0)
+CHARACTER_TIMEOUT_TICKS = seconds_to_ticks(CHARACTER_MAX_FULLNESS)  # The character bursts after this long anyway
+
+# Session.tick() inputs: keys pressed this tick, and keys that repeat while held
+PRESS_ACTIONS = ('rotate', 'hard_drop', 'hold')
+HELD_ACTIONS = ('left', 'right', 'soft_drop')
+
+# Food-themed Tetrominoes
+FOODS = {
+    'fries': {  # I shape - Classic long piece styled as french fries
+        'shape': [
+            ['.....',
+             '.....',
+             'XXXX.',
+             '.....',
+             '.....'],
+            ['..X..',
+             '..X..',
+             '..X..',
+             '..X..',
+             '.....'],
+            ['.....',
+             '.....',
+             'XXXX.',
+             '.....',
+             '.....'],
+            ['..X..',
+             '..X..',
+             '..X..',
+             '..X..',
+             '.....']
+        ],
+        'color': (255, 215, 0)  # Golden yellow for fries
+    },
+    'cheeseburger': {  # O shape - Classic square piece styled as cheeseburger
+        'shape': [
+            ['.....',
+             '.....',
+             '.XX..',
+             '.XX..',
+             '.....'],
+            ['.....',
+             '.....',
+             '.XX..',
+             '.XX..',
+             '.....'],
+            ['.....',
+             '.....',
+             '.XX..',
+             '.XX..',
+             '.....'],
+            ['.....',
+             '.....',
+             '.XX..',
+             '.XX..',
+             '.....']
+        ],
+        'color': (139, 69, 19)  # Brown for burger bun
+    },
+    'chicken': {  # T shape - Classic T piece styled as chicken nuggets
+        'shape': [
+            ['.....',
+             '..X..',
+             '.XXX.',
+             '.....',
+             '.....'],
+            ['.....',
+             '..X..',
+             '.XX..',
+             '..X..',
+             '.....'],
+            ['.....',
+             '.....',
+             '.XXX.',
+             '..X..',
+             '.....'],
+            ['.....',
+             '..X..',
+             '..XX.',
+             '..X..',
+             '.....']
+        ],
+        'color': (210, 180, 140)  # Tan color for chicken
+    },
+    'banana': {  # L shape - Classic L piece styled as banana
+        'shape': [
+            ['.....',
+             '...X.',
+             '.XXX.',
+             '.....',
+             '.....'],
+            ['.....',
+             '.XX..',
+             '..X..',
+             '..X..',
+             '.....'],
+            ['.....',
+             '.....',
+             '.XXX.',
+             '.X...',
+             '.....'],
+            ['.....',
+             '..X..',
+             '..X..',
+             '..XX.',
+             '.....']
+        ],
+        'color': (255, 223, 0)  # Yellow for banana
+    },
+    'carrot': {  # J shape - Classic J piece styled as carrot
+        'shape': [
+            ['.....',
+             '.X...',
+             '.XXX.',
+             '.....',
+             '.....'],
+            ['.....',
+             '..X..',
+             '..X..',
+             '.XX..',
+             '.....'],
+            ['.....',
+             '.....',
+             '.XXX.',
+             '...X.',
+             '.....'],
+            ['.....',
+             '.XX..',
+             '.X...',
+             '.X...',
+             '.....']
+        ],
+        'color': (255, 140, 0)  # Orange for carrot
+    },
+    'pretzel': {  # S shape - Classic S piece styled as pretzel
+        'shape': [
+            ['.....',
+             '.....',
+             '..XX.',
+             '.XX..',
+             '.....'],
+            ['.....',
+             '.X...',
+             '.XX..',
+             '..X..',
+             '.....'],
+            ['.....',
+             '.....',
+             '..XX.',
+             '.XX..',
+             '.....'],
+            ['.....',
+             '.X...',
+             '.XX..',
+             '..X..',
+             '.....']
+        ],
+        'color': (139, 69, 19)  # Brown for pretzel
+    },
+    'pasta': {  # Z shape - Classic Z piece styled as twisted pasta
+        'shape': [
+            ['.....',
+             '.....',
+             '.XX..',
+             '..XX.',
+             '.....'],
+            ['.....',
+             '..X..',
+             '.XX..',
+             '.X...',
+             '.....'],
+            ['.....',
+             '.....',
+             '.XX..',
+             '..XX.',
+             '.....'],
+            ['.....',
+             '..X..',
+             '.XX..',
+             '.X...',
+             '.....']
+        ],
+        'color': (255, 248, 220)  # Cream color for pasta
+    }
+}
+
+# A compiled piece rotation. cells are the (dx, dy) offsets of the filled
+# cells inside the 5x5 shape; bbox is (min_dx, min_dy, max_dx, max_dy);
+# bottom maps each filled column to its lowest filled row as (dx, dy) pairs;
+# left and right map each filled row to its first and last filled column as
+# (dy, dx) pairs.
+Shape = namedtuple('Shape', ['cells', 'bbox', 'bottom', 'left', 'right'])
+
+def compile_shape(rows):
+    """Compile one 'X'/'.' shape grid into a Shape"""
+    cells = tuple((j, i) for i, row in enumerate(rows) for j, cell in enumerate(row) if cell == 'X')
+    xs = [dx for dx, _ in cells]
+    ys = [dy for _, dy in cells]
+    columns = sorted(set(xs))
+    lines = sorted(set(ys))
+    return Shape(
+        cells=cells,
+        bbox=(min(xs), min(ys), max(xs), max(ys)),
+        bottom=tuple((dx, max(dy for x, dy in cells if x == dx)) for dx in columns),
+        left=tuple((dy, min(dx for dx, y in cells if y == dy)) for dy in lines),
+        right=tuple((dy, max(dx for dx, y in cells if y == dy)) for dy in lines)
+    )
+
+def compile_shapes():
+    """Compile every rotation of every food once
+
+    SHAPES[type][rotation] is a Shape. Rotations with the same cells share one
+    Shape object, and UNIQUE_ROTATIONS[type] lists the first rotation index of
+    each distinct shape.
+    """
+    shapes = {}
+    unique = {}
+    for piece_type, food in FOODS.items():
+        compiled = [compile_shape(rows) for rows in food['shape']]
+        seen = {}
+        for rotation, shape in enumerate(compiled):
+            seen.setdefault(shape.cells, (rotation, shape))
+        shapes[piece_type] = tuple(seen[shape.cells][1] for shape in compiled)
+        unique[piece_type] = tuple(rotation for rotation, _ in seen.values())
+    return shapes, unique
+
+SHAPES, UNIQUE_ROTATIONS = compile_shapes()
+
+# Food types in a fixed order, for code that stores pieces as numbers
+FOOD_TYPES = tuple(FOODS)
+
+def spawn_piece(piece_type):
+    """Create a piece of the given type at the spawn position"""
+    return {
+        'type': piece_type,
+        'x': GRID_WIDTH // 2 - 2,
+        'y': 0,
+        'rotation': 0
+    }
+
+def empty_grid():
+    """Create an empty grid"""
+    return [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+
+def build_piece_masks():
+    """Precompute collision masks for every piece, rotation and column
+
+    PIECE_MASKS[type][rotation] is a (top, bottom, masks) tuple. top and bottom
+    are the first and last filled rows of the shape, and masks[x] packs the
+    shape's rows (starting at top) into one integer the same way BitBoard
+    packs the grid. Columns where the piece would stick out of the grid are
+    left out of masks.
+    """
+    masks = {}
+    for piece_type, shapes in SHAPES.items():
+        compiled = {}
+        for shape in shapes:
+            if shape not in compiled:
+                min_dx, top, max_dx, bottom = shape.bbox
+                by_column = {}
+                for x in range(-min_dx, GRID_WIDTH - max_dx):
+                    by_column[x] = sum(1 << ((dy - top) * GRID_WIDTH + x + dx) for dx, dy in shape.cells)
+                compiled[shape] = (top, bottom, by_column)
+        masks[piece_type] = tuple(compiled[shape] for shape in shapes)
+    return masks
+
+PIECE_MASKS = build_piece_masks()
+
+# Cells past each edge of the board that PLACED_MASKS still answers for
+MASK_MARGIN = 4
+
+def build_placed_masks():
+    """Precompute the board mask of every piece at every position
+
+    PLACED_MASKS[type][rotation][y + MASK_MARGIN][x + MASK_MARGIN] is the
+    piece's mask shifted to (x, y) on a BitBoard, or None where the piece
+    would stick out of the grid, so a collision test is two lookups and an
+    AND. Positions up to MASK_MARGIN cells off the board are covered, more
+    than a move or a wall kick can take a piece from a valid spot; anything
+    further out can't be valid and is rejected before the lookup.
+    """
+    placed = {}
+    for piece_type, shapes in SHAPES.items():
+        compiled = {}
+        for shape, (top, bottom, masks) in zip(shapes, PIECE_MASKS[piece_type]):
+            if shape not in compiled:
+                rows = []
+                for y in range(-MASK_MARGIN, GRID_HEIGHT + MASK_MARGIN):
+                    row = [None] * (GRID_WIDTH + 2 * MASK_MARGIN)
+                    if y + top >= 0 and y + bottom < GRID_HEIGHT:
+                        for x, mask in masks.items():
+                            row[x + MASK_MARGIN] = mask << ((y + top) * GRID_WIDTH)
+                    rows.append(row)
+                compiled[shape] = rows
+        placed[piece_type] = tuple(compiled[shape] for shape in shapes)
+    return placed
+
+PLACED_MASKS = build_placed_masks()
+FULL_ROW = (1 << GRID_WIDTH) - 1
+# Bit 0 of every row, the packed mask of column 0
+COLUMN = sum(1 << (r * GRID_WIDTH) for r in range(GRID_HEIGHT))
+EMPTY_ROW = (None,) * GRID_WIDTH
+
+def build_zobrist_keys(seed=0x5eed):
+    """Precompute Zobrist keys for every row and row bitmask
+
+    Every cell gets a random 64-bit key, and ZOBRIST_KEYS[r][mask] is the XOR
+    of the keys of the cells set in `mask` on row r. A board's hash is the
+    XOR over its rows, which is the same as XORing the key of every filled
+    cell, but can be updated a whole row at a time.
+    """
+    rng = random.Random(seed)
+    keys = []
+    for _ in range(GRID_HEIGHT):
+        cells = [rng.getrandbits(64) for _ in range(GRID_WIDTH)]
+        row = [0] * (FULL_ROW + 1)
+        for mask in range(1, FULL_ROW + 1):
+            low = mask & -mask
+            row[mask] = row[mask ^ low] ^ cells[low.bit_length() - 1]
+        keys.append(tuple(row))
+    return tuple(keys)
+
+ZOBRIST_KEYS = build_zobrist_keys()
+
+def zobrist_hash(bits):
+    """Hash a packed board from scratch"""
+    result = 0
+    for r in range(GRID_HEIGHT):
+        result ^= ZOBRIST_KEYS[r][(bits >> (r * GRID_WIDTH)) & FULL_ROW]
+    return result
+
+def zobrist_update(board_hash, old_bits, new_bits, rows):
+    """Update a board hash for changes to the given rows"""
+    for r in rows:
+        shift = r * GRID_WIDTH
+        old_row = (old_bits >> shift) & FULL_ROW
+        new_row = (new_bits >> shift) & FULL_ROW
+        if old_row != new_row:
+            board_hash ^= ZOBRIST_KEYS[r][old_row] ^ ZOBRIST_KEYS[r][new_row]
+    return board_hash
+
+class BitBoard:
+    """Grid occupancy packed into one integer
+
+    Row r is the GRID_WIDTH-bit mask stored at bit r * GRID_WIDTH, with bit x
+    of the row set when column x is filled. A collision test is a shift and
+    a single AND against the whole board.
+    """
+
+    def __init__(self, rows=None):
+        self.bits = 0
+        if rows is not None:
+            for r, row in enumerate(rows):
+                self.bits |= row << (r * GRID_WIDTH)
+
+    @classmethod
+    def from_grid(cls, grid):
+        """Build a bitboard from a list-of-lists grid"""
+        return cls(sum(1 << x for x, cell in enumerate(row) if cell) for row in grid)
+
+    @property
+    def rows(self):
+        """The board as a list of per-row bitmasks, top row first"""
+        return [(self.bits >> (r * GRID_WIDTH)) & FULL_ROW for r in range(GRID_HEIGHT)]
+
+    def valid_move(self, piece, x, y, rotation):
+        """Check if a move is valid"""
+        row = y + MASK_MARGIN
+        column = x + MASK_MARGIN
+        # Further off the board than the masks reach is always outside the grid.
+        # Negative indexes would wrap around, so they're checked first (the OR
+        # of two ints is negative when either one is)
+        if (row | column) < 0:
+            return False
+        try:
+            mask = PLACED_MASKS[piece['type']][rotation][row][column]
+        except IndexError:
+            return False
+        return mask is not None and not self.bits & mask
+
+    def place(self, piece):
+        """Set the cells covered by a piece"""
+        top, _, masks = PIECE_MASKS[piece['type']][piece['rotation']]
+        self.bits |= masks[piece['x']] << ((piece['y'] + top) * GRID_WIDTH)
+
+    def column_height(self, x):
+        """Height of the highest filled cell in a column (0 when empty)"""
+        column = (self.bits >> x) & COLUMN
+        if not column:
+            return 0
+        # The lowest set bit is the topmost filled row
+        return GRID_HEIGHT - ((column & -column).bit_length() - 1) // GRID_WIDTH
+
+    def full_rows(self):
+        """Return the indexes of the completely filled rows"""
+        return [i for i, row in enumerate(self.rows) if row == FULL_ROW]
+
+    def remove_rows(self, indexes):
+        """Remove rows and shift everything above them down"""
+        # Going top to bottom keeps the indexes of the lower rows valid
+        for r in sorted(indexes):
+            above = self.bits & ((1 << (r * GRID_WIDTH)) - 1)
+            below = (self.bits >> ((r + 1) * GRID_WIDTH)) << ((r + 1) * GRID_WIDTH)
+            self.bits = below | (above << GRID_WIDTH)
+
+def valid_move(piece, x, y, rotation, grid):
+    """Check if a move is valid"""
+    if isinstance(grid, BitBoard):
+        return grid.valid_move(piece, x, y, rotation)
+    for dx, dy in SHAPES[piece['type']][rotation].cells:
+        new_x = x + dx
+        new_y = y + dy
+        if new_x < 0 or new_x >= GRID_WIDTH or new_y < 0 or new_y >= GRID_HEIGHT:
+            return False
+        if grid[new_y][new_x]:
+            return False
+    return True
+
+def try_wall_kick(piece, new_rotation, grid):
+    """Try to move the piece left or right to make rotation possible"""
+    # Store original position
+    original_x = piece['x']
+    original_y = piece['y']
+    original_rotation = piece['rotation']
+    
+    # Try moving left
+    if valid_move(piece, piece['x'] - 1, piece['y'], new_rotation, grid):
+        piece['x'] -= 1
+        piece['rotation'] = new_rotation
+        return True
+    
+    # Try moving right
+    if valid_move(piece, piece['x'] + 1, piece['y'], new_rotation, grid):
+        piece['x'] += 1
+        piece['rotation'] = new_rotation
+        return True
+    
+    # Try moving up (for pieces near the bottom)
+    if valid_move(piece, piece['x'], piece['y'] - 1, new_rotation, grid):
+        piece['y'] -= 1
+        piece['rotation'] = new_rotation
+        return True
+    
+    # If no valid wall kick found, restore original position
+    piece['x'] = original_x
+    piece['y'] = original_y
+    piece['rotation'] = original_rotation
+    return False
+
+class UniformRandomizer:
+    """Every food is equally likely for every piece, like the original game"""
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def deal(self):
+        """Return the next batch of food types"""
+        return self.rng.choices(FOOD_TYPES, k=64)
+
+class BagRandomizer:
+    """Deals every food once in a shuffled order, then starts a new bag
+
+    No food can be missing for more than 12 pieces in a row.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def deal(self):
+        """Return the next batch of food types"""
+        bag = list(FOOD_TYPES)
+        self.rng.shuffle(bag)
+        return bag
+
+# Randomizers by the name GameState accepts
+RANDOMIZERS = {
+    'uniform': UniformRandomizer,
+    'bag': BagRandomizer
+}
+
+class GameState:
+    """State of a single Food Tetris game
+
+    Pieces come from `randomizer` (a name from RANDOMIZERS, or a class taking
+    the random generator) driven by the game's own generator. Pass a seed,
+    or an rng, to get the same pieces every time.
+    """
+
+    def __init__(self, rng=None, randomizer='uniform', seed=None):
+        # Each game gets its own random generator so games don't share a sequence
+        self.owns_rng = rng is None
+        self.rng = rng if rng is not None else random.Random()
+        if isinstance(randomizer, str):
+            if randomizer not in RANDOMIZERS:
+                raise ValueError(f"Unknown randomizer: {randomizer}")
+            randomizer = RANDOMIZERS[randomizer]
+        self.randomizer = randomizer(self.rng)
+        self.upcoming = deque()  # Food types dealt ahead of the preview
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """Reset the game state
+
+        The pieces are reseeded with `seed`. A game with its own generator
+        picks a new seed when none is given, so `self.seed` always replays
+        the current game. With a shared rng the sequence just carries on.
+        """
+        if seed is None and self.owns_rng:
+            seed = random.randrange(1 << 32)
+        if seed is not None:
+            self.rng.seed(seed)
+        self.seed = seed
+        self.grid = empty_grid()
+        self.board = BitBoard()
+        self.heights = [0] * GRID_WIDTH  # Height of the stack in each column
+        self.row_counts = [0] * GRID_HEIGHT  # Filled cells in each row
+        self.touched_rows = set()  # Rows merged into since the last clear_lines()
+        self.board_version = 0  # Bumped whenever the board changes
+        self.hash_key = 0  # board_version of hash_value
+        self.hash_value = 0  # Zobrist hash of the empty board
+        self.skyline_key = None  # (type, x, rotation, board_version) of skyline_y
+        self.skyline_y = 0
+        # A new game starts a fresh deal, e.g. a new bag
+        self.upcoming.clear()
+        self.next_pieces = deque(spawn_piece(self.random_type()) for _ in range(PREVIEW_COUNT))
+        self.current_piece = None
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.pieces_placed = 0
+        self.game_over = False
+        self.held_piece = None
+        self.can_hold = True  # Flag to prevent holding multiple times in a row
+        self.character_fullness = 0
+        self.character_exploded = False
+        self.new_piece()
+
+    def snapshot(self):
+        """Return everything needed to restore this game later, as plain data"""
+        return {
+            'seed': self.seed,
+            'rng': self.rng.getstate(),
+            'upcoming': list(self.upcoming),
+            'grid': [list(row) for row in self.grid],
+            'current_piece': dict(self.current_piece),
+            'next_pieces': [dict(piece) for piece in self.next_pieces],
+            'held_piece': self.held_piece and dict(self.held_piece),
+            'can_hold': self.can_hold,
+            'score': self.score,
+            'level': self.level,
+            'lines_cleared': self.lines_cleared,
+            'pieces_placed': self.pieces_placed,
+            'game_over': self.game_over,
+            'character_fullness': self.character_fullness,
+            'character_exploded': self.character_exploded
+        }
+
+    def restore(self, snapshot):
+        """Put the game back in the state of a snapshot()"""
+        version, state, gauss_next = snapshot['rng']
+        self.rng.setstate((version, tuple(state), gauss_next))
+        self.seed = snapshot['seed']
+        self.upcoming = deque(snapshot['upcoming'])
+        self.load_grid(snapshot['grid'])
+        self.touched_rows = set()
+        self.current_piece = dict(snapshot['current_piece'])
+        self.next_pieces = deque(dict(piece) for piece in snapshot['next_pieces'])
+        self.held_piece = snapshot['held_piece'] and dict(snapshot['held_piece'])
+        for name in ('can_hold', 'score', 'level', 'lines_cleared', 'pieces_placed', 'game_over',
+                     'character_fullness', 'character_exploded'):
+            setattr(self, name, snapshot[name])
+
+    def random_type(self):
+        """Take the next food type from the randomizer"""
+        if not self.upcoming:
+            self.upcoming.extend(self.randomizer.deal())
+        return self.upcoming.popleft()
+
+    def new_piece(self):
+        """Take the first next piece as current and queue up a new one"""
+        self.current_piece = self.next_pieces.popleft()
+        self.next_pieces.append(spawn_piece(self.random_type()))
+        return self.current_piece
+
+    def load_grid(self, grid):
+        """Replace the board with a copy of a list-of-lists grid"""
+        self.grid = [list(row) for row in grid]
+        self.board = BitBoard.from_grid(self.grid)
+        self.heights = [self.board.column_height(x) for x in range(GRID_WIDTH)]
+        self.row_counts = [sum(1 for cell in row if cell) for row in self.grid]
+        self.touched_rows = set(range(GRID_HEIGHT))
+        self.board_version += 1
+
+    def valid_move(self, piece, x, y, rotation):
+        """Check if a move is valid on this game's board"""
+        return self.board.valid_move(piece, x, y, rotation)
+
+    def merge_piece(self, piece):
+        """Merge the piece with the grid"""
+        self.board.place(piece)
+        x, y = piece['x'], piece['y']
+        heights = self.heights
+        for dx, dy in SHAPES[piece['type']][piece['rotation']].cells:
+            self.grid[y + dy][x + dx] = piece['type']
+            self.row_counts[y + dy] += 1
+            self.touched_rows.add(y + dy)
+            if heights[x + dx] < GRID_HEIGHT - y - dy:
+                heights[x + dx] = GRID_HEIGHT - y - dy
+        self.board_version += 1
+
+    def clear_lines(self):
+        """Clear completed lines, update score and return the number cleared"""
+        # Only rows the last pieces landed in can have become full
+        full = sorted(r for r in self.touched_rows if self.row_counts[r] == GRID_WIDTH)
+        self.touched_rows.clear()
+        lines = len(full)
+        
+        if lines > 0:
+            self.board.remove_rows(full)
+            self.compact_rows(full)
+            # Every column loses one cell per cleared row, unless its top cell
+            # was cleared and there's a gap below it, so look those up again
+            for x, height in enumerate(self.heights):
+                if GRID_HEIGHT - height in full:
+                    self.heights[x] = self.board.column_height(x)
+                else:
+                    self.heights[x] = height - lines
+            self.board_version += 1
+            self.lines_cleared += lines
+            self.score += LINE_SCORES[lines] * self.level
+            self.level = self.lines_cleared // 10 + 1
+            self.character_fullness += lines * FULLNESS_PER_LINE
+            if self.character_fullness >= CHARACTER_MAX_FULLNESS:
+                self.character_exploded = True
+                self.game_over = True
+                # Add bonus points for winning
+                self.score += WIN_BONUS * self.level
+        return lines
+
+    def compact_rows(self, full):
+        """Remove the cleared rows and put empty ones at the top
+
+        Deleting and inserting list items moves the rows in between in one
+        memory move each, and the cleared row lists are emptied and reused.
+        """
+        grid, counts = self.grid, self.row_counts
+        recycled = []
+        # Going bottom to top keeps the indexes of the higher rows valid
+        for r in reversed(full):
+            row = grid.pop(r)
+            row[:] = EMPTY_ROW
+            recycled.append(row)
+            del counts[r]
+        grid[:0] = recycled
+        counts[:0] = [0] * len(full)
+
+    @property
+    def board_hash(self):
+        """Zobrist hash of the filled cells, 0 when empty
+
+        Worked out when first asked for after the board changes, so a line
+        clear doesn't rehash every row it moves down, and play that never
+        looks at the hash doesn't pay for it.
+        """
+        if self.hash_key != self.board_version:
+            self.hash_value = zobrist_hash(self.board.bits)
+            self.hash_key = self.board_version
+        return self.hash_value
+
+    def landing_y(self, piece):
+        """Row the piece would land on if dropped straight down from where it is"""
+        x, rotation = piece['x'], piece['rotation']
+        key = (piece['type'], x, rotation, self.board_version)
+        if key != self.skyline_key:
+            # Rest the piece's bottom profile on the column heights
+            heights = self.heights
+            self.skyline_y = min(GRID_HEIGHT - heights[x + dx] - 1 - dy
+                                 for dx, dy in SHAPES[piece['type']][rotation].bottom)
+            self.skyline_key = key
+        y = piece['y']
+        if y <= self.skyline_y:
+            return self.skyline_y
+        # The piece slid under an overhang, so the skyline doesn't apply
+        while self.valid_move(piece, x, y + 1, rotation):
+            y += 1
+        return y
+
+    def drop_distance(self, piece):
+        """How many rows the piece can fall before it lands"""
+        return self.landing_y(piece) - piece['y']
+
+    def move(self, dx, dy):
+        """Move the current piece if possible"""
+        piece = self.current_piece
+        if self.valid_move(piece, piece['x'] + dx, piece['y'] + dy, piece['rotation']):
+            piece['x'] += dx
+            piece['y'] += dy
+            return True
+        return False
+
+    def rotate(self):
+        """Rotate the current piece, falling back to wall kicks"""
+        piece = self.current_piece
+        new_rotation = (piece['rotation'] + 1) % 4
+        if self.valid_move(piece, piece['x'], piece['y'], new_rotation):
+            piece['rotation'] = new_rotation
+            return True
+        # try_wall_kick restores the piece if no kick works
+        return try_wall_kick(piece, new_rotation, self.board)
+
+    def is_landed(self):
+        """Check if the current piece is resting on something"""
+        piece = self.current_piece
+        return not self.valid_move(piece, piece['x'], piece['y'] + 1, piece['rotation'])
+
+    def lock_piece(self):
+        """Lock the current piece in place and spawn the next one"""
+        self.merge_piece(self.current_piece)
+        lines = self.clear_lines()
+        self.pieces_placed += 1
+        self.new_piece()
+        self.can_hold = True  # Allow holding again after piece is placed
+        piece = self.current_piece
+        if not self.valid_move(piece, piece['x'], piece['y'], piece['rotation']):
+            self.game_over = True
+        return lines
+
+    def hard_drop(self):
+        """Drop the current piece to the bottom and lock it"""
+        self.current_piece['y'] = self.landing_y(self.current_piece)
+        return self.lock_piece()
+
+    def hold(self):
+        """Hold the current piece, or swap it with the held one"""
+        if not self.can_hold:
+            return False
+        if self.held_piece is None:
+            # If no piece is held, store current piece and get new piece
+            self.held_piece = self.current_piece.copy()
+            self.new_piece()
+        else:
+            # Swap current piece with held piece and reset it to the spawn position
+            swapped = spawn_piece(self.held_piece['type'])
+            self.held_piece = self.current_piece.copy()
+            self.current_piece = swapped
+        self.can_hold = False  # Prevent holding again until piece is placed
+        piece = self.current_piece
+        if not self.valid_move(piece, piece['x'], piece['y'], piece['rotation']):
+            self.game_over = True
+        return True
+
+    def step(self, action):
+        """Apply one action and return the number of lines it cleared
+
+        'gravity' moves the piece down one row and locks it if it can't move.
+        """
+        if self.game_over:
+            return 0
+        if action == 'left':
+            self.move(-1, 0)
+        elif action == 'right':
+            self.move(1, 0)
+        elif action == 'rotate':
+            self.rotate()
+        elif action == 'soft_drop':
+            self.move(0, 1)
+        elif action == 'hard_drop':
+            return self.hard_drop()
+        elif action == 'hold':
+            self.hold()
+        elif action == 'gravity':
+            if not self.move(0, 1):
+                return self.lock_piece()
+        else:
+            raise ValueError(f"Unknown action: {action}")
+        return 0
+
+
+class Session:
+    """A GameState played in fixed simulation ticks instead of wall-clock time
+
+    Each tick() is 1/TICK_RATE seconds of game time. It applies the keys
+    pressed that tick, repeats held keys, and runs gravity, lock delay and
+    the character's eating and explosion timers. Nothing reads a real clock,
+    so the same inputs always play out the same way, at any speed.
+    """
+
+    def __init__(self, game=None):
+        self.game = game if game is not None else GameState()
+        self.reset_timers()
+
+    def reset(self):
+        """Start a new game"""
+        self.game.reset()
+        self.reset_timers()
+
+    def reset_timers(self):
+        """Restart game time at tick 0"""
+        self.tick_count = 0
+        self.last_fall_tick = 0
+        self.last_shift_tick = -SHIFT_TICKS  # The first sideways press moves right away
+        self.landed_tick = None  # Tick the piece touched down, None while it's falling
+        self.eating_until = 0
+        self.explosion_tick = None
+        self.showing_explosion = False
+
+    def snapshot(self):
+        """Return the game and timer state as plain data"""
+        return {
+            'game': self.game.snapshot(),
+            'tick_count': self.tick_count,
+            'last_fall_tick': self.last_fall_tick,
+            'last_shift_tick': self.last_shift_tick,
+            'landed_tick': self.landed_tick,
+            'eating_until': self.eating_until,
+            'explosion_tick': self.explosion_tick,
+            'showing_explosion': self.showing_explosion
+        }
+
+    def restore(self, snapshot):
+        """Put the session back in the state of a snapshot()"""
+        self.game.restore(snapshot['game'])
+        for name in ('tick_count', 'last_fall_tick', 'last_shift_tick', 'landed_tick', 'eating_until',
+                     'explosion_tick', 'showing_explosion'):
+            setattr(self, name, snapshot[name])
+
+    @property
+    def eating(self):
+        """Check if the character is playing its eating animation"""
+        return self.tick_count < self.eating_until
+
+    def eat(self, lines):
+        """Start the eating animation if any lines were cleared"""
+        if lines > 0:
+            self.eating_until = self.tick_count + EAT_ANIMATION_TICKS
+        return lines
+
+    def start_explosion(self):
+        """Show the character exploding, after which the game is over"""
+        self.game.character_exploded = True
+        self.showing_explosion = True
+        self.explosion_tick = self.tick_count
+
+    def tick(self, presses=(), held=()):
+        """Advance the game by one tick and return the number of lines cleared
+
+        presses are PRESS_ACTIONS that happened this tick, held are the
+        HELD_ACTIONS whose keys are down.
+        """
+        game = self.game
+        self.tick_count += 1
+        now = self.tick_count
+        lines = 0
+        
+        if self.showing_explosion:
+            if now - self.explosion_tick >= EXPLOSION_TICKS:
+                self.showing_explosion = False
+                game.game_over = True
+            return 0
+        if game.game_over:
+            return 0
+        
+        for action in presses:
+            if action == 'hold':
+                if game.hold():
+                    self.landed_tick = None
+            elif action == 'rotate':
+                # Reset lock timer on successful rotation
+                if game.rotate():
+                    self.landed_tick = None
+            elif action == 'hard_drop':
+                lines += self.eat(game.hard_drop())
+                self.landed_tick = None
+            else:
+                raise ValueError(f"Unknown action: {action}")
+        
+        if not game.game_over:
+            # Check if piece has landed
+            if self.landed_tick is None and game.is_landed():
+                self.landed_tick = now
+            
+            # Sideways movement repeats while the key is held
+            for action, dx in (('left', -1), ('right', 1)):
+                if action in held and now - self.last_shift_tick >= SHIFT_TICKS:
+                    if game.move(dx, 0):
+                        self.last_shift_tick = now
+                        self.landed_tick = None
+            
+            if 'soft_drop' in held:
+                if now - self.last_fall_tick >= SOFT_DROP_TICKS and game.move(0, 1):
+                    self.last_fall_tick = now
+                    self.landed_tick = None
+            elif now - self.last_fall_tick >= GRAVITY_TICKS:
+                if game.move(0, 1):
+                    self.landed_tick = None
+                elif self.landed_tick is not None and now - self.landed_tick >= LOCK_DELAY_TICKS:
+                    lines += self.eat(game.lock_piece())
+                    self.landed_tick = None
+                self.last_fall_tick = now
+        
+        # The character bursts when it's full, or when time runs out
+        if game.character_exploded or now >= CHARACTER_TIMEOUT_TICKS:
+            self.start_explosion()
+        return lines
+
+class FixedTimestep:
+    """Turns elapsed real time into whole simulation ticks
+
+    Time left over after the last whole tick carries into the next frame,
+    and `alpha` says how far into the next tick it is, for drawing in
+    between ticks. At most max_ticks run per frame so a long stall doesn't
+    snowball into ever longer frames.
+    """
+
+    def __init__(self, tick_rate=TICK_RATE, max_ticks=10):
+        self.tick_rate = tick_rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0  # Elapsed milliseconds times tick_rate, kept exact in integers
+
+    def advance(self, milliseconds):
+        """Add elapsed time and return how many ticks to run for it"""
+        self.accumulator += milliseconds * self.tick_rate
+        ticks = int(self.accumulator // 1000)
+        if ticks > self.max_ticks:
+            # Drop the time we can't catch up on
+            ticks = self.max_ticks
+            self.accumulator = 0
+        else:
+            self.accumulator -= ticks * 1000
+        return ticks
+
+    @property
+    def alpha(self):
+        """Fraction of the next tick that has already elapsed"""
+        return self.accumulator / 1000
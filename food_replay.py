@@ -0,0 +1,238 @@
+"""Recording and playback of Food Tetris sessions.
+
+A replay is the game's seed and randomizer plus every input, stamped with
+the Session tick it happened on. Playing it back re-runs the same ticks, so
+it reproduces the game exactly. Keyframes (full Session snapshots) are
+stored every KEYFRAME_TICKS so playback can jump to any tick without
+simulating everything before it.
+
+File format, version 1:
+
+    b'FTRP', one version byte, then a zlib-compressed payload of
+    varint header length, header JSON (seed, randomizer, tick rate, ticks)
+    varint event count, then per event: varint ticks since the previous
+        event, varint code
+    varint keyframe count, then per keyframe: varint tick, varint index of
+        the first event after it, varint length, snapshot JSON
+
+Event codes below HELD_CODE are presses (indexes into PRESS_ACTIONS). A
+code of HELD_CODE + mask says which HELD_ACTIONS keys are down from that
+tick on, one bit each.
+"""
+import json
+import zlib
+
+from food_engine import (
+    HELD_ACTIONS,
+    PRESS_ACTIONS,
+    RANDOMIZERS,
+    TICK_RATE,
+    GameState,
+    Session
+)
+
+REPLAY_MAGIC = b'FTRP'
+REPLAY_VERSION = 1
+
+# Seconds of game time between keyframes
+KEYFRAME_TICKS = 10 * TICK_RATE
+
+HELD_CODE = 8
+
+def write_varint(out, value):
+    """Append an unsigned integer to a bytearray, 7 bits per byte"""
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    """Read an unsigned integer written by write_varint(), returning (value, new pos)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def held_mask(held):
+    """Pack the held keys into one bit per HELD_ACTIONS entry"""
+    mask = 0
+    for bit, action in enumerate(HELD_ACTIONS):
+        if action in held:
+            mask |= 1 << bit
+    return mask
+
+def randomizer_name(game):
+    """Return the RANDOMIZERS name of the game's randomizer"""
+    for name, randomizer in RANDOMIZERS.items():
+        if type(game.randomizer) is randomizer:
+            return name
+    raise ValueError("Only games using a randomizer from RANDOMIZERS can be recorded")
+
+class Replay:
+    """A recorded session: how it started, its inputs and its keyframes"""
+
+    def __init__(self, seed, randomizer, tick_rate=TICK_RATE):
+        self.seed = seed
+        self.randomizer = randomizer
+        self.tick_rate = tick_rate
+        self.ticks = 0  # Length of the recording
+        self.events = []  # (tick, code) in tick order
+        self.keyframes = []  # (tick, event index, Session snapshot) in tick order
+
+    def dumps(self):
+        """Encode the replay in the binary file format"""
+        payload = bytearray()
+        header = json.dumps({'seed': self.seed, 'randomizer': self.randomizer,
+                             'tick_rate': self.tick_rate, 'ticks': self.ticks}).encode()
+        write_varint(payload, len(header))
+        payload += header
+        write_varint(payload, len(self.events))
+        last_tick = 0
+        for tick, code in self.events:
+            write_varint(payload, tick - last_tick)
+            write_varint(payload, code)
+            last_tick = tick
+        write_varint(payload, len(self.keyframes))
+        for tick, event_index, snapshot in self.keyframes:
+            data = json.dumps(snapshot, separators=(',', ':')).encode()
+            write_varint(payload, tick)
+            write_varint(payload, event_index)
+            write_varint(payload, len(data))
+            payload += data
+        return REPLAY_MAGIC + bytes([REPLAY_VERSION]) + zlib.compress(bytes(payload), 9)
+
+    @classmethod
+    def loads(cls, data):
+        """Decode a replay from the binary file format"""
+        if data[:len(REPLAY_MAGIC)] != REPLAY_MAGIC:
+            raise ValueError("Not a Food Tetris replay")
+        version = data[len(REPLAY_MAGIC)]
+        if version != REPLAY_VERSION:
+            raise ValueError(f"Unsupported replay version: {version}")
+        payload = zlib.decompress(data[len(REPLAY_MAGIC) + 1:])
+        size, pos = read_varint(payload, 0)
+        header = json.loads(payload[pos:pos + size])
+        pos += size
+        replay = cls(header['seed'], header['randomizer'], header['tick_rate'])
+        replay.ticks = header['ticks']
+        count, pos = read_varint(payload, pos)
+        tick = 0
+        for _ in range(count):
+            delta, pos = read_varint(payload, pos)
+            code, pos = read_varint(payload, pos)
+            tick += delta
+            replay.events.append((tick, code))
+        count, pos = read_varint(payload, pos)
+        for _ in range(count):
+            tick, pos = read_varint(payload, pos)
+            event_index, pos = read_varint(payload, pos)
+            size, pos = read_varint(payload, pos)
+            replay.keyframes.append((tick, event_index, json.loads(payload[pos:pos + size])))
+            pos += size
+        return replay
+
+    def save(self, path):
+        """Write the replay to a file"""
+        with open(path, 'wb') as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def load(cls, path):
+        """Read a replay from a file"""
+        with open(path, 'rb') as f:
+            return cls.loads(f.read())
+
+class Recorder:
+    """Plays a Session and records its inputs into a Replay
+
+    Call tick() instead of session.tick(). The session's game must have a
+    seed, which every game with its own generator does.
+    """
+
+    def __init__(self, session):
+        game = session.game
+        if game.seed is None or session.tick_count:
+            raise ValueError("Recording must start from a freshly seeded game")
+        self.session = session
+        self.replay = Replay(game.seed, randomizer_name(game))
+        self.held = 0
+
+    def tick(self, presses=(), held=()):
+        """Run and record one tick, returning the number of lines cleared"""
+        session = self.session
+        replay = self.replay
+        tick = session.tick_count + 1
+        if session.tick_count and session.tick_count % KEYFRAME_TICKS == 0:
+            replay.keyframes.append((session.tick_count, len(replay.events), session.snapshot()))
+        mask = held_mask(held)
+        if mask != self.held:
+            replay.events.append((tick, HELD_CODE + mask))
+            self.held = mask
+        for action in presses:
+            replay.events.append((tick, PRESS_ACTIONS.index(action)))
+        replay.ticks = tick
+        return session.tick(presses, held)
+
+class Player:
+    """Plays a Replay back on a new Session, one tick at a time"""
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.session = Session(GameState(randomizer=replay.randomizer, seed=replay.seed))
+        self.event_index = 0
+        self.held = []
+
+    @property
+    def game(self):
+        """The game being played back"""
+        return self.session.game
+
+    def done(self):
+        """Check if every recorded tick has been played"""
+        return self.session.tick_count >= self.replay.ticks
+
+    def step(self):
+        """Play the next recorded tick, returning the number of lines cleared"""
+        events = self.replay.events
+        tick = self.session.tick_count + 1
+        presses = []
+        while self.event_index < len(events) and events[self.event_index][0] == tick:
+            code = events[self.event_index][1]
+            if code >= HELD_CODE:
+                self.held = [action for bit, action in enumerate(HELD_ACTIONS) if (code - HELD_CODE) >> bit & 1]
+            else:
+                presses.append(PRESS_ACTIONS[code])
+            self.event_index += 1
+        return self.session.tick(presses, self.held)
+
+    def run(self, ticks=None):
+        """Play up to `ticks` more ticks, or to the end of the replay"""
+        end = self.replay.ticks if ticks is None else min(self.replay.ticks, self.session.tick_count + ticks)
+        while self.session.tick_count < end:
+            self.step()
+
+    def seek(self, tick):
+        """Jump to just after `tick`, starting from the nearest keyframe before it"""
+        tick = min(tick, self.replay.ticks)
+        if tick < self.session.tick_count:
+            self.session = Session(GameState(randomizer=self.replay.randomizer, seed=self.replay.seed))
+            self.event_index = 0
+            self.held = []
+        for keyframe_tick, event_index, snapshot in reversed(self.replay.keyframes):
+            if self.session.tick_count < keyframe_tick <= tick:
+                self.session.restore(snapshot)
+                self.event_index = event_index
+                # The held keys carry over from the last change before the keyframe
+                self.held = []
+                for _, code in reversed(self.replay.events[:event_index]):
+                    if code >= HELD_CODE:
+                        self.held = [action for bit, action in enumerate(HELD_ACTIONS)
+                                     if (code - HELD_CODE) >> bit & 1]
+                        break
+                break
+        self.run(tick - self.session.tick_count)
@@ -1,27 +1,59 @@
+import atexit
 import pygame
 import random
 import os
 import sys
 import traceback
-import time
 import math
+import time
+import argparse
+import hashlib
+import io
+import json
+import logging
+import queue
+import struct
+import threading
+from collections import OrderedDict, deque
+
+from food_engine import (
+    FOODS,
+    SHAPES,
+    SHAPE_SIZE,
+    GRID_WIDTH,
+    GRID_HEIGHT,
+    CHARACTER_MAX_FULLNESS,
+    RANDOMIZERS,
+    FixedTimestep,
+    GameState,
+    Session,
+    valid_move,
+    try_wall_kick,
+)
+from food_ai import LookaheadPlayer
+from food_replay import Player, Recorder, Replay
+from food_trace import DEFAULT_CAPACITY, TraceWriter
 
-# Initialize Pygame
-pygame.init()
-pygame.display.set_caption('Food Tetris')
+logger = logging.getLogger(__name__)
 
-# Get the screen info for fullscreen
-screen_info = pygame.display.Info()
-SCREEN_WIDTH = screen_info.current_w
-SCREEN_HEIGHT = screen_info.current_h
+# The game's public names, including the engine helpers it has always offered
+__all__ = [
+    'BLACK', 'FOODS', 'GAME_BG', 'GAME_OVER_MESSAGES', 'GRAY', 'GRID_COLOR', 'GRID_HEIGHT', 'GRID_SIZE',
+    'GRID_WIDTH', 'PAUSE_BUTTON_COLOR', 'PAUSE_BUTTON_HOVER_COLOR', 'PAUSE_BUTTON_MARGIN', 'PAUSE_BUTTON_SIZE',
+    'RED', 'SCREEN_HEIGHT', 'SCREEN_WIDTH', 'SIDEBAR_WIDTH', 'VICTORY_MESSAGES', 'WHITE',
+    'character_max_fullness', 'clear_lines', 'create_food_image', 'draw_character', 'draw_controls',
+    'draw_game_over', 'draw_ghost_piece', 'draw_grid', 'draw_pause', 'draw_pause_button', 'draw_piece',
+    'draw_sidebar', 'load_food_images', 'main', 'merge_piece', 'new_piece', 'process_food_image', 'reset_game',
+    'screen', 'try_wall_kick', 'valid_move'
+]
 
-# Create game window in fullscreen mode
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.FULLSCREEN)
+# Screen size and surface, set up by init_display() when a game starts
+SCREEN_WIDTH = 1280
+SCREEN_HEIGHT = 720
+screen = None
 
 # Constants
 GRID_SIZE = 30
-GRID_WIDTH = 10
-GRID_HEIGHT = 20
 SIDEBAR_WIDTH = 200
 
 # Colors
@@ -38,197 +70,14 @@ PAUSE_BUTTON_HOVER_COLOR = (150, 150, 150)  # Lighter gray
 PAUSE_BUTTON_SIZE = 40
 PAUSE_BUTTON_MARGIN = 20
 
-# Food-themed Tetrominoes
-FOODS = {
-    'fries': {  # I shape - Classic long piece styled as french fries
-        'shape': [
-            ['.....',
-             '.....',
-             'XXXX.',
-             '.....',
-             '.....'],
-            ['..X..',
-             '..X..',
-             '..X..',
-             '..X..',
-             '.....'],
-            ['.....',
-             '.....',
-             'XXXX.',
-             '.....',
-             '.....'],
-            ['..X..',
-             '..X..',
-             '..X..',
-             '..X..',
-             '.....']
-        ],
-        'color': (255, 215, 0)  # Golden yellow for fries
-    },
-    'cheeseburger': {  # O shape - Classic square piece styled as cheeseburger
-        'shape': [
-            ['.....',
-             '.....',
-             '.XX..',
-             '.XX..',
-             '.....'],
-            ['.....',
-             '.....',
-             '.XX..',
-             '.XX..',
-             '.....'],
-            ['.....',
-             '.....',
-             '.XX..',
-             '.XX..',
-             '.....'],
-            ['.....',
-             '.....',
-             '.XX..',
-             '.XX..',
-             '.....']
-        ],
-        'color': (139, 69, 19)  # Brown for burger bun
-    },
-    'chicken': {  # T shape - Classic T piece styled as chicken nuggets
-        'shape': [
-            ['.....',
-             '..X..',
-             '.XXX.',
-             '.....',
-             '.....'],
-            ['.....',
-             '..X..',
-             '.XX..',
-             '..X..',
-             '.....'],
-            ['.....',
-             '.....',
-             '.XXX.',
-             '..X..',
-             '.....'],
-            ['.....',
-             '..X..',
-             '..XX.',
-             '..X..',
-             '.....']
-        ],
-        'color': (210, 180, 140)  # Tan color for chicken
-    },
-    'banana': {  # L shape - Classic L piece styled as banana
-        'shape': [
-            ['.....',
-             '...X.',
-             '.XXX.',
-             '.....',
-             '.....'],
-            ['.....',
-             '.XX..',
-             '..X..',
-             '..X..',
-             '.....'],
-            ['.....',
-             '.....',
-             '.XXX.',
-             '.X...',
-             '.....'],
-            ['.....',
-             '..X..',
-             '..X..',
-             '..XX.',
-             '.....']
-        ],
-        'color': (255, 223, 0)  # Yellow for banana
-    },
-    'carrot': {  # J shape - Classic J piece styled as carrot
-        'shape': [
-            ['.....',
-             '.X...',
-             '.XXX.',
-             '.....',
-             '.....'],
-            ['.....',
-             '..X..',
-             '..X..',
-             '.XX..',
-             '.....'],
-            ['.....',
-             '.....',
-             '.XXX.',
-             '...X.',
-             '.....'],
-            ['.....',
-             '.XX..',
-             '.X...',
-             '.X...',
-             '.....']
-        ],
-        'color': (255, 140, 0)  # Orange for carrot
-    },
-    'pretzel': {  # S shape - Classic S piece styled as pretzel
-        'shape': [
-            ['.....',
-             '.....',
-             '..XX.',
-             '.XX..',
-             '.....'],
-            ['.....',
-             '.X...',
-             '.XX..',
-             '..X..',
-             '.....'],
-            ['.....',
-             '.....',
-             '..XX.',
-             '.XX..',
-             '.....'],
-            ['.....',
-             '.X...',
-             '.XX..',
-             '..X..',
-             '.....']
-        ],
-        'color': (139, 69, 19)  # Brown for pretzel
-    },
-    'pasta': {  # Z shape - Classic Z piece styled as twisted pasta
-        'shape': [
-            ['.....',
-             '.....',
-             '.XX..',
-             '..XX.',
-             '.....'],
-            ['.....',
-             '..X..',
-             '.XX..',
-             '.X...',
-             '.....'],
-            ['.....',
-             '.....',
-             '.XX..',
-             '..XX.',
-             '.....'],
-            ['.....',
-             '..X..',
-             '.XX..',
-             '.X...',
-             '.....']
-        ],
-        'color': (255, 248, 220)  # Cream color for pasta
-    }
-}
+# State of the current game (grid, pieces, score, hold, character fullness)
+game = GameState()
 
-# Character fullness and explosion state
-character_fullness = 0
-character_max_fullness = 10 * 20  # 10 lines cleared (20 fullness per line)
-character_exploded = False
-character_last_eat_time = 0
-character_eat_animation_time = 0.5  # seconds
-character_eating = False
-character_start_time = time.time()
+# Character eating animation state
+character_max_fullness = CHARACTER_MAX_FULLNESS
 
-# Hold piece state
-held_piece = None
-can_hold = True  # Flag to prevent holding multiple times in a row
+# Plays the game in fixed ticks and runs the character's timers
+session = Session(game)
 
 # Game over messages
 GAME_OVER_MESSAGES = [
@@ -282,40 +131,191 @@ def process_food_image(image, food_type=None):
         pygame.draw.rect(image, (255, 255, 255), image.get_rect(), 1)
         return image
 
-def create_food_image(color, label):
-    """Create a colored surface for a food piece with label"""
-    # Create a surface for the food piece
-    surface = pygame.Surface((GRID_SIZE, GRID_SIZE))
-    
-    # Try to load the image first
-    image_paths = [
+# Image file label for each food
+FOOD_LABELS = {
+    'fries': 'fries',
+    'cheeseburger': 'burger',
+    'chicken': 'chicken',
+    'banana': 'banana',
+    'carrot': 'carrot',
+    'pretzel': 'pretzel',
+    'pasta': 'pasta'
+}
+
+def image_paths(label):
+    """Return the image files to try for a food, best first"""
+    return [
         os.path.join('images', f'{label.lower()}.png .webp'),  # Try the exact file name we found
         os.path.join('images', f'{label.lower()}.png'),        # Try .png
         os.path.join('images', f'{label.lower()}.webp')        # Try .webp
     ]
-    
-    for image_path in image_paths:
-        print(f"Trying to load image from: {image_path}")  # Debug print
-        print(f"Does file exist? {os.path.exists(image_path)}")  # Debug print
+
+def read_image_source(image_path):
+    """Read an image file and describe it by path, size, mtime and content hash"""
+    with open(image_path, 'rb') as f:
+        data = f.read()
+        stat = os.fstat(f.fileno())
+    source = {
+        'path': image_path,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'sha256': hashlib.sha256(data).hexdigest()
+    }
+    return data, source
+
+def load_image_source(label):
+    """Load and process the image file for a food
+
+    Returns (image, source) where source records the file's path, stat and
+    hash for the asset bundle, or None if the food has no image file.
+    """
+    for image_path in image_paths(label):
         try:
             if os.path.exists(image_path):
-                print(f"Loading image for {label} from {image_path}")  # Debug print
+                logger.debug("Loading image for %s from %s", label, image_path)
+                data, source = read_image_source(image_path)
                 # Load and scale the image
-                food_image = pygame.image.load(image_path)
+                food_image = pygame.image.load(io.BytesIO(data), image_path)
                 # Process the image with the food type
-                food_image = process_food_image(food_image, label.lower())
-                return food_image
+                return process_food_image(food_image, label.lower()), source
         except Exception as e:
-            print(f"Error loading image {image_path}: {str(e)}")  # Debug print
+            logger.warning("Error loading image %s: %s", image_path, e)
             continue
+    return None
+
+def load_image_file(label):
+    """Load and process the image file for a food, or return None if there isn't one"""
+    loaded = load_image_source(label)
+    return loaded and loaded[0]
+
+# Processed food images cached on disk, so later launches skip decoding them.
+# It lives outside images/ so writing it doesn't change that folder's mtime.
+# The file is BUNDLE_MAGIC, the manifest length, a JSON manifest and then the
+# raw pixels of every image.
+BUNDLE_PATH = os.path.join('.cache', 'food_tiles.bundle')
+BUNDLE_MAGIC = b'FTB1'
+BUNDLE_VERSION = 1  # Bump whenever process_food_image draws something different
+
+def bundle_key(sources):
+    """Hash everything the processed images depend on"""
+    key = {
+        'version': BUNDLE_VERSION,
+        'grid_size': GRID_SIZE,
+        'sources': {food_name: source and [source['path'], source['sha256']]
+                    for food_name, source in sorted(sources.items())}
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def scan_image_sources():
+    """Hash the image file each food would load, without decoding it"""
+    sources = {}
+    for food_name, label in FOOD_LABELS.items():
+        sources[food_name] = None
+        for image_path in image_paths(label):
+            if os.path.exists(image_path):
+                sources[food_name] = read_image_source(image_path)[1]
+                break
+    return sources
+
+def sources_unchanged(sources, directory_mtime):
+    """Check from file stats alone that no image was added, removed or edited"""
+    try:
+        if os.stat('images').st_mtime_ns != directory_mtime:
+            return False
+        for source in sources.values():
+            if source is not None:
+                stat = os.stat(source['path'])
+                if (stat.st_size, stat.st_mtime_ns) != (source['size'], source['mtime']):
+                    return False
+    except OSError:
+        return False
+    return True
+
+def write_bundle(images, sources, path=None):
+    """Write the processed images and their sources to the bundle file"""
+    path = path or BUNDLE_PATH
+    entries = {}
+    pixels = []
+    offset = 0
+    for food_name, image in images.items():
+        mode = 'RGBA' if image.get_flags() & pygame.SRCALPHA else 'RGB'
+        data = pygame.image.tobytes(image, mode)
+        entries[food_name] = {'mode': mode, 'size': image.get_size(), 'offset': offset, 'length': len(data)}
+        pixels.append(data)
+        offset += len(data)
+    try:
+        directory_mtime = os.stat('images').st_mtime_ns
+    except OSError:
+        directory_mtime = None
+    manifest = json.dumps({
+        'key': bundle_key(sources),
+        'directory_mtime': directory_mtime,
+        'sources': sources,
+        'images': entries
+    }).encode()
+    # Write a temporary file and swap it in so a crash never leaves half a bundle
+    temp_path = path + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            f.write(BUNDLE_MAGIC + struct.pack('<I', len(manifest)) + manifest)
+            f.writelines(pixels)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning("Error writing asset bundle %s: %s", path, e)
+
+def load_bundle(path=None):
+    """Load the processed food images from the bundle file
+
+    Returns a dict of images for the foods that have an image file, or None
+    if there's no bundle or any of its inputs changed since it was written.
+    """
+    path = path or BUNDLE_PATH
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    header_size = len(BUNDLE_MAGIC) + 4
+    if data[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+        return None
+    try:
+        manifest_size, = struct.unpack_from('<I', data, len(BUNDLE_MAGIC))
+        manifest = json.loads(data[header_size:header_size + manifest_size])
+    except (struct.error, ValueError):
+        return None
+    sources = manifest['sources']
+    if set(sources) != set(FOOD_LABELS) or manifest['key'] != bundle_key(sources):
+        return None
+    refresh = False
+    if not sources_unchanged(sources, manifest['directory_mtime']):
+        # Something was touched; only the file contents decide if it's stale
+        sources = scan_image_sources()
+        if manifest['key'] != bundle_key(sources):
+            return None
+        refresh = True
     
-    print(f"Falling back to colored block for {label}")  # Debug print
+    images = {}
+    pixels = memoryview(data)[header_size + manifest_size:]
+    for food_name, entry in manifest['images'].items():
+        start = entry['offset']
+        images[food_name] = pygame.image.frombytes(pixels[start:start + entry['length']].tobytes(),
+                                                   tuple(entry['size']), entry['mode'])
+    if refresh:
+        # Store the new file stats so the next launch takes the quick check again
+        write_bundle(images, sources, path)
+    return images
+
+def create_placeholder_image(color, label):
+    """Create a colored block with the food's first letter"""
+    # Create a surface for the food piece
+    surface = pygame.Surface((GRID_SIZE, GRID_SIZE))
     
     # Fill with the base color
     pygame.draw.rect(surface, color, (0, 0, GRID_SIZE, GRID_SIZE))
     
     # Add a letter label as fallback
-    font = pygame.font.Font(None, GRID_SIZE // 2)
+    font = get_font(GRID_SIZE // 2)
     letter = label[0].upper()
     text = font.render(letter, True, (0, 0, 0))
     text_rect = text.get_rect(center=(GRID_SIZE // 2, GRID_SIZE // 2))
@@ -326,147 +326,295 @@ def create_food_image(color, label):
     
     return surface
 
+def create_food_image(color, label):
+    """Create a colored surface for a food piece with label"""
+    food_image = load_image_file(label)
+    if food_image is None:
+        logger.debug("Falling back to colored block for %s", label)
+        food_image = create_placeholder_image(color, label)
+    return food_image
+
 def load_food_images():
     """Load food images or create emoji-based food pieces"""
     food_images = {}
-    food_labels = {
-        'fries': 'fries',
-        'cheeseburger': 'burger',
-        'chicken': 'chicken',
-        'banana': 'banana',
-        'carrot': 'carrot',
-        'pretzel': 'pretzel',
-        'pasta': 'pasta'
-    }
-    
     for food_name in FOODS.keys():
-        food_images[food_name] = create_food_image(FOODS[food_name]['color'], food_labels[food_name])
+        food_images[food_name] = create_food_image(FOODS[food_name]['color'], FOOD_LABELS[food_name])
     
     return food_images
 
+def load_placeholder_images():
+    """Create the colored-letter tiles for every food without touching the disk"""
+    return {food_name: create_placeholder_image(FOODS[food_name]['color'], FOOD_LABELS[food_name])
+            for food_name in FOODS.keys()}
+
+class FoodImageLoader:
+    """Decodes the food images on a background thread
+
+    The game starts with placeholder tiles. Call poll() once per frame to
+    swap in the real images as they finish loading. When every image is
+    done they're written to the asset bundle for the next launch.
+    """
+
+    def __init__(self, bundle_path=None):
+        self.bundle_path = bundle_path
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='food-image-loader', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Load every food image that has a file, one at a time"""
+        images = {}
+        sources = {}
+        for food_name in FOODS.keys():
+            loaded = load_image_source(FOOD_LABELS[food_name])
+            sources[food_name] = None
+            if loaded is not None:
+                images[food_name], sources[food_name] = loaded
+                self.results.put((food_name, images[food_name]))
+        write_bundle(images, sources, self.bundle_path)
+
+    def done(self):
+        """Check if every image has been loaded and swapped in"""
+        return not self.thread.is_alive() and self.results.empty()
+
+    def poll(self):
+        """Swap finished images into food_images and return the foods that changed"""
+        loaded = []
+        while True:
+            try:
+                food_name, food_image = self.results.get_nowait()
+            except queue.Empty:
+                break
+            food_images[food_name] = food_image
+            invalidate_tiles(food_name)
+            loaded.append(food_name)
+        return loaded
+
+# Food images by type, loaded when the game starts
+food_images = {}
+
+# Tile styles packed side by side in the atlas, one column each
+TILE_VARIANTS = ('normal', 'ghost', 'preview')
+
+def make_tile(image, size, variant):
+    """Scale a food image to an opaque tile styled for the given variant
+
+    Every tile is blended onto the background it is always drawn over (an
+    empty grid cell, or the black sidebar for previews), so blitting it
+    never needs alpha blending.
+    """
+    image = pygame.transform.scale(image, (size, size))
+    tile = pygame.Surface((size, size))
+    if variant == 'preview':
+        tile.fill(BLACK)
+    else:
+        tile.fill(GAME_BG)
+        pygame.draw.rect(tile, GRID_COLOR, tile.get_rect(), 1)
+    if variant == 'ghost':
+        # Create a darker, see-through version for the ghost piece
+        image.set_alpha(80)
+        dark_overlay = pygame.Surface((size, size), pygame.SRCALPHA)
+        dark_overlay.fill((0, 0, 0, 100))
+        image.blit(dark_overlay, (0, 0))
+    tile.blit(image, (0, 0))
+    return tile
+
+class TileAtlas:
+    """Every food tile packed into one surface in the display's pixel format
+
+    Foods are laid out one per row and variants one per column. Draw tiles
+    by blitting `surface` with the source area from `rects`, so all the
+    foods, ghosts and previews share a single surface.
+    """
+
+    def __init__(self, images, size):
+        self.images = images
+        self.size = size
+        self.foods = tuple(images)
+        self.rects = {}
+        for row, food_type in enumerate(self.foods):
+            for column, variant in enumerate(TILE_VARIANTS):
+                self.rects[food_type, variant] = pygame.Rect(column * size, row * size, size, size)
+        self.surface = pygame.Surface((len(TILE_VARIANTS) * size, max(len(self.foods), 1) * size))
+        # Match the display format so blits don't convert pixels every frame
+        self.converted = pygame.display.get_surface() is not None
+        if self.converted:
+            self.surface = self.surface.convert()
+        for food_type in self.foods:
+            self.draw_food(food_type)
+
+    def draw_food(self, food_type):
+        """Redraw every variant of one food from its current image"""
+        for variant in TILE_VARIANTS:
+            self.surface.blit(make_tile(self.images[food_type], self.size, variant),
+                              self.rects[food_type, variant])
+
+    def blits(self, target, food_type, variant, positions):
+        """Blit one tile at each (x, y) position on the target surface"""
+        area = self.rects[food_type, variant]
+        target.blits([(self.surface, position, area) for position in positions], False)
+
+# Atlas for the current food images and grid size, built when first needed
+tile_atlas = None
+stale_foods = set()  # Foods whose image changed since their row was drawn
+
+def get_atlas():
+    """Return the tile atlas, rebuilding or patching it if its inputs changed"""
+    global tile_atlas
+    atlas = tile_atlas
+    if (atlas is None or atlas.images is not food_images or atlas.size != GRID_SIZE
+            or atlas.foods != tuple(food_images)
+            or (not atlas.converted and pygame.display.get_surface() is not None)):
+        atlas = tile_atlas = TileAtlas(food_images, GRID_SIZE)
+        stale_foods.clear()
+    while stale_foods:
+        atlas.draw_food(stale_foods.pop())
+    return atlas
+
+def invalidate_tiles(food_type):
+    """Mark one food's tiles for redrawing, e.g. after its image changed"""
+    stale_foods.add(food_type)
+
+def preload_tiles():
+    """Build the atlas with every food's normal, ghost and preview tiles up front"""
+    get_atlas()
+
+def get_tile(food_type, variant='normal'):
+    """Return one food tile as a view into the atlas"""
+    atlas = get_atlas()
+    return atlas.surface.subsurface(atlas.rects[food_type, variant])
+
+# Default font objects by size, created once
+fonts = {}
+font_constructions = 0
+
+def get_font(size):
+    """Return the default font at the given size, loading it only once"""
+    global font_constructions
+    font = fonts.get(size)
+    if font is None:
+        font = pygame.font.Font(None, size)
+        fonts[size] = font
+        font_constructions += 1
+    return font
+
+class TextCache:
+    """Bounded LRU cache of rendered text surfaces keyed by (font size, text, color)"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, size, color):
+        """Return the rendered text, rendering it only on a cache miss"""
+        key = (size, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = get_font(size).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """Drop all cached surfaces"""
+        self.surfaces.clear()
+
+text_cache = TextCache()
+
+def render_text(text, size, color):
+    """Render antialiased text with the default font, using the shared cache"""
+    return text_cache.render(text, size, color)
+
+def text_cache_stats():
+    """Return hit/miss counts for rendered text and how many fonts were loaded"""
+    return {
+        'hits': text_cache.hits,
+        'misses': text_cache.misses,
+        'entries': len(text_cache.surfaces),
+        'font_constructions': font_constructions
+    }
+
+def clear_fonts():
+    """Forget fonts and rendered text, which are invalid once pygame quits"""
+    fonts.clear()
+    text_cache.clear()
+
+pygame.register_quit(clear_fonts)
+
 def new_piece():
     """Create a new piece"""
-    global current_piece, next_pieces
-    if 'next_pieces' not in globals() or not next_pieces:
-        # First piece of the game
-        current_piece = {
-            'type': random.choice(list(FOODS.keys())),
-            'x': GRID_WIDTH // 2 - 2,
-            'y': 0,
-            'rotation': 0
-        }
-        next_pieces = [
-            {
-                'type': random.choice(list(FOODS.keys())),
-                'x': GRID_WIDTH // 2 - 2,
-                'y': 0,
-                'rotation': 0
-            } for _ in range(3)
-        ]
-    else:
-        # Use the first next piece as current and generate a new next piece
-        current_piece = next_pieces[0]
-        next_pieces = next_pieces[1:] + [{
-            'type': random.choice(list(FOODS.keys())),
-            'x': GRID_WIDTH // 2 - 2,
-            'y': 0,
-            'rotation': 0
-        }]
-    return current_piece
-
-def valid_move(piece, x, y, rotation, grid):
-    """Check if a move is valid"""
-    shape = FOODS[piece['type']]['shape'][rotation]
-    for i, row in enumerate(shape):
-        for j, cell in enumerate(row):
-            if cell == 'X':
-                new_x = x + j
-                new_y = y + i
-                if new_x < 0 or new_x >= GRID_WIDTH or new_y < 0 or new_y >= GRID_HEIGHT:
-                    return False
-                if grid[new_y][new_x]:
-                    return False
-    return True
+    return game.new_piece()
 
 def merge_piece(piece):
     """Merge the current piece with the grid"""
-    shape = FOODS[piece['type']]['shape'][piece['rotation']]
-    for i, row in enumerate(shape):
-        for j, cell in enumerate(row):
-            if cell == 'X':
-                grid[piece['y'] + i][piece['x'] + j] = piece['type']
+    game.merge_piece(piece)
+
+def start_eating(lines):
+    """Start the character eating animation if any lines were cleared"""
+    session.eat(lines)
 
 def clear_lines():
     """Clear completed lines and update score"""
-    global score, level, lines_cleared, character_fullness, character_eating, character_last_eat_time, character_exploded, game_over
-    lines = 0
-    for i in range(GRID_HEIGHT):
-        if all(grid[i]):
-            del grid[i]
-            grid.insert(0, [None for _ in range(GRID_WIDTH)])
-            lines += 1
-    
-    if lines > 0:
-        lines_cleared += lines
-        score += [0, 100, 300, 500, 800][lines] * level
-        level = lines_cleared // 10 + 1
-        character_fullness += lines * 20  # Increased fullness per line
-        character_eating = True
-        character_last_eat_time = time.time()
-        if character_fullness >= character_max_fullness:
-            character_exploded = True
-            game_over = True  # Ensure win screen appears immediately
-            # Add bonus points for winning
-            score += 1000 * level
+    lines = game.clear_lines()
+    start_eating(lines)
+    return lines
+
+# White playfield with grid lines, drawn once per grid size
+grid_background = None
+grid_background_key = None  # (GRID_SIZE, GRID_WIDTH, GRID_HEIGHT) it was drawn for
+
+def get_grid_background():
+    """Return the playfield background, redrawing it if the grid dimensions changed"""
+    global grid_background, grid_background_key
+    key = (GRID_SIZE, GRID_WIDTH, GRID_HEIGHT)
+    if grid_background_key != key:
+        grid_background = pygame.Surface((GRID_WIDTH * GRID_SIZE, GRID_HEIGHT * GRID_SIZE))
+        # Fill game area with white background
+        grid_background.fill(GAME_BG)
+        # Draw grid lines
+        for y in range(GRID_HEIGHT):
+            for x in range(GRID_WIDTH):
+                pygame.draw.rect(grid_background, GRID_COLOR,
+                               (x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE), 1)
+        grid_background_key = key
+    return grid_background
 
 def draw_grid():
     """Draw the game grid"""
-    # Fill game area with white background
-    pygame.draw.rect(screen, GAME_BG, (0, 0, GRID_WIDTH * GRID_SIZE, GRID_HEIGHT * GRID_SIZE))
+    screen.blit(get_grid_background(), (0, 0))
     
-    # Draw grid lines
-    for y in range(GRID_HEIGHT):
-        for x in range(GRID_WIDTH):
-            pygame.draw.rect(screen, GRID_COLOR,
-                           (x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE), 1)
-            if grid[y][x]:
-                # Draw individual food block
-                food_type = grid[y][x]
-                food_image = food_images[food_type]
-                # Scale down the food image to fit a single block
-                scaled_image = pygame.transform.scale(food_image, (GRID_SIZE, GRID_SIZE))
-                screen.blit(scaled_image, (x * GRID_SIZE, y * GRID_SIZE))
+    # Draw all the food blocks in one batch straight from the atlas
+    atlas = get_atlas()
+    surface = atlas.surface
+    rects = atlas.rects
+    screen.blits([(surface, (x * GRID_SIZE, y * GRID_SIZE), rects[food_type, 'normal'])
+                  for y, row in enumerate(game.grid)
+                  for x, food_type in enumerate(row) if food_type], False)
 
 def draw_piece(piece, ghost=False):
     """Draw a piece on the screen"""
-    shape = FOODS[piece['type']]['shape'][piece['rotation']]
+    shape = SHAPES[piece['type']][piece['rotation']]
     
     # Draw individual blocks for the piece
-    for i, row in enumerate(shape):
-        for j, cell in enumerate(row):
-            if cell == 'X':
-                # Draw individual food block
-                food_image = food_images[piece['type']]
-                # Scale down the food image to fit a single block
-                scaled_image = pygame.transform.scale(food_image, (GRID_SIZE, GRID_SIZE))
-                
-                if ghost:
-                    # Create a darker ghost version of just this block
-                    ghost_surface = scaled_image.copy()
-                    ghost_surface.set_alpha(80)
-                    dark_overlay = pygame.Surface((GRID_SIZE, GRID_SIZE), pygame.SRCALPHA)
-                    dark_overlay.fill((0, 0, 0, 100))
-                    ghost_surface.blit(dark_overlay, (0, 0))
-                    screen.blit(ghost_surface, ((piece['x'] + j) * GRID_SIZE, (piece['y'] + i) * GRID_SIZE))
-                else:
-                    screen.blit(scaled_image, ((piece['x'] + j) * GRID_SIZE, (piece['y'] + i) * GRID_SIZE))
+    get_atlas().blits(screen, piece['type'], 'ghost' if ghost else 'normal',
+                      [((piece['x'] + j) * GRID_SIZE, (piece['y'] + i) * GRID_SIZE) for j, i in shape.cells])
+
+def get_ghost_piece(piece):
+    """Return a copy of the piece moved down to where it would land"""
+    ghost_piece = piece.copy()
+    ghost_piece['y'] = game.landing_y(piece)
+    return ghost_piece
 
 def draw_ghost_piece(piece):
     """Draw the ghost piece showing where the current piece will land"""
-    ghost_piece = piece.copy()
-    while valid_move(ghost_piece, ghost_piece['x'], ghost_piece['y'] + 1, ghost_piece['rotation'], grid):
-        ghost_piece['y'] += 1
-    draw_piece(ghost_piece, ghost=True)
+    draw_piece(get_ghost_piece(piece), ghost=True)
 
 def draw_sidebar():
     """Draw the sidebar with score, level, and next pieces"""
@@ -474,76 +622,63 @@ def draw_sidebar():
     pygame.draw.rect(screen, BLACK, (GRID_WIDTH * GRID_SIZE, 0, SIDEBAR_WIDTH, SCREEN_HEIGHT))
     
     # Draw score
-    font = pygame.font.Font(None, 36)
-    score_text = font.render(f'Score: {score}', True, WHITE)
+    score_text = render_text(f'Score: {game.score}', 36, WHITE)
     screen.blit(score_text, (GRID_WIDTH * GRID_SIZE + 20, 20))
     
     # Draw level
-    level_text = font.render(f'Level: {level}', True, WHITE)
+    level_text = render_text(f'Level: {game.level}', 36, WHITE)
     screen.blit(level_text, (GRID_WIDTH * GRID_SIZE + 20, 60))
     
     # Draw lines cleared
-    lines_text = font.render(f'Lines: {lines_cleared}', True, WHITE)
+    lines_text = render_text(f'Lines: {game.lines_cleared}', 36, WHITE)
     screen.blit(lines_text, (GRID_WIDTH * GRID_SIZE + 20, 100))
     
     # Draw hold piece section
-    hold_text = font.render('Hold:', True, WHITE)
+    hold_text = render_text('Hold:', 36, WHITE)
     screen.blit(hold_text, (GRID_WIDTH * GRID_SIZE + 20, 160))
     
-    if held_piece:
+    if game.held_piece:
         # Create a copy of the held piece for preview
-        preview_piece = held_piece.copy()
+        preview_piece = game.held_piece.copy()
         
         # Get the shape for the current rotation
-        shape = FOODS[preview_piece['type']]['shape'][preview_piece['rotation']]
+        shape = SHAPES[preview_piece['type']][preview_piece['rotation']]
         
         # Calculate the dimensions of the shape
-        shape_width = len(shape[0]) * GRID_SIZE
-        shape_height = len(shape) * GRID_SIZE
+        shape_width = SHAPE_SIZE * GRID_SIZE
         
         # Calculate piece position (centered in sidebar)
         start_x = GRID_WIDTH * GRID_SIZE + (SIDEBAR_WIDTH - shape_width) // 2
         start_y = 200
         
         # Draw individual blocks for the preview piece
-        for row_idx, row in enumerate(shape):
-            for col_idx, cell in enumerate(row):
-                if cell == 'X':
-                    # Draw individual food block
-                    food_image = food_images[preview_piece['type']]
-                    # Scale down the food image to fit a single block
-                    scaled_image = pygame.transform.scale(food_image, (GRID_SIZE, GRID_SIZE))
-                    screen.blit(scaled_image, (start_x + col_idx * GRID_SIZE, start_y + row_idx * GRID_SIZE))
+        get_atlas().blits(screen, preview_piece['type'], 'preview',
+                          [(start_x + col_idx * GRID_SIZE, start_y + row_idx * GRID_SIZE)
+                           for col_idx, row_idx in shape.cells])
     
     # Draw next pieces
-    next_text = font.render('Next:', True, WHITE)
+    next_text = render_text('Next:', 36, WHITE)
     screen.blit(next_text, (GRID_WIDTH * GRID_SIZE + 20, 300))
     
-    if next_pieces:
-        for i, next_piece in enumerate(next_pieces):
+    if game.next_pieces:
+        for i, next_piece in enumerate(game.next_pieces):
             # Create a copy of the piece for preview
             preview_piece = next_piece.copy()
             
             # Get the shape for the current rotation
-            shape = FOODS[preview_piece['type']]['shape'][preview_piece['rotation']]
+            shape = SHAPES[preview_piece['type']][preview_piece['rotation']]
             
             # Calculate the dimensions of the shape
-            shape_width = len(shape[0]) * GRID_SIZE
-            shape_height = len(shape) * GRID_SIZE
+            shape_width = SHAPE_SIZE * GRID_SIZE
             
             # Calculate piece position (centered in sidebar)
             start_x = GRID_WIDTH * GRID_SIZE + (SIDEBAR_WIDTH - shape_width) // 2
             start_y = 340 + (i * 140)
             
             # Draw individual blocks for the preview piece
-            for row_idx, row in enumerate(shape):
-                for col_idx, cell in enumerate(row):
-                    if cell == 'X':
-                        # Draw individual food block
-                        food_image = food_images[preview_piece['type']]
-                        # Scale down the food image to fit a single block
-                        scaled_image = pygame.transform.scale(food_image, (GRID_SIZE, GRID_SIZE))
-                        screen.blit(scaled_image, (start_x + col_idx * GRID_SIZE, start_y + row_idx * GRID_SIZE))
+            get_atlas().blits(screen, preview_piece['type'], 'preview',
+                              [(start_x + col_idx * GRID_SIZE, start_y + row_idx * GRID_SIZE)
+                               for col_idx, row_idx in shape.cells])
 
 def draw_game_over(selected_message):
     """Draw game over screen"""
@@ -555,29 +690,26 @@ def draw_game_over(selected_message):
     screen.blit(overlay, (0, 0))
     
     # Draw game over text
-    font = pygame.font.Font(None, 74)
-    if character_exploded:
-        text = font.render("You Won!", True, (255, 215, 0))  # Gold color for victory
+    if game.character_exploded:
+        text = render_text("You Won!", 74, (255, 215, 0))  # Gold color for victory
     else:
-        text = font.render("Game Over!", True, (255, 0, 0))
+        text = render_text("Game Over!", 74, (255, 0, 0))
     text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100))
     screen.blit(text, text_rect)
     
     # Draw score
-    font = pygame.font.Font(None, 48)
-    score_text = font.render(f"Score: {score}", True, (255, 255, 255))
+    score_text = render_text(f"Score: {game.score}", 48, (255, 255, 255))
     score_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20))
     screen.blit(score_text, score_rect)
     
     # Draw a single random message
-    font = pygame.font.Font(None, 36)
-    if character_exploded:
+    if game.character_exploded:
         # Select a random victory message
         message = selected_message
     else:
         # Select a random game over message
         message = selected_message
-    message_text = font.render(message, True, (255, 255, 255))
+    message_text = render_text(message, 36, (255, 255, 255))
     message_rect = message_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 40))
     screen.blit(message_text, message_rect)
     
@@ -592,8 +724,7 @@ def draw_game_over(selected_message):
     pygame.draw.rect(screen, (100, 100, 100), (button_x, button_y, button_width, button_height), 2)
     
     # Draw button text
-    button_font = pygame.font.Font(None, 36)
-    button_text = button_font.render("Play Again", True, (255, 255, 255))
+    button_text = render_text("Play Again", 36, (255, 255, 255))
     button_text_rect = button_text.get_rect(center=(button_x + button_width // 2, button_y + button_height // 2))
     screen.blit(button_text, button_text_rect)
     
@@ -617,13 +748,11 @@ def draw_pause():
     pygame.draw.rect(screen, WHITE, (menu_x, menu_y, menu_width, menu_height), 2)
     
     # Draw title
-    font = pygame.font.Font(None, 48)
-    title = font.render('PAUSED', True, WHITE)
+    title = render_text('PAUSED', 48, WHITE)
     title_rect = title.get_rect(center=(SCREEN_WIDTH // 2, menu_y + 40))
     screen.blit(title, title_rect)
     
     # Draw menu options
-    font = pygame.font.Font(None, 36)
     menu_items = [
         "Controls:",
         "← → ↓ : Move",
@@ -634,70 +763,36 @@ def draw_pause():
     ]
     
     for i, text in enumerate(menu_items):
-        item = font.render(text, True, WHITE)
+        item = render_text(text, 36, WHITE)
         item_rect = item.get_rect(center=(SCREEN_WIDTH // 2, menu_y + 100 + i * 40))
         screen.blit(item, item_rect)
 
 def draw_controls():
     """Draw minimal controls at the bottom of the screen"""
-    font = pygame.font.Font(None, 24)
     controls = [
         "P : Pause",
         "R : Restart"
     ]
     
     for i, text in enumerate(controls):
-        control_text = font.render(text, True, BLACK)  # Changed to black text
+        control_text = render_text(text, 24, BLACK)  # Changed to black text
         screen.blit(control_text, (20, SCREEN_HEIGHT - 50 + i * 25))
 
-def try_wall_kick(piece, new_rotation, grid):
-    """Try to move the piece left or right to make rotation possible"""
-    # Store original position
-    original_x = piece['x']
-    original_y = piece['y']
-    original_rotation = piece['rotation']
-    
-    # Try moving left
-    if valid_move(piece, piece['x'] - 1, piece['y'], new_rotation, grid):
-        piece['x'] -= 1
-        piece['rotation'] = new_rotation
-        return True
-    
-    # Try moving right
-    if valid_move(piece, piece['x'] + 1, piece['y'], new_rotation, grid):
-        piece['x'] += 1
-        piece['rotation'] = new_rotation
-        return True
-    
-    # Try moving up (for pieces near the bottom)
-    if valid_move(piece, piece['x'], piece['y'] - 1, new_rotation, grid):
-        piece['y'] -= 1
-        piece['rotation'] = new_rotation
-        return True
-    
-    # If no valid wall kick found, restore original position
-    piece['x'] = original_x
-    piece['y'] = original_y
-    piece['rotation'] = original_rotation
-    return False
-
 def draw_character():
     """Draw the character with dynamic belly size and eating animation"""
-    global character_eating, character_last_eat_time
-    
     # Calculate character position (in the right sidebar)
     char_x = GRID_WIDTH * GRID_SIZE + SIDEBAR_WIDTH + (SCREEN_WIDTH - (GRID_WIDTH * GRID_SIZE + SIDEBAR_WIDTH)) // 2  # Center in the right sidebar
     char_y = SCREEN_HEIGHT - 200  # Position from bottom of screen
     
     # Calculate belly size based on fullness
-    belly_radius = 30 + int(60 * (character_fullness / character_max_fullness))
+    belly_radius = 30 + int(60 * (game.character_fullness / character_max_fullness))
     
     # Calculate body proportions based on fullness
-    body_height = 120 + int(40 * (character_fullness / character_max_fullness))
-    body_width = 60 + int(40 * (character_fullness / character_max_fullness))
+    body_height = 120 + int(40 * (game.character_fullness / character_max_fullness))
+    body_width = 60 + int(40 * (game.character_fullness / character_max_fullness))
     
     # Draw character body
-    if not character_exploded:
+    if not game.character_exploded:
         # Draw legs
         leg_width = 20
         leg_height = 60
@@ -713,7 +808,7 @@ def draw_character():
         
         # Draw body (shirt)
         shirt_color = (0, 0, 255)  # Blue shirt
-        if character_fullness > character_max_fullness * 0.7:  # Shirt starts ripping at 70% fullness
+        if game.character_fullness > character_max_fullness * 0.7:  # Shirt starts ripping at 70% fullness
             shirt_color = (100, 100, 255)  # Lighter blue for stretched shirt
         pygame.draw.rect(screen, shirt_color, (char_x - body_width//2, char_y - body_height//2, body_width, body_height))
         
@@ -737,7 +832,7 @@ def draw_character():
         pygame.draw.circle(screen, (0, 0, 0), (char_x + 8, char_y - body_height//2 - head_radius), eye_radius)  # Right eye
         
         # Draw mouth (changes based on eating state)
-        if character_eating:
+        if session.eating:
             # Open mouth for eating
             pygame.draw.arc(screen, (0, 0, 0), 
                           (char_x - 15, char_y - body_height//2 - head_radius - 5, 30, 20),
@@ -750,12 +845,12 @@ def draw_character():
         
         # Draw pants
         pants_color = (50, 50, 50)  # Dark gray pants
-        if character_fullness > character_max_fullness * 0.8:  # Pants start ripping at 80% fullness
+        if game.character_fullness > character_max_fullness * 0.8:  # Pants start ripping at 80% fullness
             pants_color = (100, 100, 100)  # Lighter gray for stretched pants
         pygame.draw.rect(screen, pants_color, (char_x - body_width//2, char_y + body_height//4, body_width, body_height//2))
         
         # Draw ripping effects when very full
-        if character_fullness > character_max_fullness * 0.9:  # Show ripping at 90% fullness
+        if game.character_fullness > character_max_fullness * 0.9:  # Show ripping at 90% fullness
             # Draw ripping lines on shirt
             rip_color = (200, 200, 200)
             for i in range(3):
@@ -792,32 +887,12 @@ def draw_character():
 
 def reset_game():
     """Reset the game state"""
-    global grid, next_pieces, current_piece, score, level, lines_cleared, game_over, held_piece, can_hold, character_fullness, character_exploded, character_eating, character_start_time, paused
+    global session, paused
     
-    # Reset game state
-    grid = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-    next_pieces = [
-        {
-            'type': random.choice(list(FOODS.keys())),
-            'x': GRID_WIDTH // 2 - 2,
-            'y': 0,
-            'rotation': 0
-        } for _ in range(3)
-    ]
-    current_piece = new_piece()
-    score = 0
-    level = 1
-    lines_cleared = 0
-    game_over = False
+    # Reset game state, character and game time
+    game.reset()
+    session = Session(game)
     paused = False
-    held_piece = None
-    can_hold = True
-    
-    # Reset character state
-    character_fullness = 0
-    character_exploded = False
-    character_eating = False
-    character_start_time = time.time()
 
 def draw_pause_button():
     """Draw the pause button in the top-right corner of the game area"""
@@ -825,12 +900,8 @@ def draw_pause_button():
     button_x = GRID_WIDTH * GRID_SIZE - PAUSE_BUTTON_SIZE - PAUSE_BUTTON_MARGIN
     button_y = PAUSE_BUTTON_MARGIN
     
-    # Get mouse position
-    mouse_x, mouse_y = pygame.mouse.get_pos()
-    
     # Check if mouse is hovering over button
-    is_hovering = (button_x <= mouse_x <= button_x + PAUSE_BUTTON_SIZE and 
-                  button_y <= mouse_y <= button_y + PAUSE_BUTTON_SIZE)
+    is_hovering = pause_button_hovered()
     
     # Draw button background
     button_color = PAUSE_BUTTON_HOVER_COLOR if is_hovering else PAUSE_BUTTON_COLOR
@@ -849,224 +920,622 @@ def draw_pause_button():
     
     return (button_x, button_y, PAUSE_BUTTON_SIZE, PAUSE_BUTTON_SIZE)
 
-def main():
-    """Main game loop"""
-    global current_piece, next_pieces, score, level, lines_cleared, game_over, paused, grid, screen, food_images, character_exploded, character_eating, held_piece, can_hold, play_again_button_rect
+def pause_button_hovered():
+    """Check if the mouse is over the pause button"""
+    button_x = GRID_WIDTH * GRID_SIZE - PAUSE_BUTTON_SIZE - PAUSE_BUTTON_MARGIN
+    button_y = PAUSE_BUTTON_MARGIN
+    mouse_x, mouse_y = pygame.mouse.get_pos()
+    return (button_x <= mouse_x <= button_x + PAUSE_BUTTON_SIZE and 
+            button_y <= mouse_y <= button_y + PAUSE_BUTTON_SIZE)
+
+def draw_frame(selected_message, showing_explosion):
+    """Draw the whole frame, ready to be flipped"""
+    screen.fill(GAME_BG)  # Changed to white background
+    profiler.lap('clear')
     
-    # Initialize Pygame
+    # Draw character first (so it appears behind the grid)
+    draw_character()
+    profiler.lap('draw_character')
+    
+    # Draw game elements
+    draw_grid()
+    profiler.lap('draw_grid')
+    if not game.game_over and not paused and not showing_explosion:
+        draw_ghost_piece(game.current_piece)
+        draw_piece(game.current_piece)
+    profiler.lap('piece')
+    draw_sidebar()
+    profiler.lap('draw_sidebar')
+    
+    # Draw pause button
+    draw_pause_button()
+    
+    if paused:
+        draw_pause()
+    elif game.game_over:
+        draw_game_over(selected_message)
+    profiler.lap('overlays')
+
+def character_rect():
+    """Screen area the character (or its explosion) can draw into"""
+    char_x = GRID_WIDTH * GRID_SIZE + SIDEBAR_WIDTH + (SCREEN_WIDTH - (GRID_WIDTH * GRID_SIZE + SIDEBAR_WIDTH)) // 2
+    char_y = SCREEN_HEIGHT - 200
+    # The explosion lines reach 150 pixels out, which covers the fullest body too
+    return pygame.Rect(char_x - 160, char_y - 160, 320, 320)
+
+def playfield_layers(show_piece):
+    """Map each occupied playfield cell to the tiles drawn on it, bottom first"""
+    layers = {}
+    for y, row in enumerate(game.grid):
+        for x, food_type in enumerate(row):
+            if food_type:
+                layers[(x, y)] = ((food_type, 'normal'),)
+    if show_piece:
+        for piece, variant in ((get_ghost_piece(game.current_piece), 'ghost'), (game.current_piece, 'normal')):
+            for dx, dy in SHAPES[piece['type']][piece['rotation']].cells:
+                cell = (piece['x'] + dx, piece['y'] + dy)
+                layers[cell] = layers.get(cell, ()) + ((piece['type'], variant),)
+    return layers
+
+class DirtyTracker:
+    """Redraws only the parts of the screen that changed since the last frame
+
+    Each region (playfield cells, sidebar, character, pause button) keeps a
+    snapshot of what it showed last frame. draw() redraws the regions whose
+    snapshot changed and returns the rects to pass to pygame.display.update().
+    Call invalidate() whenever something else has drawn over the screen.
+    """
+
+    def __init__(self):
+        self.invalidate()
+
+    def invalidate(self):
+        """Force the next frame to be drawn in full"""
+        self.full = True
+        self.cells = None
+        self.sidebar = None
+        self.character = None
+        self.hovered = None
+
+    def draw(self, showing_explosion):
+        """Draw the changed regions and return the rects that need presenting"""
+        show_piece = not game.game_over and not paused and not showing_explosion
+        cells = playfield_layers(show_piece)
+        held = game.held_piece
+        sidebar = (game.score, game.level, game.lines_cleared,
+                   held and (held['type'], held['rotation']),
+                   tuple((piece['type'], piece['rotation']) for piece in game.next_pieces))
+        character = (game.character_fullness, game.character_exploded, session.eating)
+        # The explosion and the shirt ripping are redrawn with new random bits every frame
+        animating = game.character_exploded or game.character_fullness > character_max_fullness * 0.9
+        hovered = pause_button_hovered()
+        
+        playfield_rect = pygame.Rect(0, 0, GRID_WIDTH * GRID_SIZE, GRID_HEIGHT * GRID_SIZE)
+        sidebar_rect = pygame.Rect(GRID_WIDTH * GRID_SIZE, 0, SIDEBAR_WIDTH, SCREEN_HEIGHT)
+        button_rect = pygame.Rect(GRID_WIDTH * GRID_SIZE - PAUSE_BUTTON_SIZE - PAUSE_BUTTON_MARGIN,
+                                  PAUSE_BUTTON_MARGIN, PAUSE_BUTTON_SIZE, PAUSE_BUTTON_SIZE)
+        redraw_playfield = self.full or cells != self.cells
+        redraw_sidebar = self.full or sidebar != self.sidebar
+        rects = []
+        
+        if self.full:
+            screen.fill(GAME_BG)
+            rects.append(screen.get_rect())
+        profiler.lap('clear')
+        
+        # Character first, then anything it overlaps goes back on top of it
+        if self.full or animating or character != self.character:
+            char_rect = character_rect()
+            if not self.full:
+                screen.fill(GAME_BG, char_rect)
+            draw_character()
+            rects.append(char_rect)
+            if char_rect.colliderect(playfield_rect):
+                redraw_playfield = True
+                rects.append(playfield_rect)
+            if char_rect.colliderect(sidebar_rect):
+                redraw_sidebar = True
+        profiler.lap('draw_character')
+        
+        if redraw_playfield:
+            draw_grid()
+            profiler.lap('draw_grid')
+            if show_piece:
+                draw_ghost_piece(game.current_piece)
+                draw_piece(game.current_piece)
+            profiler.lap('piece')
+            draw_pause_button()
+            if not self.full:
+                old_cells = self.cells
+                for (x, y) in set(cells) | set(old_cells):
+                    if cells.get((x, y)) != old_cells.get((x, y)):
+                        rects.append(pygame.Rect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE))
+        elif hovered != self.hovered:
+            draw_pause_button()
+        if hovered != self.hovered:
+            rects.append(button_rect)
+        profiler.lap('overlays')
+        
+        if redraw_sidebar:
+            draw_sidebar()
+            rects.append(sidebar_rect)
+        profiler.lap('draw_sidebar')
+        
+        self.full = False
+        self.cells = cells
+        self.sidebar = sidebar
+        self.character = character
+        self.hovered = hovered
+        return rects
+
+# Frame phases the profiler times, in the order they run
+PROFILE_PHASES = ('event_pump', 'input', 'simulation', 'assets', 'clear', 'draw_character', 'draw_grid', 'piece',
+                  'draw_sidebar', 'overlays', 'profiler', 'flip', 'clock_tick')
+
+# pygame functions the profiler counts calls to while it's shown, by counter
+COUNTED_FUNCTIONS = {
+    'draws': (pygame.draw, ('rect', 'circle', 'ellipse', 'arc', 'line', 'lines', 'aaline', 'aalines', 'polygon')),
+    'scales': (pygame.transform, ('scale', 'smoothscale'))
+}
+
+# Seconds of frames the overlay's FPS and p99 cover
+PROFILE_HISTORY_SECONDS = 5
+# Seconds between refreshes of the overlay's text
+PROFILE_REFRESH_SECONDS = 0.25
+
+class CountingSurface(pygame.Surface):
+    """Off-screen surface in the display's format that counts blits into a FrameProfiler"""
+
+    def __init__(self, size, profiler, like):
+        super().__init__(size, 0, like)
+        self.profiler = profiler
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        self.profiler.counts['blits'] += 1
+        return super().blit(source, dest, area, special_flags)
+
+    def blits(self, blit_sequence, doreturn=1):
+        if not isinstance(blit_sequence, list):
+            blit_sequence = list(blit_sequence)
+        self.profiler.counts['blits'] += len(blit_sequence)
+        return super().blits(blit_sequence, doreturn)
+
+class FrameProfiler:
+    """Times each phase of every frame and counts draw calls for the F3 overlay
+
+    The main loop calls begin_frame() at the top of every frame and lap()
+    after each phase, which charges the time since the previous lap to that
+    phase. Laps are always timed; draw calls are only counted while the
+    overlay is shown, since that needs pygame's functions wrapped and the
+    frame drawn to a CountingSurface. With a `tracer` (a TraceWriter) every
+    frame and lap is also recorded as a trace span.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.visible = False
+        self.frames = deque()  # (start time, frame ms, {phase: ms}, counts) of recent frames
+        self.frame_start = None
+        self.last_lap = None
+        self.phases = {}
+        self.counts = dict.fromkeys(('blits', 'draws', 'scales', 'fonts'), 0)
+        self.fonts_before = font_constructions
+        self.originals = {}
+        self.lines = []  # Rendered overlay text
+        self.refreshed = None
+        self.tracer = None
+
+    def begin_frame(self):
+        """Finish the previous frame's record and start timing a new one"""
+        now = self.clock()
+        if self.frame_start is not None:
+            if self.tracer:
+                self.tracer.complete('frame', self.frame_start, now)
+            self.counts['fonts'] = font_constructions - self.fonts_before
+            self.frames.append((self.frame_start, (now - self.frame_start) * 1000, self.phases, self.counts))
+            while self.frames and self.frames[0][0] + self.frames[0][1] / 1000 < now - PROFILE_HISTORY_SECONDS:
+                self.frames.popleft()
+        self.frame_start = self.last_lap = now
+        self.phases = {}
+        self.counts = dict.fromkeys(self.counts, 0)
+        self.fonts_before = font_constructions
+
+    def lap(self, phase):
+        """Charge the time since the last lap to a phase of this frame"""
+        now = self.clock()
+        if self.last_lap is not None:
+            self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last_lap) * 1000
+            # Phases named after a draw function already get that function's own span
+            if self.tracer and phase not in TRACED_DRAW_FUNCTIONS:
+                self.tracer.complete(phase, self.last_lap, now)
+        self.last_lap = now
+
+    def frame_times(self):
+        """Milliseconds each recorded frame took, oldest first"""
+        return [frame_ms for _, frame_ms, _, _ in self.frames]
+
+    def fps(self):
+        """Frames per second over the recorded frames"""
+        total = sum(self.frame_times())
+        return 1000 * len(self.frames) / total if total else 0.0
+
+    def p99(self):
+        """99th percentile frame time over the recorded frames"""
+        times = sorted(self.frame_times())
+        return times[min(len(times) - 1, len(times) * 99 // 100)] if times else 0.0
+
+    def count_calls(self, counter, function):
+        """Wrap a pygame function so every call bumps a counter"""
+        def counted(*args, **kwargs):
+            self.counts[counter] += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def show(self, visible):
+        """Show or hide the overlay, starting or stopping draw call counting"""
+        global screen
+        if visible == self.visible:
+            return
+        self.visible = visible
+        display = pygame.display.get_surface()
+        if visible:
+            for counter, (module, names) in COUNTED_FUNCTIONS.items():
+                for name in names:
+                    function = getattr(module, name)
+                    self.originals[module, name] = function
+                    setattr(module, name, self.count_calls(counter, function))
+            if display is not None:
+                screen = CountingSurface(display.get_size(), self, display)
+        else:
+            for (module, name), function in self.originals.items():
+                setattr(module, name, function)
+            self.originals.clear()
+            if display is not None:
+                screen = display
+        self.refreshed = None
+
+    def rect(self):
+        """Screen area of the overlay, right of the sidebar where nothing else draws"""
+        return pygame.Rect(GRID_WIDTH * GRID_SIZE + SIDEBAR_WIDTH + 10, 10, 260, 20 + 18 * (len(PROFILE_PHASES) + 5))
+
+    def draw(self):
+        """Draw the overlay for the last finished frame, without counting its own draw calls"""
+        counts = dict(self.counts)
+        fonts = font_constructions
+        if self.frames and (self.refreshed is None or self.clock() - self.refreshed >= PROFILE_REFRESH_SECONDS):
+            self.refreshed = self.clock()
+            _, frame_ms, phases, frame_counts = self.frames[-1]
+            worst = {phase: max(frame[2].get(phase, 0.0) for frame in self.frames) for phase in PROFILE_PHASES}
+            text = [f'{frame_ms:5.1f} ms  {self.fps():5.1f} FPS  p99 {self.p99():5.1f} ms',
+                    f'{"phase":<15}{"ms":>7}{"max":>7}']
+            text += [f'{phase:<15}{phases.get(phase, 0.0):7.2f}{worst[phase]:7.2f}' for phase in PROFILE_PHASES]
+            text.append(f'blits {frame_counts["blits"]}  draws {frame_counts["draws"]}')
+            text.append(f'scales {frame_counts["scales"]}  fonts {frame_counts["fonts"]}')
+            # Rendered directly, since numbers that change every refresh would churn the text cache
+            font = get_font(20)
+            self.lines = [font.render(line, True, WHITE) for line in text]
+        rect = self.rect()
+        screen.fill(BLACK, rect)
+        for i, line in enumerate(self.lines):
+            screen.blit(line, (rect.x + 10, rect.y + 10 + 18 * i))
+        self.counts = counts
+        self.fonts_before += font_constructions - fonts
+        return rect
+
+profiler = FrameProfiler()
+
+def present(rects=None):
+    """Show the frame, all of it or just the given rects
+
+    While the profiler counts draw calls the frame is drawn off-screen, so
+    it's copied to the display first.
+    """
+    display = pygame.display.get_surface()
+    if screen is not display:
+        if rects is None:
+            display.blit(screen, (0, 0))
+        else:
+            display.blits([(screen, rect, rect) for rect in rects], False)
+    if rects is None:
+        pygame.display.flip()
+    else:
+        pygame.display.update(rects)
+
+# Functions recorded as their own spans by --trace
+TRACED_DRAW_FUNCTIONS = ('draw_character', 'draw_grid', 'draw_ghost_piece', 'draw_piece', 'draw_sidebar',
+                         'draw_pause_button', 'draw_pause', 'draw_game_over')
+TRACED_GAME_METHODS = ('merge_piece', 'clear_lines')
+
+def start_tracing(path, capacity=DEFAULT_CAPACITY):
+    """Record the main loop's phases and every draw function to a Chrome trace file"""
+    tracer = TraceWriter(path, capacity)
+    profiler.tracer = tracer
+    module = globals()
+    for name in TRACED_DRAW_FUNCTIONS:
+        module[name] = tracer.traced(name, module[name])
+    # Whatever way the game ends, the last events still get written
+    atexit.register(stop_tracing)
+    return tracer
+
+def stop_tracing():
+    """Put the draw functions back and write out the rest of the trace"""
+    tracer = profiler.tracer
+    if tracer is None:
+        return
+    atexit.unregister(stop_tracing)
+    profiler.tracer = None
+    module = globals()
+    for name in TRACED_DRAW_FUNCTIONS:
+        module[name] = module[name].untraced
+    tracer.close()
+
+def init_display():
+    """Initialize pygame and open a window the size of the desktop"""
+    global screen, SCREEN_WIDTH, SCREEN_HEIGHT
     pygame.init()
     pygame.display.set_caption('Food Tetris')
     
+    # Get the screen info so the window fills the desktop
+    screen_info = pygame.display.Info()
+    SCREEN_WIDTH = screen_info.current_w
+    SCREEN_HEIGHT = screen_info.current_h
+    
     # Create game window
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    return screen
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='A food-themed Tetris game')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='only redraw and present the parts of the screen that changed')
+    parser.add_argument('--headless', action='store_true',
+                        help='run the game without drawing, as fast as possible in virtual time')
+    parser.add_argument('--ticks', type=int, default=None,
+                        help='stop after this many simulation ticks')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the pieces, to play the same game again')
+    parser.add_argument('--randomizer', choices=sorted(RANDOMIZERS), default='uniform',
+                        help='how pieces are picked: uniform, or every food once per bag of 7')
+    parser.add_argument('--replay', metavar='PATH',
+                        help='play back a recorded game instead of playing')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='playback speed for --replay, e.g. 10 for ten times real time')
+    parser.add_argument('--autoplay', action='store_true',
+                        help='let the computer play, starting a new game after each one ends')
+    parser.add_argument('--no-record', action='store_true',
+                        help=f'don\'t save a replay of each game in {REPLAY_DIR}/')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='record the main loop\'s phases to a Chrome trace file (chrome://tracing, Perfetto)')
+    parser.add_argument('--trace-events', type=int, default=DEFAULT_CAPACITY,
+                        help='events per trace file before it is moved to PATH.1 and a new one started')
+    return parser.parse_args(argv)
+
+# Every game is recorded here when it ends
+REPLAY_DIR = 'replays'
+
+def save_replay(replay):
+    """Save a game's replay in REPLAY_DIR and return its path, or None if it couldn't be written"""
+    path = os.path.join(REPLAY_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{replay.seed}.ftr")
+    try:
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+        replay.save(path)
+    except OSError as e:
+        logger.warning("Error saving replay %s: %s", path, e)
+        return None
+    logger.info("Saved replay to %s", path)
+    return path
+
+# Keys that repeat while held, and the Session action for each
+HELD_KEYS = (('left', pygame.K_LEFT), ('right', pygame.K_RIGHT), ('soft_drop', pygame.K_DOWN))
+
+def main(argv=None):
+    """Main game loop"""
+    global game, session, paused, food_images
     
-    # Load food images
-    food_images = load_food_images()
+    options = parse_args(argv)
     
-    # Initialize game state
-    reset_game()
+    if options.headless:
+        # Nothing is drawn, but pygame still needs a display for events
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
     
-    # Initialize clock
-    clock = pygame.time.Clock()
+    # Initialize Pygame and create the game window
+    init_display()
+    
+    image_loader = None
+    if not options.headless:
+        # Use the baked images from the last launch if nothing changed since.
+        # Otherwise start with placeholder tiles and load the real images in the background
+        food_images = load_placeholder_images()
+        bundled_images = load_bundle()
+        if bundled_images is not None:
+            food_images.update(bundled_images)
+        preload_tiles()
+        if bundled_images is None:
+            image_loader = FoodImageLoader()
+    
+    # Initialize game state, either a new game or a recorded one to play back
+    player = None
+    recorder = None
+    paused = False
+    if options.replay:
+        player = Player(Replay.load(options.replay))
+        game = player.game
+        session = player.session
+    else:
+        game = GameState(seed=options.seed, randomizer=options.randomizer)
+        session = Session(game)
+        if not options.no_record:
+            recorder = Recorder(session)
+    
+    tracer = None
+    if options.trace:
+        tracer = start_tracing(options.trace, options.trace_events)
+        tracer.instrument(game, TRACED_GAME_METHODS)
     
-    # Initialize last move time for continuous movement
-    last_move_time = 0
-    last_horizontal_move_time = 0
-    move_delay = 16  # milliseconds between moves when holding down (about 60 moves per second)
-    horizontal_move_delay = 100
+    if options.headless and player:
+        # Nothing to wait for, so play the whole recording in one go
+        player.run(options.ticks)
+        stop_tracing()
+        print(f"Seed: {game.seed}  Score: {game.score}  Lines: {game.lines_cleared}  "
+              f"Level: {game.level}  Pieces: {game.pieces_placed}  Ticks: {session.tick_count}")
+        return
     
-    # Variables for piece locking
-    piece_lock_delay = 500  # milliseconds before piece locks in place
-    piece_lock_timer = 0
-    piece_has_landed = False
+    # The computer plays instead of the keyboard in autoplay mode
+    autoplayer = LookaheadPlayer() if options.autoplay and not player else None
+    game_over_time = None  # When the autoplayed game ended
+    
+    # The game advances in fixed ticks, however often frames are drawn
+    clock = pygame.time.Clock()
+    timestep = FixedTimestep(max_ticks=max(10, math.ceil(10 * options.speed)))
+    elapsed = 0  # Milliseconds the last frame took
+    presses = []  # Keys pressed since the last tick
+    ticks_run = 0
     
-    # Variables for explosion animation
-    explosion_start_time = 0
-    explosion_duration = 2.0  # 2 seconds for explosion animation
-    showing_explosion = False
     selected_message = None  # Store the selected message
     
+    # Tracks changed screen regions when only those are presented
+    dirty_tracker = DirtyTracker()
+    
     # Main game loop
     while True:
-        current_time = pygame.time.get_ticks()
+        profiler.begin_frame()
         
         # Handle events
-        for event in pygame.event.get():
+        events = pygame.event.get()
+        profiler.lap('event_pump')
+        for event in events:
             if event.type == pygame.QUIT:
+                if recorder and recorder.replay.ticks:
+                    save_replay(recorder.replay)
+                stop_tracing()
                 pygame.quit()
                 sys.exit()
             
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+                # The window contents may have been lost, so redraw everything
+                dirty_tracker.invalidate()
+            
             if event.type == pygame.MOUSEBUTTONDOWN:
                 # Check if play again button was clicked
-                if game_over and play_again_button_rect and play_again_button_rect.collidepoint(event.pos):
+                if (game.game_over and not player and play_again_button_rect
+                        and play_again_button_rect.collidepoint(event.pos)):
                     reset_game()
-                    showing_explosion = False
                     selected_message = None
+                    presses.clear()
+                    if not options.no_record:
+                        recorder = Recorder(session)
             
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_p:
                     paused = not paused
-                elif event.key == pygame.K_r and game_over:
+                elif event.key == pygame.K_F3 and not options.headless:
+                    # Frame time and draw call overlay
+                    profiler.show(not profiler.visible)
+                    dirty_tracker.invalidate()
+                elif event.key == pygame.K_r and game.game_over and not player:
                     reset_game()
-                    showing_explosion = False
                     selected_message = None
+                    presses.clear()
+                    if not options.no_record:
+                        recorder = Recorder(session)
                 
-                if not paused and not game_over and not showing_explosion:
-                    if event.key == pygame.K_c and can_hold:
+                if not paused and not game.game_over and not session.showing_explosion and not player:
+                    if event.key == pygame.K_c:
                         # Hold piece functionality
-                        if held_piece is None:
-                            # If no piece is held, store current piece and get new piece
-                            held_piece = current_piece.copy()
-                            current_piece = new_piece()
-                        else:
-                            # Swap current piece with held piece
-                            temp_piece = current_piece.copy()
-                            current_piece = held_piece.copy()
-                            held_piece = temp_piece.copy()
-                            # Reset position and rotation for the swapped piece
-                            current_piece['x'] = GRID_WIDTH // 2 - 2
-                            current_piece['y'] = 0
-                            current_piece['rotation'] = 0
-                        can_hold = False  # Prevent holding again until piece is placed
-                        piece_has_landed = False
-                        piece_lock_timer = 0
+                        presses.append('hold')
                     elif event.key == pygame.K_UP:
-                        # Store original state
-                        original_rotation = current_piece['rotation']
-                        original_x = current_piece['x']
-                        original_y = current_piece['y']
-                        
-                        # Try rotation
-                        new_rotation = (current_piece['rotation'] + 1) % 4
-                        if valid_move(current_piece, current_piece['x'], current_piece['y'], new_rotation, grid):
-                            current_piece['rotation'] = new_rotation
-                            # Reset lock timer on successful rotation
-                            piece_has_landed = False
-                            piece_lock_timer = 0
-                        else:
-                            # Try wall kicks if direct rotation isn't possible
-                            if try_wall_kick(current_piece, new_rotation, grid):
-                                # Reset lock timer on successful wall kick
-                                piece_has_landed = False
-                                piece_lock_timer = 0
-                            else:
-                                # If no valid rotation found, restore original state
-                                current_piece['rotation'] = original_rotation
-                                current_piece['x'] = original_x
-                                current_piece['y'] = original_y
+                        # Try rotation, falling back to wall kicks
+                        presses.append('rotate')
                     elif event.key == pygame.K_SPACE:
-                        while valid_move(current_piece, current_piece['x'], current_piece['y'] + 1, current_piece['rotation'], grid):
-                            current_piece['y'] += 1
-                        merge_piece(current_piece)
-                        clear_lines()
-                        current_piece = new_piece()
-                        can_hold = True  # Allow holding again after piece is placed
-                        piece_has_landed = False
-                        piece_lock_timer = 0
-                        if not valid_move(current_piece, current_piece['x'], current_piece['y'], current_piece['rotation'], grid):
-                            game_over = True
+                        presses.append('hard_drop')
+        profiler.lap('input')
         
-        if not paused and not game_over and not showing_explosion:
-            # Handle continuous movement
+        # Without a display game time is virtual, so the next tick runs right away
+        ticks = 1 if options.headless else timestep.advance(elapsed * (options.speed if player else 1))
+        if not paused and ticks:
             keys = pygame.key.get_pressed()
-            
-            # Check if piece has landed
-            if not piece_has_landed and not valid_move(current_piece, current_piece['x'], current_piece['y'] + 1, current_piece['rotation'], grid):
-                piece_has_landed = True
-                piece_lock_timer = current_time
-            
-            # Handle left movement
-            if keys[pygame.K_LEFT] and current_time - last_horizontal_move_time > horizontal_move_delay:
-                if valid_move(current_piece, current_piece['x'] - 1, current_piece['y'], current_piece['rotation'], grid):
-                    current_piece['x'] -= 1
-                    last_horizontal_move_time = current_time
-                    # Reset lock timer on successful move
-                    piece_has_landed = False
-                    piece_lock_timer = 0
-            
-            # Handle right movement
-            if keys[pygame.K_RIGHT] and current_time - last_horizontal_move_time > horizontal_move_delay:
-                if valid_move(current_piece, current_piece['x'] + 1, current_piece['y'], current_piece['rotation'], grid):
-                    current_piece['x'] += 1
-                    last_horizontal_move_time = current_time
-                    # Reset lock timer on successful move
-                    piece_has_landed = False
-                    piece_lock_timer = 0
-            
-            # Handle down movement
-            if keys[pygame.K_DOWN] and current_time - last_move_time > move_delay:
-                if valid_move(current_piece, current_piece['x'], current_piece['y'] + 1, current_piece['rotation'], grid):
-                    current_piece['y'] += 1
-                    last_move_time = current_time
-                    # Reset lock timer on successful move
-                    piece_has_landed = False
-                    piece_lock_timer = 0
-            elif not keys[pygame.K_DOWN]:
-                # Move piece down automatically
-                if current_time - last_move_time > 1000:  # 1 second between automatic falls
-                    if valid_move(current_piece, current_piece['x'], current_piece['y'] + 1, current_piece['rotation'], grid):
-                        current_piece['y'] += 1
-                        last_move_time = current_time
-                        # Reset lock timer on successful move
-                        piece_has_landed = False
-                        piece_lock_timer = 0
+            held = [action for action, key in HELD_KEYS if keys[key]]
+            for _ in range(ticks):
+                tick_start = tracer.clock() if tracer else None
+                if player:
+                    if player.done():
+                        break
+                    player.step()
+                else:
+                    if autoplayer:
+                        presses, held = autoplayer.inputs(session)
+                    if recorder:
+                        recorder.tick(presses, held)
                     else:
-                        # Check if piece should lock
-                        if piece_has_landed and current_time - piece_lock_timer > piece_lock_delay:
-                            merge_piece(current_piece)
-                            clear_lines()
-                            current_piece = new_piece()
-                            can_hold = True  # Allow holding again after piece is placed
-                            piece_has_landed = False
-                            piece_lock_timer = 0
-                            if not valid_move(current_piece, current_piece['x'], current_piece['y'], current_piece['rotation'], grid):
-                                game_over = True
-                        last_move_time = current_time
+                        session.tick(presses, held)
+                presses = []
+                ticks_run += 1
+                if tracer:
+                    tracer.complete('tick', tick_start)
         
-        # Draw everything
-        screen.fill(GAME_BG)  # Changed to white background
+        # Keep the replay of every game that ends
+        if recorder and game.game_over:
+            save_replay(recorder.replay)
+            recorder = None
         
-        # Draw character first (so it appears behind the grid)
-        draw_character()
+        # Autoplay shows the game over screen for a few seconds, then plays again
+        if autoplayer and game.game_over and not options.headless:
+            if game_over_time is None:
+                game_over_time = pygame.time.get_ticks()
+            elif pygame.time.get_ticks() - game_over_time > 3000:
+                reset_game()
+                selected_message = None
+                game_over_time = None
+                if not options.no_record:
+                    recorder = Recorder(session)
         
-        # Draw game elements
-        draw_grid()
-        if not game_over and not paused and not showing_explosion:
-            draw_ghost_piece(current_piece)
-            draw_piece(current_piece)
-        draw_sidebar()
+        # Select a random message when the explosion starts
+        if session.showing_explosion and selected_message is None:
+            selected_message = random.choice(VICTORY_MESSAGES)
+        profiler.lap('simulation')
         
-        # Draw pause button and get its rect
-        pause_button_rect = draw_pause_button()
+        if options.headless:
+            if game.game_over or (options.ticks is not None and ticks_run >= options.ticks):
+                if recorder:
+                    save_replay(recorder.replay)
+                print(f"Seed: {game.seed}  Score: {game.score}  Lines: {game.lines_cleared}  "
+                      f"Level: {game.level}  Pieces: {game.pieces_placed}  Ticks: {ticks_run}")
+                stop_tracing()
+                return
+            continue
         
-        if paused:
-            draw_pause()
-        elif game_over:
-            draw_game_over(selected_message)
+        # Swap in any food images that finished loading
+        if image_loader and not image_loader.done() and image_loader.poll():
+            preload_tiles()
+            dirty_tracker.invalidate()
+        profiler.lap('assets')
         
-        pygame.display.flip()
-        clock.tick(60)
-
-        # Update character eating state
-        if character_eating and time.time() - character_last_eat_time > character_eat_animation_time:
-            character_eating = False
-            
-        # Handle explosion and win screen sequence
-        if character_exploded and not showing_explosion:
-            showing_explosion = True
-            explosion_start_time = time.time()
-            # Select a random message when explosion starts
-            selected_message = random.choice(VICTORY_MESSAGES)
-        elif showing_explosion:
-            if time.time() - explosion_start_time > explosion_duration:
-                showing_explosion = False
-                game_over = True
-        elif not character_exploded and time.time() - character_start_time > character_max_fullness:
-            character_exploded = True
-            showing_explosion = True
-            explosion_start_time = time.time()
-            # Select a random message when explosion starts
-            selected_message = random.choice(VICTORY_MESSAGES)
+        # Draw everything
+        if options.dirty_rects and not paused and not game.game_over:
+            rects = dirty_tracker.draw(session.showing_explosion)
+            if profiler.visible:
+                rects.append(profiler.draw())
+                profiler.lap('profiler')
+            if rects:
+                present(rects)
+        else:
+            # Overlays cover the whole screen, so they always get a full frame
+            draw_frame(selected_message, session.showing_explosion)
+            if profiler.visible:
+                profiler.draw()
+                profiler.lap('profiler')
+            present()
+            dirty_tracker.invalidate()
+        profiler.lap('flip')
+        elapsed = clock.tick(60)
+        profiler.lap('clock_tick')
+        
+        if options.ticks is not None and ticks_run >= options.ticks:
+            if recorder:
+                save_replay(recorder.replay)
+            stop_tracing()
+            return
 
 if __name__ == "__main__":
     try:
@@ -1074,6 +1543,7 @@ if __name__ == "__main__":
         os.environ['SDL_VIDEO_CENTERED'] = '1'
         
         # Print debugging information
+        pygame.display.init()
         print("Python version:", sys.version)
         print("Pygame version:", pygame.version.ver)
         print("Display driver:", pygame.display.get_driver())
@@ -0,0 +1,177 @@
+"""Chrome trace-event export for Food Tetris.
+
+TraceWriter records timed spans (the phases of a frame, each draw function,
+ticks, merges and line clears) and writes them as a trace-event JSON file
+that chrome://tracing and https://ui.perfetto.dev open directly.
+
+Recording a span only appends a tuple to a queue. A background thread
+formats the new spans every `flush_seconds` and appends them to the file,
+so each flush costs only what was recorded since the last one, and a crash
+loses at most one flush interval. The queue holds at most `max_pending`
+spans; if the thread falls that far behind, the oldest are dropped and
+counted in `overflowed` rather than growing memory without limit. The file uses the JSON array format,
+which the trace viewers open even without its closing bracket.
+
+Once the file holds `capacity` spans it is closed, moved to e.g.
+trace.1.json (replacing the one before) and a new file is started, so a
+long session keeps between one and two files' worth of its most recent
+events on disk. Spans are written as complete ('X') events, which carry
+their own begin time and duration, so starting a new file never leaves a
+begin without its end.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Spans per trace file, about four minutes of frames at 60 FPS
+DEFAULT_CAPACITY = 200000
+
+# Seconds between appends to the trace file
+FLUSH_SECONDS = 2.0
+
+# Spans waiting for the writer thread, about half a minute of frames when it stalls
+MAX_PENDING = 50000
+
+class TraceWriter:
+    """Records spans and appends them to a Chrome trace file in the background
+
+    Times passed to complete() are seconds from `clock`, the same clock the
+    caller measures with.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, flush_seconds=FLUSH_SECONDS, clock=time.perf_counter,
+                 max_pending=MAX_PENDING):
+        self.path = path
+        root, extension = os.path.splitext(path)
+        self.previous_path = f'{root}.1{extension}'
+        self.capacity = capacity
+        self.clock = clock
+        self.origin = clock()
+        self.pid = os.getpid()
+        self.pending = deque(maxlen=max_pending)  # (name, start, end, thread id) not yet written
+        self.file = None
+        self.file_spans = 0  # Spans in the current file
+        self.recorded = 0
+        self.dropped = 0  # Spans in files that were replaced
+        self.overflowed = 0  # Spans pushed out of a full queue before they were written
+        self.names = {}  # Span name -> its JSON string
+        self.threads = {}  # Thread id -> thread name
+        self.flush_seconds = flush_seconds
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='trace-writer', daemon=True)
+        self.thread.start()
+
+    def complete(self, name, start, end=None):
+        """Record a span that started at `start` and ends at `end`, or now"""
+        if end is None:
+            end = self.clock()
+        pending = self.pending
+        # Appending to a full queue silently pushes out its oldest span
+        if len(pending) == pending.maxlen:
+            self.overflowed += 1
+        pending.append((name, start, end, threading.get_ident()))
+
+    def traced(self, name, function):
+        """Wrap a function so every call is recorded as a span"""
+        clock = self.clock
+        complete = self.complete
+
+        @functools.wraps(function)
+        def traced_function(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                complete(name, start)
+        traced_function.untraced = function
+        return traced_function
+
+    def instrument(self, obj, names):
+        """Trace calls to some of an object's methods, e.g. a game's merge_piece"""
+        for name in names:
+            setattr(obj, name, self.traced(name, getattr(obj, name)))
+
+    def run(self):
+        """Background thread: append new spans to the trace file every flush interval"""
+        while not self.stopping.wait(self.flush_seconds):
+            self.flush()
+
+    def thread_metadata(self, thread):
+        """Return the event naming a thread in the trace viewer"""
+        return json.dumps({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': thread,
+                           'args': {'name': self.threads[thread]}})
+
+    def start_file(self):
+        """Start a new trace file, naming the process and every thread seen so far"""
+        self.file = open(self.path, 'w')
+        self.file_spans = 0
+        metadata = [json.dumps({'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                                'args': {'name': 'Food Tetris'}})]
+        metadata += [self.thread_metadata(thread) for thread in self.threads]
+        self.file.write('[\n' + ',\n'.join(metadata))
+
+    def end_file(self):
+        """Close the current trace file with its closing bracket"""
+        self.file.write('\n]\n')
+        self.file.close()
+        self.file = None
+
+    def rotate(self):
+        """Move the full trace file aside, replacing the previous one"""
+        self.end_file()
+        if os.path.exists(self.previous_path):
+            self.dropped += self.capacity
+        os.replace(self.path, self.previous_path)
+        self.start_file()
+
+    def drain(self):
+        """Format the pending spans, returning their JSON strings"""
+        pending = self.pending
+        names = self.names
+        origin = self.origin
+        pid = self.pid
+        spans = []
+        while pending:
+            name, start, end, thread = pending.popleft()
+            encoded = names.get(name)
+            if encoded is None:
+                encoded = names[name] = json.dumps(name)
+            if thread not in self.threads:
+                self.threads[thread] = next((t.name for t in threading.enumerate() if t.ident == thread),
+                                            str(thread))
+            spans.append(f'{{"name":{encoded},"ph":"X","ts":{(start - origin) * 1e6:.1f},'
+                         f'"dur":{(end - start) * 1e6:.1f},"pid":{pid},"tid":{thread}}}')
+        return spans
+
+    def flush(self):
+        """Append the spans recorded since the last flush to the trace file"""
+        known_threads = len(self.threads)
+        spans = self.drain()
+        if not spans:
+            return
+        if self.file is None:
+            self.start_file()
+        else:
+            for thread in list(self.threads)[known_threads:]:
+                self.file.write(',\n' + self.thread_metadata(thread))
+        written = 0
+        while written < len(spans):
+            if self.file_spans == self.capacity:
+                self.rotate()
+            chunk = spans[written:written + self.capacity - self.file_spans]
+            self.file.write(',\n' + ',\n'.join(chunk))
+            self.file_spans += len(chunk)
+            written += len(chunk)
+        self.file.flush()
+        self.recorded += written
+
+    def close(self):
+        """Stop the background thread, write everything recorded and finish the file"""
+        self.stopping.set()
+        self.thread.join()
+        self.flush()
+        if self.file is not None:
+            self.end_file()
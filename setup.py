@@ -4,12 +4,17 @@ setup(
     name="food-tetris",
     version="1.0.0",
     packages=find_packages(),
+    py_modules=["food_tetris", "food_engine", "food_batch", "food_replay", "food_ai", "food_sim", "food_trace"],
     install_requires=[
         "pygame>=2.5.2",
     ],
+    extras_require={
+        "sim": ["numpy>=1.20"],
+    },
     entry_points={
         'console_scripts': [
             'food-tetris=food_tetris:main',
+            'food-tetris-sim=food_sim:main',
         ],
     },
     author="Gabriel Baldwin",
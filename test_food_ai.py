@@ -0,0 +1,235 @@
+import unittest
+import random
+from food_engine import (
+    FOODS,
+    GRID_WIDTH,
+    GRID_HEIGHT,
+    GRAVITY_TICKS,
+    UNIQUE_ROTATIONS,
+    GameState,
+    Session,
+    empty_grid,
+    zobrist_hash
+)
+from food_ai import (
+    Autoplayer,
+    LookaheadPlayer,
+    TranspositionTable,
+    board_features,
+    drop_bits,
+    hash_after_drop,
+    placements,
+    Placement
+)
+
+def random_game(seed):
+    """Return a game with some random junk at the bottom of the board"""
+    rng = random.Random(seed)
+    game = GameState(seed=seed)
+    grid = [[rng.choice([None, 'carrot']) if y > GRID_HEIGHT - 6 else None for _ in range(GRID_WIDTH)]
+            for y in range(GRID_HEIGHT)]
+    game.load_grid(grid)
+    return game
+
+def overhang_game():
+    """Return a game dealing a cheeseburger next to a roof over the two left columns
+
+    The only way into the space under the roof is to drop down column 2
+    and slide left along the floor.
+    """
+    game = GameState(seed=1)
+    grid = empty_grid()
+    grid[GRID_HEIGHT - 3][0] = grid[GRID_HEIGHT - 3][1] = 'fries'
+    game.load_grid(grid)
+    game.current_piece.update(type='cheeseburger', x=3, y=0, rotation=0)
+    return game
+
+def tuck(game):
+    """Return the placement that fills the bottom left corner"""
+    piece_type = game.current_piece['type']
+    for placement in placements(game):
+        bits, _ = drop_bits(game.board.bits, piece_type, placement.x, placement.y, placement.rotation)
+        if bits >> ((GRID_HEIGHT - 1) * GRID_WIDTH) & 1:
+            return placement
+    return None
+
+class TestPlacements(unittest.TestCase):
+    def test_every_column_on_empty_board(self):
+        """Test that each distinct rotation can reach every column"""
+        game = GameState(seed=1)
+        for piece_type in FOODS:
+            piece = game.current_piece
+            piece.update(type=piece_type, x=GRID_WIDTH // 2 - 2, y=0, rotation=0)
+            expected = sum(sum(1 for x in range(-2, GRID_WIDTH) if game.valid_move(piece, x, 0, rotation))
+                           for rotation in UNIQUE_ROTATIONS[piece_type])
+            self.assertEqual(len(placements(game)), expected)
+
+    def test_actions_reach_placement(self):
+        """Test that playing a placement's actions locks the piece where it says"""
+        for seed in range(10):
+            game = random_game(seed)
+            for placement in placements(game):
+                copy = random_game(seed)
+                for action in placement.actions[:-1]:
+                    copy.step(action)
+                piece = copy.current_piece
+                self.assertEqual((piece['x'], piece['rotation']), (placement.x, placement.rotation))
+                self.assertEqual(copy.landing_y(piece), placement.y)
+
+    def test_tuck_under_overhang(self):
+        """Test that the search slides pieces under overhangs"""
+        game = overhang_game()
+        placement = tuck(game)
+        self.assertIsNotNone(placement)
+        self.assertIn('soft_drop', placement.actions)
+        for action in placement.actions:
+            game.step(action)
+        self.assertEqual(game.grid[GRID_HEIGHT - 1][0], 'cheeseburger')
+
+    def test_drop_bits_matches_game(self):
+        """Test that the search's board matches the one the game ends up with"""
+        for seed in range(10):
+            game = random_game(seed)
+            placement = placements(game)[seed]
+            bits, lines = drop_bits(game.board.bits, game.current_piece['type'],
+                                    placement.x, placement.y, placement.rotation)
+            for action in placement.actions:
+                lines -= game.step(action)
+            self.assertEqual(bits, game.board.bits)
+            self.assertEqual(lines, 0)
+
+class TestAutoplayer(unittest.TestCase):
+    def test_board_features(self):
+        """Test height, holes and bumpiness of a small board"""
+        game = GameState(seed=1)
+        grid = empty_grid()
+        grid[GRID_HEIGHT - 3][0] = 'fries'
+        grid[GRID_HEIGHT - 1][0] = 'fries'
+        grid[GRID_HEIGHT - 1][1] = 'fries'
+        game.load_grid(grid)
+        self.assertEqual(board_features(game.board.bits), (4, 1, 3))
+
+    def test_plays_well(self):
+        """Test that the autoplayer fills the character up without topping out"""
+        autoplayer = Autoplayer()
+        for seed in range(3):
+            game = GameState(seed=seed)
+            while not game.game_over:
+                autoplayer.play(game)
+            self.assertTrue(game.character_exploded)
+
+    def test_session_inputs(self):
+        """Test that steering a Session with key presses plays the chosen placements"""
+        autoplayer = Autoplayer()
+        session = Session(GameState(seed=4))
+        game = session.game
+        chosen = Autoplayer().choose(game)
+        first = game.current_piece
+        while game.current_piece is first:
+            session.tick(*autoplayer.inputs(session))
+        expected = GameState(seed=4)
+        for action in chosen.actions:
+            expected.step(action)
+        self.assertEqual(game.grid, expected.grid)
+
+    def test_session_replays_tuck(self):
+        """Test that key presses follow the placement's path, not just its column"""
+        autoplayer = Autoplayer()
+        session = Session(overhang_game())
+        game = session.game
+        piece = game.current_piece
+        autoplayer.target = (piece, autoplayer.route(game, tuck(game).actions))
+        while game.pieces_placed == 0:
+            session.tick(*autoplayer.inputs(session))
+        self.assertEqual(game.grid[GRID_HEIGHT - 1][0], 'cheeseburger')
+
+    def test_session_gives_up_on_blocked_moves(self):
+        """Test that a step that can't be made hard drops the piece instead of waiting"""
+        autoplayer = Autoplayer()
+        session = Session(GameState(seed=4))
+        game = session.game
+        blocked = Placement(['left'] * GRID_WIDTH + ['hard_drop'], -5, 0, 0)
+        autoplayer.target = (game.current_piece, autoplayer.route(game, blocked.actions))
+        ticks = 0
+        while game.pieces_placed == 0:
+            session.tick(*autoplayer.inputs(session))
+            ticks += 1
+        self.assertLess(ticks, GRAVITY_TICKS)
+
+class TestLookahead(unittest.TestCase):
+    def test_transposition_table(self):
+        """Test that the table counts hits and evicts the least recently used value"""
+        table = TranspositionTable(max_entries=2)
+        table.put('a', 1.0)
+        table.put('b', 2.0)
+        self.assertEqual(table.get('a'), 1.0)
+        table.put('c', 3.0)
+        self.assertIsNone(table.get('b'))
+        self.assertEqual(table.get('c'), 3.0)
+        self.assertEqual((table.hits, table.misses), (2, 1))
+
+    def test_hash_after_drop(self):
+        """Test that search hashes match hashing the dropped boards from scratch"""
+        for seed in range(10):
+            game = random_game(seed)
+            piece_type = game.current_piece['type']
+            bits = game.board.bits
+            for placement in placements(game):
+                after, lines = drop_bits(bits, piece_type, placement.x, placement.y, placement.rotation)
+                self.assertEqual(hash_after_drop(game.board_hash, bits, after, piece_type,
+                                                 placement.y, placement.rotation, lines),
+                                 zobrist_hash(after))
+
+    def test_hold_searches_full_depth(self):
+        """Test that holding into an empty slot still looks depth pieces ahead"""
+        class RootPlayer(LookaheadPlayer):
+            """Records the pieces left after each placement choose() scores"""
+            level = 0
+            def value(self, score, after, after_hash, lines, rest, held):
+                if self.level == 0:
+                    self.rests.append((held, rest))
+                self.level += 1
+                try:
+                    return super().value(score, after, after_hash, lines, rest, held)
+                finally:
+                    self.level -= 1
+
+        player = RootPlayer(depth=3, beam=1000)
+        player.rests = []
+        game = GameState(seed=2)
+        self.assertIsNone(game.held_piece)
+        player.choose(game)
+        queue = tuple(piece['type'] for piece in game.next_pieces)
+        self.assertEqual(set(player.rests), {(None, queue[:2]),
+                                             (game.current_piece['type'], queue[1:3])})
+
+    def test_plays_well(self):
+        """Test that lookahead, hold included, fills the character up and reuses searched boards"""
+        player = LookaheadPlayer()
+        held = 0
+        for seed in range(3):
+            game = GameState(seed=seed)
+            while not game.game_over:
+                held += player.choose(game).actions[0] == 'hold'
+                player.play(game)
+            self.assertTrue(game.character_exploded)
+        self.assertGreater(held, 0)
+        self.assertGreater(player.table.hits, 0)
+
+    def test_session_inputs(self):
+        """Test that a Session steered by lookahead places pieces where it planned"""
+        player = LookaheadPlayer()
+        session = Session(GameState(seed=5))
+        game = session.game
+        while game.pieces_placed < 20 and not game.game_over:
+            expected = GameState(seed=5)
+            expected.restore(game.snapshot())
+            for action in player.choose(game).actions:
+                expected.step(action)
+            placed = game.pieces_placed
+            while game.pieces_placed == placed and not game.game_over:
+                session.tick(*player.inputs(session))
+            self.assertEqual(game.grid, expected.grid)
+
+if __name__ == '__main__':
+    unittest.main()
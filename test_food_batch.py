@@ -0,0 +1,76 @@
+import unittest
+import random
+from collections import deque
+from food_engine import (
+    ACTIONS,
+    FOOD_TYPES,
+    GRID_WIDTH,
+    GRID_HEIGHT,
+    GameState,
+    spawn_piece
+)
+
+try:
+    import numpy as np
+    from food_batch import BatchGame
+except ImportError:
+    np = None
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestBatchGame(unittest.TestCase):
+    def make_games(self, count, seed):
+        """Make a batch and matching GameStates with the same partly filled boards"""
+        rng = random.Random(seed)
+        batch = BatchGame(count, seed=seed)
+        games = []
+        for i in range(count):
+            grid = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
+            for y in range(GRID_HEIGHT - rng.randint(0, 8), GRID_HEIGHT):
+                # Leave one gap per row so line clears are easy to reach
+                gap = rng.randrange(GRID_WIDTH)
+                grid[y] = [None if x == gap else rng.choice(FOOD_TYPES) for x in range(GRID_WIDTH)]
+            batch.boards[i] = [[FOOD_TYPES.index(cell) + 1 if cell else 0 for cell in row] for row in grid]
+            game = GameState()
+            game.load_grid(grid)
+            games.append(game)
+        return batch, games
+
+    def sync_pieces(self, batch, game, i):
+        """Give a GameState the same current and next pieces as board i"""
+        piece = game.current_piece
+        piece['type'] = FOOD_TYPES[batch.piece_type[i]]
+        piece['x'], piece['y'], piece['rotation'] = int(batch.x[i]), int(batch.y[i]), int(batch.rotation[i])
+        game.next_pieces = deque(spawn_piece(FOOD_TYPES[t]) for t in batch.next_types[i])
+
+    def test_matches_game_state(self):
+        """Test that random play gives the same boards and scores as GameState"""
+        batch, games = self.make_games(64, seed=5)
+        rng = np.random.default_rng(6)
+        for i, game in enumerate(games):
+            self.sync_pieces(batch, game, i)
+        for _ in range(300):
+            actions = rng.integers(len(ACTIONS), size=batch.count)
+            for i, game in enumerate(games):
+                game.next_pieces = deque(spawn_piece(FOOD_TYPES[t]) for t in batch.next_types[i])
+            lines = batch.step(actions)
+            for i, game in enumerate(games):
+                self.assertEqual(game.step(ACTIONS[actions[i]]), lines[i])
+                self.assertEqual(game.grid, batch.grid(i))
+                self.assertEqual((game.score, game.level, game.game_over),
+                                 (batch.score[i], batch.level[i], batch.game_over[i]))
+                if not game.game_over:
+                    piece = game.current_piece
+                    self.assertEqual((piece['type'], piece['x'], piece['y'], piece['rotation']),
+                                     (FOOD_TYPES[batch.piece_type[i]], batch.x[i], batch.y[i], batch.rotation[i]))
+        self.assertGreater(batch.lines_cleared.sum(), 0)
+
+    def test_reset_mask(self):
+        """Test that reset only touches the selected boards"""
+        batch = BatchGame(4, seed=1)
+        batch.step(ACTIONS.index('hard_drop'))
+        batch.reset(np.array([True, False, False, False]))
+        self.assertEqual(batch.pieces_placed.tolist(), [0, 1, 1, 1])
+        self.assertFalse(batch.boards[0].any())
+
+if __name__ == '__main__':
+    unittest.main()
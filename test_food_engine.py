@@ -0,0 +1,375 @@
+import unittest
+import random
+from food_engine import (
+    FOODS,
+    GRID_WIDTH,
+    GRID_HEIGHT,
+    ACTIONS,
+    EAT_ANIMATION_TICKS,
+    EXPLOSION_TICKS,
+    GRAVITY_TICKS,
+    LOCK_DELAY_TICKS,
+    MASK_MARGIN,
+    SHIFT_TICKS,
+    BitBoard,
+    FixedTimestep,
+    BagRandomizer,
+    GameState,
+    Session,
+    SHAPES,
+    UNIQUE_ROTATIONS,
+    empty_grid,
+    spawn_piece,
+    valid_move,
+    zobrist_hash
+)
+
+class TestGameState(unittest.TestCase):
+    def setUp(self):
+        """Set up a game with a fixed random generator"""
+        self.game = GameState(random.Random(1))
+
+    def test_reset(self):
+        """Test that a new game starts empty with a full preview queue"""
+        self.assertEqual(self.game.score, 0)
+        self.assertEqual(self.game.level, 1)
+        self.assertEqual(len(self.game.next_pieces), 3)
+        self.assertIn(self.game.current_piece['type'], FOODS)
+        self.assertFalse(any(any(row) for row in self.game.grid))
+
+    def test_hard_drop_locks_piece(self):
+        """Test that a hard drop puts the piece on the floor"""
+        self.game.step('hard_drop')
+        self.assertEqual(self.game.pieces_placed, 1)
+        self.assertTrue(any(self.game.grid[GRID_HEIGHT - 1]))
+
+    def test_clear_lines_scores(self):
+        """Test that a full bottom row is cleared and scored"""
+        grid = empty_grid()
+        grid[GRID_HEIGHT - 1] = ['fries'] * GRID_WIDTH
+        grid[GRID_HEIGHT - 2][0] = 'pasta'
+        self.game.load_grid(grid)
+        self.assertEqual(self.game.clear_lines(), 1)
+        self.assertEqual(self.game.score, 100)
+        self.assertEqual(self.game.character_fullness, 20)
+        self.assertEqual(self.game.grid[GRID_HEIGHT - 1][0], 'pasta')
+        self.assertIsNone(self.game.grid[0][0])
+        self.assertEqual(self.game.heights, [1] + [0] * (GRID_WIDTH - 1))
+
+    def test_landing_matches_stepping(self):
+        """Test skyline landing rows against stepping down one row at a time"""
+        rng = random.Random(7)
+        for _ in range(30):
+            grid = [[rng.choice([None, None, None, 'carrot']) if y > 8 else None
+                     for _ in range(GRID_WIDTH)] for y in range(GRID_HEIGHT)]
+            self.game.load_grid(grid)
+            for piece_type in FOODS:
+                for rotation in range(4):
+                    for x in range(-2, GRID_WIDTH):
+                        for y in range(GRID_HEIGHT):
+                            piece = {'type': piece_type, 'x': x, 'y': y, 'rotation': rotation}
+                            if not self.game.valid_move(piece, x, y, rotation):
+                                continue
+                            expected = y
+                            while valid_move(piece, x, expected + 1, rotation, grid):
+                                expected += 1
+                            self.assertEqual(self.game.landing_y(piece), expected)
+
+    def test_clear_split_lines(self):
+        """Test clearing full rows with a partial row between them"""
+        grid = empty_grid()
+        grid[GRID_HEIGHT - 1] = ['fries'] * GRID_WIDTH
+        grid[GRID_HEIGHT - 2] = ['pasta'] + [None] * (GRID_WIDTH - 1)
+        grid[GRID_HEIGHT - 3] = ['carrot'] * GRID_WIDTH
+        grid[GRID_HEIGHT - 4] = [None] * (GRID_WIDTH - 1) + ['banana']
+        self.game.load_grid(grid)
+        bottom_row = self.game.grid[GRID_HEIGHT - 1]
+        self.assertEqual(self.game.clear_lines(), 2)
+        self.assertEqual(self.game.score, 300)
+        self.assertEqual(self.game.grid[GRID_HEIGHT - 1], ['pasta'] + [None] * (GRID_WIDTH - 1))
+        self.assertEqual(self.game.grid[GRID_HEIGHT - 2], [None] * (GRID_WIDTH - 1) + ['banana'])
+        self.assertEqual(self.game.row_counts[-3:], [0, 1, 1])
+        self.assertEqual(self.game.board.rows, BitBoard.from_grid(self.game.grid).rows)
+        # The cleared row's list is reused as an empty row
+        self.assertTrue(any(row is bottom_row for row in self.game.grid))
+        self.assertEqual(self.game.clear_lines(), 0)
+
+    def test_heights_follow_merges_and_clears(self):
+        """Test that column heights and row counts stay correct through random play"""
+        rng = random.Random(8)
+        for _ in range(500):
+            if self.game.game_over:
+                self.game.reset()
+            self.game.step(rng.choice(ACTIONS))
+            expected = [next((GRID_HEIGHT - y for y in range(GRID_HEIGHT) if self.game.grid[y][x]), 0)
+                        for x in range(GRID_WIDTH)]
+            self.assertEqual(self.game.heights, expected)
+            self.assertEqual(self.game.row_counts, [sum(1 for cell in row if cell) for row in self.game.grid])
+
+    def test_board_hash_follows_play(self):
+        """Test that the incremental board hash matches hashing the board from scratch"""
+        rng = random.Random(9)
+        for _ in range(2000):
+            if self.game.game_over:
+                self.game.reset()
+            self.game.step(rng.choice(ACTIONS))
+            self.assertEqual(self.game.board_hash, zobrist_hash(self.game.board.bits))
+
+    def test_board_hash_after_clear(self):
+        """Test that clearing lines hashes the same as loading the cleared board"""
+        grid = empty_grid()
+        for y in range(GRID_HEIGHT - 4, GRID_HEIGHT):
+            grid[y] = ['carrot'] * (GRID_WIDTH - 1) + [None]
+        grid[GRID_HEIGHT - 5][0] = 'carrot'
+        self.game.load_grid(grid)
+        piece = self.game.current_piece
+        piece.update(type='fries', x=GRID_WIDTH - 3, y=0, rotation=1)
+        self.assertEqual(self.game.step('hard_drop'), 4)
+        cleared = GameState(random.Random(1))
+        cleared.load_grid(self.game.grid)
+        self.assertEqual(self.game.board_hash, cleared.board_hash)
+        self.assertNotEqual(self.game.board_hash, 0)
+
+    def test_hold(self):
+        """Test that hold stores the piece and can only be used once per piece"""
+        held_type = self.game.current_piece['type']
+        self.assertTrue(self.game.step('hold') == 0 and self.game.held_piece)
+        self.assertEqual(self.game.held_piece['type'], held_type)
+        self.assertFalse(self.game.hold())
+
+    def test_independent_games(self):
+        """Test that games don't share state"""
+        other = GameState(random.Random(1))
+        self.game.step('hard_drop')
+        self.assertEqual(other.pieces_placed, 0)
+        self.assertFalse(any(any(row) for row in other.grid))
+
+    def test_random_play(self):
+        """Test that random actions always leave the piece in a valid spot"""
+        rng = random.Random(2)
+        for _ in range(2000):
+            if self.game.game_over:
+                self.game.reset()
+            self.game.step(rng.choice(ACTIONS))
+            piece = self.game.current_piece
+            if not self.game.game_over:
+                self.assertTrue(self.game.valid_move(piece, piece['x'], piece['y'], piece['rotation']))
+
+    def test_unknown_action(self):
+        """Test that unknown actions are rejected"""
+        with self.assertRaises(ValueError):
+            self.game.step('jump')
+
+    def test_same_seed_same_game(self):
+        """Test that identical seeds and actions give identical games"""
+        def play(seed, randomizer):
+            game = GameState(seed=seed, randomizer=randomizer)
+            rng = random.Random(11)
+            for _ in range(1000):
+                game.step(rng.choice(ACTIONS))
+            return game.grid, game.score, game.pieces_placed, [piece['type'] for piece in game.next_pieces]
+        for randomizer in ('uniform', 'bag'):
+            self.assertEqual(play(5, randomizer), play(5, randomizer))
+            self.assertNotEqual(play(5, randomizer), play(6, randomizer))
+        self.assertEqual(GameState(seed=5).seed, 5)
+        self.assertIsNotNone(GameState().seed)
+
+    def test_reset_reseeds(self):
+        """Test that every new game gets a seed that replays it"""
+        self.game.step('hard_drop')
+        game = GameState(seed=5)
+        first = game.current_piece['type'], [piece['type'] for piece in game.next_pieces]
+        game.reset()
+        self.assertNotEqual(game.seed, 5)
+        game.reset(5)
+        self.assertEqual((game.current_piece['type'], [piece['type'] for piece in game.next_pieces]), first)
+
+    def test_snapshot_restore(self):
+        """Test that a restored game carries on exactly like the original"""
+        rng = random.Random(12)
+        for _ in range(300):
+            self.game.step(rng.choice(ACTIONS))
+        copy = GameState(random.Random())
+        copy.restore(self.game.snapshot())
+        for _ in range(300):
+            action = rng.choice(ACTIONS)
+            self.assertEqual(copy.step(action), self.game.step(action))
+        self.assertEqual(copy.snapshot(), self.game.snapshot())
+        self.assertEqual(copy.heights, self.game.heights)
+
+    def test_bag_deals_every_food(self):
+        """Test that each run of 7 pieces from the bag has every food once"""
+        game = GameState(seed=3, randomizer='bag')
+        types = [game.current_piece['type']] + [piece['type'] for piece in game.next_pieces]
+        while len(types) < 70:
+            types.append(game.new_piece() and game.next_pieces[-1]['type'])
+        for start in range(0, 70, len(FOODS)):
+            self.assertEqual(sorted(types[start:start + len(FOODS)]), sorted(FOODS))
+        self.assertIsInstance(GameState(randomizer=BagRandomizer).randomizer, BagRandomizer)
+        with self.assertRaises(ValueError):
+            GameState(randomizer='lucky')
+
+    def test_spawn_piece(self):
+        """Test the spawn position"""
+        piece = spawn_piece('fries')
+        self.assertEqual((piece['x'], piece['y'], piece['rotation']), (GRID_WIDTH // 2 - 2, 0, 0))
+
+class TestShapes(unittest.TestCase):
+    def test_cells_match_shape_strings(self):
+        """Test that compiled cells are exactly the 'X' cells of each shape"""
+        for piece_type, food in FOODS.items():
+            for rotation, rows in enumerate(food['shape']):
+                expected = {(j, i) for i, row in enumerate(rows) for j, cell in enumerate(row) if cell == 'X'}
+                self.assertEqual(set(SHAPES[piece_type][rotation].cells), expected)
+
+    def test_duplicate_rotations_shared(self):
+        """Test that identical rotations are compiled once"""
+        burger = SHAPES['cheeseburger']
+        self.assertTrue(all(shape is burger[0] for shape in burger))
+        self.assertEqual(UNIQUE_ROTATIONS['cheeseburger'], (0,))
+        self.assertEqual(UNIQUE_ROTATIONS['fries'], (0, 1))
+        self.assertEqual(len(UNIQUE_ROTATIONS['chicken']), 4)
+
+    def test_profiles(self):
+        """Test the bounding box and profiles of the T piece"""
+        shape = SHAPES['chicken'][0]
+        self.assertEqual(shape.bbox, (1, 1, 3, 2))
+        self.assertEqual(shape.bottom, ((1, 2), (2, 2), (3, 2)))
+        self.assertEqual(shape.left, ((1, 2), (2, 1)))
+        self.assertEqual(shape.right, ((1, 2), (2, 3)))
+
+class TestBitBoard(unittest.TestCase):
+    def test_matches_grid_valid_move(self):
+        """Test that bitboard collisions agree with the list grid on random boards"""
+        rng = random.Random(3)
+        for _ in range(20):
+            grid = [[rng.choice([None, None, 'fries']) for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+            board = BitBoard.from_grid(grid)
+            for piece_type in FOODS:
+                piece = {'type': piece_type}
+                for rotation in range(4):
+                    for x in range(-MASK_MARGIN, GRID_WIDTH + MASK_MARGIN):
+                        for y in range(-MASK_MARGIN, GRID_HEIGHT + MASK_MARGIN):
+                            self.assertEqual(board.valid_move(piece, x, y, rotation),
+                                             valid_move(piece, x, y, rotation, grid))
+
+    def test_far_off_board(self):
+        """Test that both backends reject positions well outside the grid"""
+        grid = empty_grid()
+        board = BitBoard.from_grid(grid)
+        positions = [(3, -11), (3, -12), (3, 30), (30, 3), (-30, 3), (3, -100), (100, 100)]
+        for piece_type in FOODS:
+            piece = {'type': piece_type}
+            for rotation in range(4):
+                for x, y in positions:
+                    self.assertFalse(valid_move(piece, x, y, rotation, grid))
+                    self.assertFalse(board.valid_move(piece, x, y, rotation))
+                    self.assertFalse(valid_move(piece, x, y, rotation, board))
+
+    def test_column_height(self):
+        """Test that column heights find the topmost cell over any gaps"""
+        rng = random.Random(4)
+        for _ in range(20):
+            grid = [[rng.random() < y / GRID_HEIGHT for _ in range(GRID_WIDTH)] for y in range(GRID_HEIGHT)]
+            board = BitBoard.from_grid(grid)
+            for x in range(GRID_WIDTH):
+                expected = next((GRID_HEIGHT - y for y in range(GRID_HEIGHT) if grid[y][x]), 0)
+                self.assertEqual(board.column_height(x), expected)
+        self.assertEqual(BitBoard().column_height(0), 0)
+
+    def test_remove_rows(self):
+        """Test that removing rows shifts the rows above down"""
+        board = BitBoard([0] * (GRID_HEIGHT - 3) + [0b1, (1 << GRID_WIDTH) - 1, 0b10])
+        self.assertEqual(board.full_rows(), [GRID_HEIGHT - 2])
+        board.remove_rows(board.full_rows())
+        self.assertEqual(board.rows[-2:], [0b1, 0b10])
+        self.assertEqual(board.rows[0], 0)
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        """Set up a session with a fixed random generator"""
+        self.session = Session(GameState(random.Random(1)))
+        self.game = self.session.game
+
+    def run_ticks(self, count, presses=(), held=()):
+        """Run several ticks with the same keys held"""
+        for _ in range(count):
+            self.session.tick(presses, held)
+
+    def test_gravity(self):
+        """Test that the piece falls one row every GRAVITY_TICKS"""
+        y = self.game.current_piece['y']
+        self.run_ticks(GRAVITY_TICKS - 1)
+        self.assertEqual(self.game.current_piece['y'], y)
+        self.run_ticks(1)
+        self.assertEqual(self.game.current_piece['y'], y + 1)
+
+    def test_held_shift_repeats(self):
+        """Test that holding left moves right away and then every SHIFT_TICKS"""
+        x = self.game.current_piece['x']
+        self.run_ticks(1, held=('left',))
+        self.assertEqual(self.game.current_piece['x'], x - 1)
+        self.run_ticks(SHIFT_TICKS, held=('left',))
+        self.assertEqual(self.game.current_piece['x'], x - 2)
+
+    def test_lock_delay(self):
+        """Test that a landed piece locks after the lock delay, not before"""
+        self.game.current_piece['y'] = self.game.landing_y(self.game.current_piece)
+        # Gravity is due as soon as the piece touches down
+        self.session.last_fall_tick = -GRAVITY_TICKS
+        self.run_ticks(1)
+        self.assertEqual(self.game.pieces_placed, 0)
+        self.run_ticks(LOCK_DELAY_TICKS)
+        self.assertEqual(self.game.pieces_placed, 0)
+        # The next gravity tick after the delay locks it
+        self.run_ticks(GRAVITY_TICKS - LOCK_DELAY_TICKS)
+        self.assertEqual(self.game.pieces_placed, 1)
+
+    def test_eating_and_explosion_timers(self):
+        """Test that eating lasts EAT_ANIMATION_TICKS and the explosion ends the game"""
+        self.session.eat(1)
+        self.run_ticks(EAT_ANIMATION_TICKS - 1)
+        self.assertTrue(self.session.eating)
+        self.run_ticks(1)
+        self.assertFalse(self.session.eating)
+        self.game.character_exploded = True
+        self.run_ticks(1)
+        self.assertTrue(self.session.showing_explosion)
+        self.run_ticks(EXPLOSION_TICKS)
+        self.assertFalse(self.session.showing_explosion)
+        self.assertTrue(self.game.game_over)
+
+    def test_deterministic(self):
+        """Test that the same seed and inputs give the same game"""
+        def play():
+            session = Session(GameState(random.Random(9)))
+            rng = random.Random(10)
+            while not session.game.game_over:
+                presses = [rng.choice(['rotate', 'hard_drop', 'hold'])] if rng.random() < 0.05 else []
+                session.tick(presses, [action for action in ('left', 'right', 'soft_drop') if rng.random() < 0.3])
+            game = session.game
+            return session.tick_count, game.score, game.pieces_placed, game.grid
+        self.assertEqual(play(), play())
+
+    def test_unknown_press(self):
+        """Test that unknown key presses are rejected"""
+        with self.assertRaises(ValueError):
+            self.session.tick(['jump'])
+
+class TestFixedTimestep(unittest.TestCase):
+    def test_whole_ticks(self):
+        """Test that leftover time carries over to the next frame"""
+        timestep = FixedTimestep(tick_rate=60)
+        self.assertEqual(timestep.advance(10), 0)
+        self.assertEqual(timestep.advance(10), 1)
+        self.assertAlmostEqual(timestep.alpha, 0.2)
+        self.assertEqual(sum(timestep.advance(7) for _ in range(1000)), 420)
+
+    def test_stall_is_capped(self):
+        """Test that a long stall runs at most max_ticks"""
+        timestep = FixedTimestep(tick_rate=60, max_ticks=5)
+        self.assertEqual(timestep.advance(5000), 5)
+        self.assertEqual(timestep.alpha, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import random
+from food_engine import (
+    HELD_ACTIONS,
+    PRESS_ACTIONS,
+    GameState,
+    Session
+)
+from food_replay import (
+    KEYFRAME_TICKS,
+    REPLAY_MAGIC,
+    Player,
+    Recorder,
+    Replay,
+    read_varint,
+    write_varint
+)
+
+def record_game(seed, randomizer='uniform'):
+    """Record a game played with random inputs until it ends"""
+    session = Session(GameState(seed=seed, randomizer=randomizer))
+    recorder = Recorder(session)
+    rng = random.Random(seed)
+    while not session.game.game_over:
+        presses = [rng.choice(PRESS_ACTIONS)] if rng.random() < 0.03 else []
+        recorder.tick(presses, [action for action in HELD_ACTIONS if rng.random() < 0.2])
+    return session, recorder.replay
+
+class TestVarint(unittest.TestCase):
+    def test_round_trip(self):
+        """Test that varints read back the values written"""
+        values = [0, 1, 127, 128, 300, 16383, 16384, 2 ** 40]
+        data = bytearray()
+        for value in values:
+            write_varint(data, value)
+        self.assertEqual(len(data), 1 + 1 + 1 + 2 + 2 + 2 + 3 + 6)
+        pos = 0
+        for value in values:
+            read, pos = read_varint(data, pos)
+            self.assertEqual(read, value)
+
+class TestReplay(unittest.TestCase):
+    def test_playback_matches(self):
+        """Test that playing a saved replay gives the same game"""
+        for randomizer in ('uniform', 'bag'):
+            session, replay = record_game(3, randomizer)
+            player = Player(Replay.loads(replay.dumps()))
+            player.run()
+            self.assertTrue(player.done())
+            self.assertEqual(player.session.snapshot(), session.snapshot())
+
+    def test_compact(self):
+        """Test that inputs take a few bytes each once compressed"""
+        session, replay = record_game(4)
+        keyframes = Replay(replay.seed, replay.randomizer)
+        keyframes.keyframes = replay.keyframes
+        self.assertLess(len(replay.dumps()) - len(keyframes.dumps()), 2 * len(replay.events))
+
+    def test_seek(self):
+        """Test that seeking lands in the same state as playing from the start"""
+        session, replay = record_game(5)
+        self.assertTrue(replay.keyframes)
+        for tick in (1, KEYFRAME_TICKS, KEYFRAME_TICKS + 7, replay.ticks - 3, replay.ticks):
+            expected = Player(replay)
+            expected.run(tick)
+            player = Player(replay)
+            player.seek(replay.ticks)
+            player.seek(tick)
+            self.assertEqual(player.session.tick_count, tick)
+            self.assertEqual(player.session.snapshot(), expected.session.snapshot())
+            player.run()
+            self.assertEqual(player.session.snapshot(), session.snapshot())
+
+    def test_bad_files(self):
+        """Test that other files and newer versions are rejected"""
+        session, replay = record_game(6)
+        data = replay.dumps()
+        with self.assertRaises(ValueError):
+            Replay.loads(b'PNG' + data)
+        with self.assertRaises(ValueError):
+            Replay.loads(REPLAY_MAGIC + bytes([99]) + data[len(REPLAY_MAGIC) + 1:])
+
+    def test_needs_seeded_game(self):
+        """Test that only freshly seeded games can be recorded"""
+        with self.assertRaises(ValueError):
+            Recorder(Session(GameState(random.Random(1))))
+        session = Session(GameState(seed=1))
+        session.tick()
+        with self.assertRaises(ValueError):
+            Recorder(session)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from food_sim import (
+    POLICIES,
+    Summary,
+    main,
+    play_game,
+    run_sim,
+    simulate
+)
+
+class TestSimulation(unittest.TestCase):
+    def test_same_seed_same_result(self):
+        """Test that a game's result only depends on its seed"""
+        for name in ('random', 'greedy'):
+            first = play_game(POLICIES[name](), 7)
+            second = play_game(POLICIES[name](), 7)
+            self.assertEqual(first, second)
+            self.assertEqual(first['seed'], 7)
+            self.assertGreater(first['pieces'], 0)
+
+    def test_greedy_beats_random(self):
+        """Test that the greedy policy wins games the random one doesn't"""
+        wins = {}
+        for name in ('random', 'greedy'):
+            summary = Summary()
+            for result in simulate(20, name, seed=1, jobs=1):
+                summary.add(result)
+            wins[name] = summary.exploded
+        self.assertGreater(wins['greedy'], wins['random'])
+
+    def test_pool_matches_single_process(self):
+        """Test that worker processes play the same games as one process"""
+        single = sorted(simulate(12, 'greedy', seed=3, randomizer='bag', jobs=1), key=lambda result: result['seed'])
+        pooled = sorted(simulate(12, 'greedy', seed=3, randomizer='bag', jobs=2), key=lambda result: result['seed'])
+        self.assertEqual(pooled, single)
+        self.assertEqual([result['seed'] for result in pooled], list(range(3, 15)))
+
+    def test_unknown_policy(self):
+        """Test that unknown policies and randomizers are rejected"""
+        with self.assertRaises(ValueError):
+            list(simulate(1, 'perfect'))
+        with self.assertRaises(ValueError):
+            list(simulate(1, 'greedy', randomizer='rigged'))
+
+    def test_command_line(self):
+        """Test that the command returns its report and the entry point exits cleanly"""
+        args = ['--games', '3', '--jobs', '1', '--progress', '0']
+        with redirect_stdout(StringIO()):
+            report = run_sim(args)
+            self.assertIsNone(main(args))
+        self.assertEqual((report['games'], report['policy']), (3, 'greedy'))
+
+class TestSummary(unittest.TestCase):
+    def test_report(self):
+        """Test win rate, mean and percentiles of a few results"""
+        summary = Summary()
+        for score, exploded in ((100, False), (300, True), (300, True), (1000, True)):
+            summary.add({'score': score, 'lines': 1, 'level': 1, 'pieces': 10, 'exploded': exploded})
+        report = summary.report()
+        self.assertEqual(report['games'], 4)
+        self.assertEqual(report['win_rate'], 0.75)
+        self.assertEqual(report['score'], {'mean': 425, 'min': 100, 'p50': 300, 'p90': 1000, 'p99': 1000, 'max': 1000})
+
+    def test_empty(self):
+        """Test that a summary of no games still reports"""
+        report = Summary().report()
+        self.assertEqual((report['games'], report['win_rate'], report['score']), (0, 0.0, {}))
+
+if __name__ == '__main__':
+    unittest.main()
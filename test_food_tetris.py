@@ -2,6 +2,12 @@ import unittest
 import pygame
 import sys
 import os
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import food_tetris
 from food_tetris import (
     FOODS,
     new_piece,
@@ -87,5 +93,346 @@ class TestFoodTetris(unittest.TestCase):
             for rotation in range(4):
                 self.assertTrue(valid_move(piece, piece['x'], piece['y'], rotation, self.grid))
 
+class TestTileAtlas(unittest.TestCase):
+    def setUp(self):
+        """Load the food images"""
+        pygame.init()
+        self.grid_size = food_tetris.GRID_SIZE
+        food_tetris.food_images = food_tetris.load_food_images()
+
+    def tearDown(self):
+        """Restore the grid size"""
+        food_tetris.GRID_SIZE = self.grid_size
+
+    def test_atlas_is_reused(self):
+        """Test that every tile comes from the same atlas surface"""
+        atlas = food_tetris.get_atlas()
+        self.assertIs(food_tetris.get_atlas(), atlas)
+        self.assertEqual(len(atlas.rects), len(FOODS) * len(food_tetris.TILE_VARIANTS))
+        tile = food_tetris.get_tile('fries')
+        self.assertIs(tile.get_parent(), atlas.surface)
+        self.assertEqual(tile.get_size(), (food_tetris.GRID_SIZE, food_tetris.GRID_SIZE))
+        self.assertNotEqual(atlas.rects['fries', 'normal'], atlas.rects['fries', 'ghost'])
+
+    def test_tiles_match_blending(self):
+        """Test that the opaque tiles look the same as blending the image when drawing"""
+        size = food_tetris.GRID_SIZE
+        image = pygame.transform.scale(food_tetris.food_images['banana'], (size, size))
+        self.assertIsNone(food_tetris.get_tile('banana', 'ghost').get_alpha())
+        # Normal tiles over an empty cell
+        expected = food_tetris.get_grid_background().subsurface((0, 0, size, size)).copy()
+        expected.blit(image, (0, 0))
+        self.assertEqual(pygame.image.tobytes(food_tetris.get_tile('banana'), 'RGB'),
+                         pygame.image.tobytes(expected, 'RGB'))
+        # Ghost tiles, see-through and darkened, over an empty cell
+        expected = food_tetris.get_grid_background().subsurface((0, 0, size, size)).copy()
+        see_through = image.copy()
+        see_through.set_alpha(80)
+        dark_overlay = pygame.Surface((size, size), pygame.SRCALPHA)
+        dark_overlay.fill((0, 0, 0, 100))
+        see_through.blit(dark_overlay, (0, 0))
+        expected.blit(see_through, (0, 0))
+        self.assertEqual(pygame.image.tobytes(food_tetris.get_tile('banana', 'ghost'), 'RGB'),
+                         pygame.image.tobytes(expected, 'RGB'))
+        # Preview tiles over the black sidebar
+        expected = pygame.Surface((size, size))
+        expected.blit(image, (0, 0))
+        self.assertEqual(pygame.image.tobytes(food_tetris.get_tile('banana', 'preview'), 'RGB'),
+                         pygame.image.tobytes(expected, 'RGB'))
+
+    def test_display_format(self):
+        """Test that the atlas is converted once a display exists"""
+        self.assertEqual(food_tetris.get_atlas().converted, pygame.display.get_surface() is not None)
+        screen = pygame.display.set_mode((200, 200))
+        atlas = food_tetris.get_atlas()
+        self.assertTrue(atlas.converted)
+        self.assertEqual(atlas.surface.get_bitsize(), screen.get_bitsize())
+
+    def test_grid_size_change_invalidates(self):
+        """Test that changing the grid size rebuilds tiles at the new size"""
+        food_tetris.get_tile('pasta')
+        food_tetris.GRID_SIZE = 40
+        self.assertEqual(food_tetris.get_tile('pasta').get_size(), (40, 40))
+        self.assertEqual(food_tetris.get_atlas().surface.get_width(), 40 * len(food_tetris.TILE_VARIANTS))
+
+class TestBackgroundLoading(unittest.TestCase):
+    def setUp(self):
+        """Start pygame so placeholder letters can be rendered"""
+        pygame.init()
+
+    def test_placeholders_swapped_for_images(self):
+        """Test that loaded images replace the placeholders and their tiles"""
+        food_tetris.food_images = food_tetris.load_placeholder_images()
+        placeholder_tile = food_tetris.get_tile('pasta').copy()
+        atlas = food_tetris.get_atlas()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        loader = food_tetris.FoodImageLoader(os.path.join(temp_dir, 'food_tiles.bundle'))
+        loader.thread.join()
+        loaded = loader.poll()
+        self.assertIn('pasta', loaded)
+        self.assertTrue(loader.done())
+        # Only the changed rows of the same atlas are redrawn
+        self.assertIs(food_tetris.get_atlas(), atlas)
+        self.assertNotEqual(pygame.image.tobytes(food_tetris.get_tile('pasta'), 'RGB'),
+                            pygame.image.tobytes(placeholder_tile, 'RGB'))
+
+class TestAssetBundle(unittest.TestCase):
+    def setUp(self):
+        """Work on a copy of the images folder"""
+        pygame.init()
+        self.grid_size = food_tetris.GRID_SIZE
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images'),
+                        os.path.join(self.temp_dir, 'images'))
+        os.chdir(self.temp_dir)
+        self.path = os.path.join('.cache', 'food_tiles.bundle')
+
+    def tearDown(self):
+        """Go back to the repository and restore the grid size"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+        food_tetris.GRID_SIZE = self.grid_size
+
+    def build(self):
+        """Decode the images the slow way, writing the bundle"""
+        loader = food_tetris.FoodImageLoader(self.path)
+        loader.thread.join()
+        return dict(loader.results.queue)
+
+    def manifest_sources(self):
+        """Read the sources and folder mtime recorded in the bundle"""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        header_size = len(food_tetris.BUNDLE_MAGIC) + 4
+        manifest_size = int.from_bytes(data[len(food_tetris.BUNDLE_MAGIC):header_size], 'little')
+        manifest = json.loads(data[header_size:header_size + manifest_size])
+        return manifest['sources'], manifest['directory_mtime']
+
+    def test_round_trip(self):
+        """Test that bundled images have the same pixels as decoded ones"""
+        self.assertIsNone(food_tetris.load_bundle(self.path))
+        decoded = self.build()
+        self.assertTrue(food_tetris.sources_unchanged(*self.manifest_sources()))
+        bundled = food_tetris.load_bundle(self.path)
+        self.assertEqual(set(bundled), set(decoded))
+        for food_name, image in decoded.items():
+            mode = 'RGBA' if image.get_flags() & pygame.SRCALPHA else 'RGB'
+            self.assertEqual(bundled[food_name].get_size(), image.get_size())
+            self.assertEqual(pygame.image.tobytes(bundled[food_name], mode), pygame.image.tobytes(image, mode))
+
+    def test_grid_size_change_rebuilds(self):
+        """Test that a bundle for another tile size isn't used"""
+        self.build()
+        food_tetris.GRID_SIZE = 40
+        self.assertIsNone(food_tetris.load_bundle(self.path))
+
+    def test_source_change_rebuilds(self):
+        """Test that editing, touching or adding images is noticed"""
+        decoded = self.build()
+        food_name = next(iter(decoded))
+        source = food_tetris.scan_image_sources()[food_name]
+        # Touching a file without changing it keeps the bundle
+        os.utime(source['path'], ns=(source['mtime'] + 10 ** 9, source['mtime'] + 10 ** 9))
+        self.assertIsNotNone(food_tetris.load_bundle(self.path))
+        with open(source['path'], 'ab') as f:
+            f.write(b'\0')
+        self.assertIsNone(food_tetris.load_bundle(self.path))
+        # A food that had no image gets one
+        self.build()
+        missing = [name for name, source in food_tetris.scan_image_sources().items() if source is None]
+        if missing:
+            shutil.copy(source['path'], food_tetris.image_paths(food_tetris.FOOD_LABELS[missing[0]])[-1])
+            self.assertIsNone(food_tetris.load_bundle(self.path))
+
+    def test_corrupt_bundle_ignored(self):
+        """Test that a damaged bundle is treated as missing"""
+        os.makedirs('.cache')
+        with open(self.path, 'wb') as f:
+            f.write(food_tetris.BUNDLE_MAGIC + b'junk')
+        self.assertIsNone(food_tetris.load_bundle(self.path))
+
+class TestTextCache(unittest.TestCase):
+    def setUp(self):
+        """Start pygame and draw into an off-screen surface"""
+        pygame.init()
+        self.screen = food_tetris.screen
+        food_tetris.screen = pygame.Surface((food_tetris.SCREEN_WIDTH, food_tetris.SCREEN_HEIGHT))
+        food_tetris.food_images = food_tetris.load_food_images()
+
+    def tearDown(self):
+        """Restore the display surface"""
+        food_tetris.screen = self.screen
+
+    def test_steady_state_does_no_font_work(self):
+        """Test that redrawing an unchanged sidebar only hits the caches"""
+        food_tetris.draw_sidebar()
+        before = food_tetris.text_cache_stats()
+        food_tetris.draw_sidebar()
+        after = food_tetris.text_cache_stats()
+        self.assertEqual(after['misses'], before['misses'])
+        self.assertEqual(after['font_constructions'], before['font_constructions'])
+        self.assertGreater(after['hits'], before['hits'])
+
+    def test_lru_bound(self):
+        """Test that the cache drops the least recently used text"""
+        cache = food_tetris.TextCache(max_entries=2)
+        first = cache.render('a', 24, food_tetris.WHITE)
+        cache.render('b', 24, food_tetris.WHITE)
+        cache.render('a', 24, food_tetris.WHITE)
+        cache.render('c', 24, food_tetris.WHITE)
+        self.assertEqual(list(cache.surfaces), [(24, 'a', food_tetris.WHITE), (24, 'c', food_tetris.WHITE)])
+        self.assertIs(cache.render('a', 24, food_tetris.WHITE), first)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+class TestGridBackground(unittest.TestCase):
+    def setUp(self):
+        """Remember the grid size"""
+        self.grid_size = food_tetris.GRID_SIZE
+
+    def tearDown(self):
+        """Restore the grid size"""
+        food_tetris.GRID_SIZE = self.grid_size
+
+    def test_background_is_cached(self):
+        """Test that the background is only redrawn when the grid size changes"""
+        background = food_tetris.get_grid_background()
+        self.assertIs(food_tetris.get_grid_background(), background)
+        self.assertEqual(background.get_at((0, 0))[:3], food_tetris.GRID_COLOR)
+        self.assertEqual(background.get_at((1, 1))[:3], food_tetris.GAME_BG)
+        food_tetris.GRID_SIZE = 20
+        resized = food_tetris.get_grid_background()
+        self.assertIsNot(resized, background)
+        self.assertEqual(resized.get_size(), (GRID_WIDTH * 20, GRID_HEIGHT * 20))
+
+class TestDirtyRendering(unittest.TestCase):
+    def setUp(self):
+        """Draw into off-screen surfaces instead of the display"""
+        pygame.init()
+        self.screen = food_tetris.screen
+        food_tetris.food_images = food_tetris.load_food_images()
+        food_tetris.game = food_tetris.GameState(random.Random(4))
+        food_tetris.paused = False
+        self.size = (food_tetris.SCREEN_WIDTH, food_tetris.SCREEN_HEIGHT)
+
+    def tearDown(self):
+        """Restore the display surface"""
+        food_tetris.screen = self.screen
+
+    def test_matches_full_frame(self):
+        """Test that dirty frames end up identical to full redraws"""
+        dirty = pygame.Surface(self.size)
+        full = pygame.Surface(self.size)
+        tracker = food_tetris.DirtyTracker()
+        rng = random.Random(5)
+        for _ in range(40):
+            food_tetris.game.step(rng.choice(['left', 'right', 'rotate', 'soft_drop', 'hard_drop', 'hold']))
+            if food_tetris.game.game_over:
+                break
+            food_tetris.screen = dirty
+            rects = tracker.draw(False)
+            food_tetris.screen = full
+            food_tetris.draw_frame(None, False)
+            self.assertEqual(pygame.image.tobytes(dirty, 'RGB'), pygame.image.tobytes(full, 'RGB'))
+            self.assertTrue(all(rect.width <= self.size[0] for rect in rects))
+        # A frame where nothing changed presents nothing
+        food_tetris.screen = dirty
+        self.assertEqual(tracker.draw(False), [])
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        """Draw into an off-screen surface with a fake clock"""
+        pygame.init()
+        self.screen = food_tetris.screen
+        food_tetris.food_images = food_tetris.load_food_images()
+        food_tetris.game = food_tetris.GameState(random.Random(4))
+        food_tetris.paused = False
+        self.now = 0.0
+        self.profiler = food_tetris.FrameProfiler(clock=lambda: self.now)
+
+    def tearDown(self):
+        """Stop counting and restore the display surface"""
+        self.profiler.show(False)
+        food_tetris.screen = self.screen
+
+    def test_phases_and_frame_times(self):
+        """Test that laps charge time to phases and frames feed FPS and p99"""
+        profiler = self.profiler
+        for frame in range(100):
+            profiler.begin_frame()
+            self.now += 0.002
+            profiler.lap('input')
+            self.now += 0.005
+            profiler.lap('draw_grid')
+            self.now += 0.009 + (0.030 if frame == 50 else 0)
+            profiler.lap('clock_tick')
+        profiler.begin_frame()
+        self.assertEqual(len(profiler.frames), 100)
+        _, frame_ms, phases, _ = profiler.frames[-1]
+        self.assertAlmostEqual(frame_ms, 16.0)
+        self.assertEqual(sorted(phases), ['clock_tick', 'draw_grid', 'input'])
+        self.assertAlmostEqual(phases['draw_grid'], 5.0)
+        self.assertAlmostEqual(profiler.p99(), 46.0)
+        self.assertAlmostEqual(profiler.fps(), 1000 * 100 / (100 * 16 + 30))
+        # Only the last few seconds are kept
+        self.now += food_tetris.PROFILE_HISTORY_SECONDS
+        profiler.begin_frame()
+        self.assertEqual(len(profiler.frames), 1)
+
+    def test_counts_draw_calls(self):
+        """Test that a frame's blits and draw calls are counted, but not the overlay's"""
+        profiler = self.profiler
+        rect = pygame.draw.rect
+        profiler.show(True)
+        self.assertIsNot(pygame.draw.rect, rect)
+        food_tetris.screen = food_tetris.CountingSurface((food_tetris.SCREEN_WIDTH, food_tetris.SCREEN_HEIGHT),
+                                                         profiler, pygame.Surface((1, 1)))
+        for _ in range(2):
+            profiler.begin_frame()
+            food_tetris.draw_frame(None, False)
+            counts = dict(profiler.counts)
+            profiler.draw()
+            self.assertEqual(profiler.counts, counts)
+        self.assertGreater(counts['blits'], 3)
+        self.assertGreater(counts['draws'], 3)
+        self.assertEqual(counts['scales'], 0)
+        profiler.begin_frame()
+        self.assertEqual(profiler.frames[-1][3]['fonts'], 0)
+        profiler.show(False)
+        self.assertIs(pygame.draw.rect, rect)
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        """Write the trace into a temporary folder"""
+        self.directory = tempfile.mkdtemp()
+        self.screen = food_tetris.screen
+
+    def tearDown(self):
+        """Remove the temporary folder and restore the display surface"""
+        shutil.rmtree(self.directory)
+        food_tetris.screen = self.screen
+
+    def test_headless_trace(self):
+        """Test that --trace records the loop's phases, ticks and merges"""
+        path = os.path.join(self.directory, 'trace.json')
+        draw_grid = food_tetris.draw_grid
+        # The console script exits with main's return value
+        self.assertIsNone(food_tetris.main(['--headless', '--autoplay', '--no-record', '--seed', '1',
+                                            '--ticks', '600', '--trace', path]))
+        self.assertIs(food_tetris.draw_grid, draw_grid)
+        self.assertIsNone(food_tetris.profiler.tracer)
+        with open(path) as f:
+            names = {event['name'] for event in json.load(f) if event['ph'] == 'X'}
+        self.assertTrue({'frame', 'event_pump', 'input', 'simulation', 'tick', 'merge_piece', 'clear_lines'} <= names)
+
+class TestStartup(unittest.TestCase):
+    def test_import_has_no_side_effects(self):
+        """Test that importing the game doesn't open a display"""
+        script = 'import food_tetris, pygame; print(pygame.display.get_init(), food_tetris.screen)'
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(output.split()[-2:], ['False', 'None'])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,107 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import time
+from food_engine import GameState
+from food_trace import TraceWriter
+
+class FakeClock:
+    """Clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTraceWriter(unittest.TestCase):
+    def setUp(self):
+        """Write traces into a temporary folder"""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'trace.json')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        """Remove the temporary folder"""
+        shutil.rmtree(self.directory)
+
+    def load(self, path=None):
+        """Return a trace file's events and its span events
+
+        Like the trace viewers, accept a file that is still missing its
+        closing bracket.
+        """
+        with open(path or self.path) as f:
+            text = f.read().rstrip()
+        if not text.endswith(']'):
+            text += ']'
+        events = json.loads(text)
+        return events, [event for event in events if event['ph'] == 'X']
+
+    def test_spans(self):
+        """Test that spans are written as complete events in microseconds"""
+        writer = TraceWriter(self.path, clock=self.clock)
+        self.clock.now = 0.5
+        writer.complete('frame', 0.5, 0.5166)
+        writer.complete('draw_grid', 0.501, 0.5015)
+        writer.close()
+        events, spans = self.load()
+        self.assertEqual([span['name'] for span in spans], ['frame', 'draw_grid'])
+        self.assertEqual((spans[1]['ts'], spans[1]['dur']), (501000.0, 500.0))
+        self.assertEqual(spans[0]['tid'], spans[1]['tid'])
+        names = [event['name'] for event in events]
+        self.assertIn('process_name', names)
+        self.assertIn('thread_name', names)
+        with open(self.path) as f:
+            self.assertTrue(f.read().endswith(']\n'))
+
+    def test_rotation(self):
+        """Test that full files are moved aside and only the newest two are kept"""
+        writer = TraceWriter(self.path, capacity=10, clock=self.clock)
+        for i in range(25):
+            writer.complete(f'span {i}', i, i + 0.5)
+        writer.close()
+        events, spans = self.load()
+        self.assertEqual([span['name'] for span in spans], [f'span {i}' for i in range(20, 25)])
+        self.assertIn('thread_name', [event['name'] for event in events])
+        previous = os.path.join(self.directory, 'trace.1.json')
+        self.assertEqual([span['name'] for span in self.load(previous)[1]], [f'span {i}' for i in range(10, 20)])
+        self.assertEqual((writer.recorded, writer.dropped), (25, 10))
+
+    def test_pending_limit(self):
+        """Test that a full queue drops its oldest spans and counts them"""
+        writer = TraceWriter(self.path, clock=self.clock, max_pending=5)
+        for i in range(8):
+            writer.complete(f'span {i}', i, i + 0.5)
+        writer.close()
+        self.assertEqual([span['name'] for span in self.load()[1]], [f'span {i}' for i in range(3, 8)])
+        self.assertEqual((writer.recorded, writer.overflowed), (5, 3))
+
+    def test_periodic_flush(self):
+        """Test that spans are appended in the background before closing"""
+        writer = TraceWriter(self.path, flush_seconds=0.01)
+        for expected in (1, 2):
+            writer.complete('frame', writer.clock())
+            deadline = time.time() + 5
+            while writer.recorded < expected and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(self.load()[1]), expected)
+        writer.close()
+        self.assertEqual(len(self.load()[1]), 2)
+
+    def test_instrument(self):
+        """Test that instrumented methods still work and are recorded"""
+        writer = TraceWriter(self.path)
+        game = GameState(seed=1)
+        writer.instrument(game, ('merge_piece', 'clear_lines'))
+        for _ in range(5):
+            game.step('hard_drop')
+        self.assertEqual(game.pieces_placed, 5)
+        writer.close()
+        names = [span['name'] for span in self.load()[1]]
+        self.assertEqual(names, ['merge_piece', 'clear_lines'] * 5)
+
+if __name__ == '__main__':
+    unittest.main()